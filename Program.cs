@@ -1,8 +1,12 @@
 ﻿using System;
+using System.Buffers.Binary;
 using System.IO;
 using System.Net;
+using System.Net.Sockets;
 using System.Text;
 using System.Text.Json;
+using System.Diagnostics;
+using System.Threading;
 using System.Threading.Tasks;
 using System.Collections.Generic;
 using System.Reflection;
@@ -20,6 +24,30 @@ namespace HandyButtplugServer
         public int duration { get; set; } = 0;
     }
 
+    public class BatchRequest
+    {
+        public long start_at { get; set; } = 0;      // Unix epoch ms of the first action's offset 0; 0 = now
+        public bool replace { get; set; } = false;   // Cancel batches still pending before scheduling this one
+        public List<double[]> actions { get; set; } = new List<double[]>();  // [offset ms, position, duration ms]
+    }
+
+    // Streaming channel: fixed 13-byte little-endian frames in both directions
+    // (type u8, sequence u32, position f32, duration or status u32)
+    public static class StreamProtocol
+    {
+        public const int Port = 8081;
+        public const int FrameSize = 13;
+
+        public const byte Move = 0x01;
+        public const byte Stop = 0x02;
+        public const byte Ping = 0x03;
+        public const byte Ack = 0x81;
+
+        public const uint StatusOk = 0;
+        public const uint StatusNoDevice = 1;
+        public const uint StatusError = 2;
+    }
+
     public class StatusResponse
     {
         public bool connected { get; set; } = false;
@@ -31,16 +59,19 @@ namespace HandyButtplugServer
     public class RealButtplugServer
     {
         private readonly HttpListener _httpListener;
+        private readonly TcpListener _streamListener;
         private ButtplugClient? _buttplugClient;
         private ButtplugClientDevice? _handyDevice;
         private bool _isRunning;
         private bool _isConnectedToIntiface;
         private bool _isDeviceConnected;
+        private CancellationTokenSource _batchCancellation = new CancellationTokenSource();
 
         public RealButtplugServer()
         {
             _httpListener = new HttpListener();
             _httpListener.Prefixes.Add("http://localhost:8080/");  // FIXED: Back to port 8080
+            _streamListener = new TcpListener(IPAddress.Loopback, StreamProtocol.Port);
         }
 
         public async Task StartAsync()
@@ -48,10 +79,13 @@ namespace HandyButtplugServer
             try
             {
                 _httpListener.Start();
+                _streamListener.Start();
                 _isRunning = true;
+                _ = Task.Run(HandleStreamClients);
 
                 Console.WriteLine("=== HANDY AI STROKER - BUTTPLUG 3.1.1 SERVER ===");
                 Console.WriteLine("HTTP Server started on: http://localhost:8080/");
+                Console.WriteLine($"Stream channel started on: tcp://localhost:{StreamProtocol.Port}/");
                 Console.WriteLine("Ready to connect to Intiface Central and The Handy");
                 Console.WriteLine("Press Ctrl+C to stop");
                 Console.WriteLine();
@@ -80,6 +114,98 @@ namespace HandyButtplugServer
             }
         }
 
+        private async Task HandleStreamClients()
+        {
+            while (_isRunning)
+            {
+                try
+                {
+                    var client = await _streamListener.AcceptTcpClientAsync();
+                    client.NoDelay = true;
+                    _ = Task.Run(() => ProcessStreamClient(client));
+                }
+                catch (Exception ex) when (_isRunning)
+                {
+                    Console.WriteLine($"Error accepting stream client: {ex.Message}");
+                }
+            }
+        }
+
+        // One long-lived connection: frames are handled in order on this task, no task or HTTP parse per move
+        private async Task ProcessStreamClient(TcpClient client)
+        {
+            Console.WriteLine("🔗 Stream client connected");
+            var frame = new byte[StreamProtocol.FrameSize];
+            var ack = new byte[StreamProtocol.FrameSize];
+
+            try
+            {
+                using (client)
+                {
+                    var stream = client.GetStream();
+                    while (_isRunning && await ReadFrameAsync(stream, frame))
+                    {
+                        byte type = frame[0];
+                        uint sequence = BinaryPrimitives.ReadUInt32LittleEndian(frame.AsSpan(1));
+                        float position = BinaryPrimitives.ReadSingleLittleEndian(frame.AsSpan(5));
+                        uint duration = BinaryPrimitives.ReadUInt32LittleEndian(frame.AsSpan(9));
+
+                        uint status = StreamProtocol.StatusOk;
+                        if (type == StreamProtocol.Ping)
+                        {
+                            // Keepalive / round-trip probe
+                        }
+                        else if (!_isDeviceConnected || _handyDevice == null)
+                        {
+                            status = StreamProtocol.StatusNoDevice;
+                        }
+                        else if (type == StreamProtocol.Move)
+                        {
+                            bool sent = await SendLinearCommand(position, (int)duration, log: false);
+                            status = sent ? StreamProtocol.StatusOk : StreamProtocol.StatusError;
+                        }
+                        else if (type == StreamProtocol.Stop)
+                        {
+                            CancelBatches();
+                            bool sent = await SendLinearCommand(0.0, 500, log: false);
+                            status = sent ? StreamProtocol.StatusOk : StreamProtocol.StatusError;
+                        }
+                        else
+                        {
+                            status = StreamProtocol.StatusError;
+                        }
+
+                        ack[0] = StreamProtocol.Ack;
+                        BinaryPrimitives.WriteUInt32LittleEndian(ack.AsSpan(1), sequence);
+                        BinaryPrimitives.WriteSingleLittleEndian(ack.AsSpan(5), position);
+                        BinaryPrimitives.WriteUInt32LittleEndian(ack.AsSpan(9), status);
+                        await stream.WriteAsync(ack, 0, ack.Length);
+                    }
+                }
+            }
+            catch (Exception ex) when (_isRunning)
+            {
+                Console.WriteLine($"Stream client error: {ex.Message}");
+            }
+
+            Console.WriteLine("🔗 Stream client disconnected");
+        }
+
+        private static async Task<bool> ReadFrameAsync(NetworkStream stream, byte[] frame)
+        {
+            int offset = 0;
+            while (offset < frame.Length)
+            {
+                int read = await stream.ReadAsync(frame, offset, frame.Length - offset);
+                if (read == 0)
+                {
+                    return false;  // Client closed the connection
+                }
+                offset += read;
+            }
+            return true;
+        }
+
         private async Task ProcessRequest(HttpListenerContext context)
         {
             var request = context.Request;
@@ -120,6 +246,10 @@ namespace HandyButtplugServer
                         responseString = await HandleCommand(request);
                         break;
 
+                    case "/batch":
+                        responseString = await HandleBatch(request);
+                        break;
+
                     default:
                         response.StatusCode = 404;
                         responseString = JsonSerializer.Serialize(new { error = "Endpoint not found" });
@@ -295,10 +425,16 @@ namespace HandyButtplugServer
                         break;
 
                     case "stop":
+                        CancelBatches();
                         await SendLinearCommand(0.0, 500);
                         Console.WriteLine($"🛑 REAL STOP: Moving The Handy to position 0 (full depth)");
                         break;
 
+                    case "cancel":
+                        CancelBatches();
+                        Console.WriteLine("⏹️  Pending batches cancelled");
+                        break;
+
                     default:
                         return JsonSerializer.Serialize(new { error = "Unknown command" });
                 }
@@ -312,28 +448,113 @@ namespace HandyButtplugServer
             }
         }
 
-        private async Task SendLinearCommand(double position, int durationMs)
+        private async Task<string> HandleBatch(HttpListenerRequest request)
+        {
+            try
+            {
+                if (!_isDeviceConnected || _handyDevice == null)
+                {
+                    return JsonSerializer.Serialize(new { error = "No device connected" });
+                }
+
+                string requestBody;
+                using (var reader = new StreamReader(request.InputStream))
+                {
+                    requestBody = await reader.ReadToEndAsync();
+                }
+
+                var batch = JsonSerializer.Deserialize<BatchRequest>(requestBody);
+                if (batch == null || batch.actions.Count == 0 || batch.actions.Any(action => action.Length < 3))
+                {
+                    return JsonSerializer.Serialize(new { error = "Invalid batch format" });
+                }
+
+                if (batch.replace)
+                {
+                    CancelBatches();
+                }
+
+                long startAt = batch.start_at > 0 ? batch.start_at : DateTimeOffset.UtcNow.ToUnixTimeMilliseconds();
+                var token = _batchCancellation.Token;
+                _ = Task.Run(() => RunBatch(startAt, batch.actions, token));
+
+                Console.WriteLine($"📦 Batch scheduled: {batch.actions.Count} actions starting at {startAt}");
+                return JsonSerializer.Serialize(new { status = "Batch scheduled", actions = batch.actions.Count, start_at = startAt });
+            }
+            catch (Exception ex)
+            {
+                Console.WriteLine($"❌ Batch error: {ex.Message}");
+                return JsonSerializer.Serialize(new { error = ex.Message });
+            }
+        }
+
+        // Dispatch a batch on the bridge's own timer: every action is due at start + offset,
+        // measured on one Stopwatch so send latency never accumulates
+        private async Task RunBatch(long startAt, List<double[]> actions, CancellationToken token)
+        {
+            var clock = Stopwatch.StartNew();
+            long startOffset = startAt - DateTimeOffset.UtcNow.ToUnixTimeMilliseconds();
+
+            try
+            {
+                foreach (var action in actions)
+                {
+                    long wait = startOffset + (long)action[0] - clock.ElapsedMilliseconds;
+                    if (wait > 0)
+                    {
+                        await Task.Delay((int)wait, token);
+                    }
+                    token.ThrowIfCancellationRequested();
+
+                    if (!_isDeviceConnected || _handyDevice == null)
+                    {
+                        Console.WriteLine("⚠️  Batch aborted: device not connected");
+                        return;
+                    }
+                    await SendLinearCommand(action[1], (int)action[2], log: false);
+                }
+            }
+            catch (OperationCanceledException)
+            {
+                // Cancelled by stop/cancel or a replacing batch
+            }
+        }
+
+        private void CancelBatches()
+        {
+            var previous = Interlocked.Exchange(ref _batchCancellation, new CancellationTokenSource());
+            previous.Cancel();
+        }
+
+        // log: false on the stream path - console writes per move cost more than the move itself
+        private async Task<bool> SendLinearCommand(double position, int durationMs, bool log = true)
         {
             try
             {
                 if (_handyDevice == null || !_isDeviceConnected)
                 {
                     Console.WriteLine("⚠️  Cannot send command: device not connected");
-                    return;
+                    return false;
                 }
 
                 // Clamp position to 0-1 range
                 position = Math.Max(0.0, Math.Min(1.0, position));
                 uint duration = (uint)Math.Max(100, durationMs);
 
-                Console.WriteLine($"🔄 Using LinearAsync with CORRECT parameter order: duration={duration}, position={position:F2}");
+                if (log)
+                {
+                    Console.WriteLine($"🔄 Using LinearAsync with CORRECT parameter order: duration={duration}, position={position:F2}");
+                }
 
                 // Use the correct method signature: LinearAsync(UInt32 duration, Double position)
                 try
                 {
                     await _handyDevice.LinearAsync(duration, position);
-                    Console.WriteLine($"📤 SUCCESS: LinearAsync sent to {_handyDevice.Name}: duration={duration}ms, position={position:F2}");
-                    return;
+                    if (log)
+                    {
+                        Console.WriteLine($"📤 SUCCESS: LinearAsync sent to {_handyDevice.Name}: duration={duration}ms, position={position:F2}");
+                    }
+                    return true;
                 }
                 catch (Exception ex)
                 {
@@ -341,10 +562,12 @@ namespace HandyButtplugServer
                 }
 
                 Console.WriteLine($"❌ LinearAsync command failed for {_handyDevice.Name}");
+                return false;
             }
             catch (Exception ex)
             {
                 Console.WriteLine($"❌ Error in SendLinearCommand: {ex.Message}");
+                return false;
             }
         }
 
@@ -435,6 +658,7 @@ namespace HandyButtplugServer
         {
             _isRunning = false;
             _httpListener?.Stop();
+            _streamListener?.Stop();
 
             if (_buttplugClient != null && _isConnectedToIntiface)
             {
@@ -289,6 +289,8 @@ class HandyAIStrokerGUI:
         file_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="Load Patterns...", command=self._load_patterns)
+        file_menu.add_command(label="Rescan Patterns", command=self._rescan_patterns)
+        file_menu.add_command(label="Play Full Script...", command=self._play_full_script)
         file_menu.add_separator()
         file_menu.add_command(label="Connect to C# Server", command=self._connect_device)
         file_menu.add_command(label="Disconnect", command=self._disconnect_device)
@@ -515,7 +517,7 @@ class HandyAIStrokerGUI:
             # Force position in session timeline
             if self.session_manager.session_length > 0:
                 override_time = self.arousal_position * self.session_manager.session_length
-                self.session_manager.session_start_time = time.time() - override_time
+                self.session_manager.session_start_time = self.session_manager.clock.time() - override_time
         else:
             # Manual control when no session active
             self.session_manager.update_arousal(arousal_level)
@@ -593,7 +595,10 @@ class HandyAIStrokerGUI:
                 # Update display
                 speed_mult = 1.0
                 if self.playback_engine and hasattr(self.playback_engine, 'session_manager'):
-                    _, speed_mult = self.session_manager.get_next_pattern_recommendation()
+                    # Display only - must not consume the session queue
+                    speed_mult = self.session_manager.calculate_speed_multiplier(
+                        self.session_manager.current_arousal, target_arousal
+                    )
                 
                 # Update labels
                 minutes = remaining // 60
@@ -672,16 +677,28 @@ class HandyAIStrokerGUI:
     def _load_patterns_from_folder(self, folder_path):
         """Load patterns from specified folder"""
         try:
-            self.pattern_manager = PatternManager(folder_path)
+            # Pack mode: memory-mapped binary library, rebuilt (in parallel) when the folders change
+            self.pattern_manager = PatternManager(
+                folder_path, use_pack=True, load_workers=os.cpu_count() or 1
+            )
             
             # Create playback engine with session manager integration
+            if self.playback_engine:
+                self.playback_engine.stop_latency_report()
             self.playback_engine = PlaybackEngine(self.pattern_manager, self.device_client)
             self.playback_engine.set_range(self.min_range, self.max_range)
             self.playback_engine.set_slow_mode(self.slow_mode)
             
+            # Log send/ack/lateness percentiles every minute and keep the latest in latency.json
+            self.playback_engine.start_latency_report(path="latency.json")
+            
             # Add session manager to playback engine
             self.playback_engine.session_manager = self.session_manager
             
+            # Position-continuous session picks via the precomputed transition graph
+            self.session_manager.build_transition_graph(self.pattern_manager)
+            self.session_manager.selection_mode = 'graph'
+            
             total_patterns = self.pattern_manager.get_total_count()
             
             if total_patterns > 0:
@@ -712,17 +729,16 @@ class HandyAIStrokerGUI:
             )
     
     def _load_twerk_patterns(self, twerk_folder_path):
-        """Load twerk patterns from twerk subfolder"""
+        """Set up twerk mode as a view over the already-loaded library's twerk subfolder"""
         try:
-            logger.info(f"Attempting to load twerk patterns from: {twerk_folder_path}")
+            logger.info(f"Setting up twerk mode from: {twerk_folder_path}")
             
-            # List all files in twerk folder for debugging
-            import glob
-            twerk_files = glob.glob(os.path.join(twerk_folder_path, "*.funscript"))
-            logger.info(f"Found {len(twerk_files)} .funscript files in twerk folder")
+            if not self.pattern_manager:
+                logger.warning("Cannot set up twerk mode: main patterns not loaded")
+                return
             
-            # Try to load with PatternManager
-            self.twerk_pattern_manager = PatternManager(twerk_folder_path)
+            # Twerk mode is a filtered view - twerk files are not parsed or held twice
+            self.twerk_pattern_manager = self.pattern_manager.mode_view('twerk')
             twerk_count = self.twerk_pattern_manager.get_total_count()
             
             if twerk_count > 0:
@@ -746,6 +762,7 @@ class HandyAIStrokerGUI:
         if self.twerk_mode:
             # Switch to twerk patterns
             self.playback_engine.pattern_manager = self.twerk_pattern_manager
+            self.session_manager.build_transition_graph(self.twerk_pattern_manager)
             
             # Update button appearance
             self.twerk_button.config(
@@ -759,6 +776,7 @@ class HandyAIStrokerGUI:
         else:
             # Switch back to normal patterns
             self.playback_engine.pattern_manager = self.pattern_manager
+            self.session_manager.build_transition_graph(self.pattern_manager)
             
             # Update button appearance
             self.twerk_button.config(
@@ -952,6 +970,44 @@ class HandyAIStrokerGUI:
             if os.path.exists(twerk_folder):
                 self._load_twerk_patterns(twerk_folder)
     
+    def _rescan_patterns(self):
+        """Pick up added/changed/removed pattern files without reloading"""
+        if not self.pattern_manager:
+            messagebox.showerror("Error", "No patterns loaded")
+            return
+        
+        changes = self.pattern_manager.rescan()
+        total_patterns = self.pattern_manager.get_total_count()
+        self.pattern_status_label.config(
+            text=f"Patterns: {total_patterns} loaded (+{changes['added']} ~{changes['changed']} -{changes['removed']})",
+            fg='#44ff44'
+        )
+    
+    def _play_full_script(self):
+        """Stream a full-length funscript straight from disk"""
+        if not self.playback_engine:
+            messagebox.showerror("Error", "Patterns not loaded or device not connected")
+            return
+        
+        file_path = filedialog.askopenfilename(
+            title="Select funscript",
+            filetypes=[("Funscript", "*.funscript"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        
+        if self.playback_engine.is_playing:
+            self._pause_playback()
+        
+        if self.playback_engine.start_stream_playback(file_path):
+            self.play_button.config(
+                text="PAUSE",
+                bg='#ff8844',
+                fg='white'
+            )
+        else:
+            messagebox.showerror("Error", "Failed to start playback")
+    
     def _connect_device(self):
         """Connect to C# Buttplug Server"""
         self.device_client.connect()
@@ -0,0 +1,152 @@
+"""
+Arousal curve engine
+Generates the multi-peak session curve at a fixed time resolution in one
+vectorized pass and answers "target arousal at t seconds" by linear
+interpolation in O(1), so playback follows a smooth target instead of 15 s steps.
+"""
+
+import logging
+import math
+import random
+from array import array
+from functools import lru_cache
+from typing import List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # Optional - falls back to a pure Python pass
+    np = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CURVE_RESOLUTION = 1.0  # seconds between curve points
+MIN_CURVE_POINTS = 20
+NOISE_INTERVAL = 15.0           # seconds between random noise points (the old curve spacing)
+SMOOTHING_SECONDS = 15.0        # moving average reaches this far either side of a point
+
+class ArousalCurve:
+    """Arousal 0-100 sampled evenly over a session, with interpolated lookup"""
+    __slots__ = ('session_length', 'peaks', 'seed', 'resolution', 'points', '_scale')
+
+    def __init__(self, session_length: float, peaks: int, points: List[float],
+                 seed: Optional[int] = None, resolution: float = DEFAULT_CURVE_RESOLUTION):
+        self.session_length = session_length
+        self.peaks = peaks
+        self.seed = seed
+        self.resolution = resolution
+        self.points = array('d', points)  # 8 bytes per point instead of a float object each
+        # Elapsed seconds -> fractional point index
+        self._scale = (len(points) - 1) / session_length if session_length > 0 else 0.0
+
+    def __len__(self):
+        return len(self.points)
+
+    def at(self, elapsed: float) -> float:
+        """Target arousal at any elapsed time (clamped to the session)"""
+        points = self.points
+        x = elapsed * self._scale
+        if x <= 0:
+            return points[0]
+        index = int(x)
+        if index >= len(points) - 1:
+            return points[-1]
+        low = points[index]
+        return low + (points[index + 1] - low) * (x - index)
+
+    def at_progress(self, progress: float) -> float:
+        """Target arousal at a 0-1 position in the session"""
+        return self.at(progress * self.session_length)
+
+    def resample(self, count: int) -> List[float]:
+        """count evenly spaced values over the session (e.g. for drawing)"""
+        if count < 2:
+            return [self.points[0]]
+        step = self.session_length / (count - 1)
+        return [self.at(i * step) for i in range(count)]
+
+def _curve_numpy(count: int, peaks: int, rng: random.Random, noise_points: int, window: int) -> List[float]:
+    progress = np.linspace(0.0, 1.0, count)
+
+    # Base arousal level (gradual increase over session) plus the peak wave
+    base_arousal = 20 + progress * 30
+    wave_amplitude = 35 + progress * 20
+    arousal = base_arousal + np.sin(progress * peaks * math.pi * 2) * wave_amplitude * 0.5
+
+    # Controlled randomness, drawn at the old 15 s spacing and interpolated
+    noise = np.array([rng.uniform(-3, 3) for _ in range(noise_points)])
+    arousal += np.interp(progress, np.linspace(0.0, 1.0, noise_points), noise)
+
+    # Ensure peaks get progressively more intense
+    if peaks > 1:
+        peak_progress = (progress * peaks) % 1.0
+        near_peak = peak_progress > 0.7
+        arousal += np.where(near_peak, ((progress * 20) + 10) * (peak_progress - 0.7) / 0.3, 0.0)
+
+    arousal = np.clip(arousal, 10, 95)
+    arousal[0] = rng.uniform(15, 25)  # Always start low
+
+    # Smooth with a centered moving average; the ends keep their values
+    if count > 2 * window:
+        kernel = np.ones(2 * window + 1) / (2 * window + 1)
+        arousal[window:-window] = np.convolve(arousal, kernel, mode='valid')
+    return arousal.tolist()
+
+def _curve_python(count: int, peaks: int, rng: random.Random, noise_points: int, window: int) -> List[float]:
+    noise = [rng.uniform(-3, 3) for _ in range(noise_points)]
+    curve = []
+    for i in range(count):
+        progress = i / (count - 1)
+
+        base_arousal = 20 + (progress * 30)
+        wave_amplitude = 35 + (progress * 20)
+        arousal = base_arousal + math.sin(progress * peaks * math.pi * 2) * wave_amplitude * 0.5
+
+        noise_x = progress * (noise_points - 1)
+        noise_index = min(int(noise_x), noise_points - 2)
+        arousal += noise[noise_index] + (noise[noise_index + 1] - noise[noise_index]) * (noise_x - noise_index)
+
+        if peaks > 1:
+            peak_progress = (progress * peaks) % 1.0
+            if peak_progress > 0.7:
+                arousal += ((progress * 20) + 10) * (peak_progress - 0.7) / 0.3
+
+        curve.append(max(10, min(95, arousal)))
+
+    curve[0] = rng.uniform(15, 25)
+
+    if count > 2 * window:
+        # Running sum instead of re-adding the window for every point
+        width = 2 * window + 1
+        running = sum(curve[:width])
+        smoothed = curve[:]
+        for i in range(window, count - window):
+            smoothed[i] = running / width
+            if i + window + 1 < count:
+                running += curve[i + window + 1] - curve[i - window]
+        curve = smoothed
+    return curve
+
+def generate_arousal_curve(session_length: float, peaks: int, seed: Optional[int] = None,
+                           resolution: float = DEFAULT_CURVE_RESOLUTION) -> ArousalCurve:
+    """Generate a multi-peak curve with one point every `resolution` seconds"""
+    peaks = max(1, min(10, peaks))  # Clamp to 1-10 peaks
+    count = max(MIN_CURVE_POINTS, int(session_length / resolution) + 1)
+    spacing = session_length / (count - 1) if session_length > 0 else resolution
+    noise_points = max(2, int(session_length / NOISE_INTERVAL) + 1)
+    window = max(1, round(SMOOTHING_SECONDS / spacing)) if spacing > 0 else 1
+
+    rng = random.Random(seed)
+    build = _curve_numpy if np is not None else _curve_python
+    points = build(count, peaks, rng, noise_points, window)
+    return ArousalCurve(session_length, peaks, points, seed, resolution)
+
+@lru_cache(maxsize=32)
+def _cached_arousal_curve(session_length: float, peaks: int, seed: int, resolution: float) -> ArousalCurve:
+    return generate_arousal_curve(session_length, peaks, seed, resolution)
+
+def build_arousal_curve(session_length: float, peaks: int, seed: Optional[int] = None,
+                        resolution: float = DEFAULT_CURVE_RESOLUTION) -> ArousalCurve:
+    """Seeded curves are cached by (length, peaks, seed, resolution); unseeded ones are always fresh"""
+    if seed is None:
+        return generate_arousal_curve(session_length, peaks, None, resolution)
+    return _cached_arousal_curve(session_length, peaks, seed, resolution)
@@ -0,0 +1,510 @@
+"""
+asyncio device client and playback engine
+Same public API as IntifaceClient/PlaybackEngine, but nothing blocks and no
+threads are started: moves go out over the bridge's stream channel with
+non-blocking writes, HTTP calls and status polling are tasks, and every
+funscript action is a loop.call_at timer. Pattern selection and buffer
+loading run in the default executor, one pattern ahead of the boundary. One
+event loop can drive playback, status checks and many devices at once.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from bridge_stream import DEFAULT_MAX_IN_FLIGHT, FRAME, FRAME_ACK, FRAME_MOVE, FRAME_STOP, STATUS_OK, STREAM_PORT
+from device_handler import PatternManager, PlaybackEngine
+from latency import LatencyHistogram
+
+try:
+    import aiohttp
+except ImportError:  # Optional - only needed for the bridge's HTTP endpoints
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+STATUS_INTERVAL = 2.0  # seconds between /status polls
+PATTERN_GAP = 0.1      # breathing room between patterns, as in PlaybackEngine.play_next
+FLUSH_TIMEOUT = 2.0    # seconds disconnect() waits for the final queued move to go out
+
+class AsyncIntifaceClient:
+    """Non-blocking client for the C# Buttplug Server (stream channel for moves, HTTP for the rest)"""
+
+    def __init__(self, url: str = "http://localhost:8080", use_stream: bool = True,
+                 stream_port: int = STREAM_PORT, http=None, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        self.url = url
+        self.connected = False
+        self.device_connected = False
+        self.connection_callback = None
+
+        # aiohttp.ClientSession - pass one in to share its connection pool between devices
+        self.http = http
+        self._owns_http = http is None
+        self._status_task: Optional[asyncio.Task] = None
+
+        # Stream channel (see bridge_stream.py); None means HTTP per command
+        self.use_stream = use_stream
+        self.stream_port = stream_port
+        self.stream_writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._sequence = itertools.count(1)
+
+        # Unacknowledged move window (as BridgeStream): a move past it is held, newest wins
+        self.max_in_flight = max(1, max_in_flight)
+        self._pending_acks = deque()  # (sequence, perf_counter at send, is move) not acknowledged yet
+        self._moves_in_flight = 0
+        self._held_move = None
+
+        # HTTP fallback: one request in flight, newest command waiting (latest wins)
+        self._pending_http = None
+        self._http_task: Optional[asyncio.Task] = None
+
+        # Counters (frames sent/acked, acks reporting a failure, moves dropped or coalesced)
+        self.sent = 0
+        self.acked = 0
+        self.errors = 0
+        self.dropped = 0
+
+        # Same histograms as IntifaceClient: send = handing a command to the transport
+        # (HTTP: the whole request), ack = bridge round-trip
+        self.send_latency = LatencyHistogram('send')
+        self.ack_latency = LatencyHistogram('ack')
+
+    @property
+    def in_flight(self) -> int:
+        """Moves on the current stream not acknowledged yet (stops do not use the window)"""
+        return self._moves_in_flight
+
+    def latency_histograms(self) -> Dict[str, LatencyHistogram]:
+        return {'send': self.send_latency, 'ack': self.ack_latency}
+
+    def set_connection_callback(self, callback):
+        """Set callback for connection status changes"""
+        self.connection_callback = callback
+
+    async def connect(self) -> bool:
+        """Connect to C# Buttplug Server"""
+        if aiohttp is None:
+            logger.error("aiohttp not installed - run 'pip install aiohttp' to use the asyncio client")
+            self._update_connection_status(False)
+            return False
+
+        if self.http is None:
+            self.http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5))
+            self._owns_http = True
+
+        logger.info(f"Connecting to C# Buttplug Server at {self.url}")
+        try:
+            async with self.http.post(f"{self.url}/connect") as response:
+                if response.status != 200:
+                    logger.error(f"Failed to connect: HTTP {response.status}")
+                    self._update_connection_status(False)
+                    return False
+                result = await response.json()
+        except Exception as e:
+            logger.error(f"Failed to connect to C# server: {e}")
+            self._update_connection_status(False)
+            return False
+
+        # Reconnecting replaces the previous status poll and stream
+        self._cancel_tasks()
+        self._close_stream()
+        self._update_connection_status(True, result.get('device_connected', False))
+        self._status_task = asyncio.create_task(self._check_status_loop())
+        if self.use_stream:
+            await self._open_stream()
+        logger.info("Connected to C# Buttplug Server")
+        return True
+
+    async def disconnect(self):
+        """Disconnect from C# server, after the last queued move (e.g. the home move) went out"""
+        await self.flush()
+        self._cancel_tasks()
+        self._close_stream()
+
+        if self.http is not None and self.connected:
+            try:
+                async with self.http.post(f"{self.url}/disconnect"):
+                    pass
+            except Exception:
+                pass
+        if self.http is not None and self._owns_http:
+            await self.http.close()
+            self.http = None
+        self._update_connection_status(False)
+
+    async def flush(self, timeout: float = FLUSH_TIMEOUT):
+        """Wait up to timeout for buffered stream frames and the queued HTTP command to be sent"""
+        async def drain():
+            writer = self.stream_writer
+            if writer is not None and not writer.is_closing():
+                await writer.drain()
+            if self._http_task is not None and not self._http_task.done():
+                await self._http_task
+
+        try:
+            await asyncio.wait_for(drain(), timeout)
+        except (asyncio.TimeoutError, OSError) as e:
+            logger.warning(f"Pending commands not sent before disconnect: {e!r}")
+
+    async def _open_stream(self):
+        """Open the stream channel; commands fall back to HTTP if the bridge has none"""
+        host = urlparse(self.url).hostname or "localhost"
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, self.stream_port), 2.0)
+        except (OSError, asyncio.TimeoutError) as e:
+            logger.warning(f"Stream channel unavailable at {host}:{self.stream_port}: {e}")
+            logger.info("Using HTTP commands (no stream channel)")
+            return
+        self.stream_writer = writer
+        self._reader_task = asyncio.create_task(self._read_acks(reader))
+        logger.info(f"Stream channel open to {host}:{self.stream_port}")
+
+    def _cancel_tasks(self):
+        for task in (self._status_task, self._reader_task, self._http_task):
+            if task is not None:
+                task.cancel()
+        self._status_task = self._reader_task = self._http_task = None
+
+    def _close_stream(self):
+        writer, self.stream_writer = self.stream_writer, None
+        self._held_move = None
+        if writer is not None:
+            writer.close()
+        self._pending_acks.clear()  # Frames unacknowledged on the old stream never will be
+        self._moves_in_flight = 0
+
+    async def _read_acks(self, reader: asyncio.StreamReader):
+        """Consume ack frames from the bridge"""
+        try:
+            while True:
+                frame_type, sequence, _, status = FRAME.unpack(await reader.readexactly(FRAME.size))
+                if frame_type != FRAME_ACK:
+                    continue
+                self._record_ack(sequence)
+                self.acked += 1
+                if status != STATUS_OK:
+                    self.errors += 1
+                held = self._held_move
+                if held is not None and self.in_flight < self.max_in_flight:
+                    self._held_move = None
+                    self._write_frame(FRAME_MOVE, *held)
+        except (asyncio.IncompleteReadError, OSError) as e:
+            if self.stream_writer is not None:
+                logger.warning(f"Stream channel closed: {e} - falling back to HTTP commands")
+                self._close_stream()
+
+    def _record_ack(self, sequence: int):
+        """Retire frames up to sequence (acks arrive in order; a skipped one is taken as lost)"""
+        pending = self._pending_acks
+        while pending:
+            sent_sequence, sent_at, is_move = pending[0]
+            if sent_sequence > sequence:
+                return
+            pending.popleft()
+            if is_move:
+                self._moves_in_flight -= 1
+            if sent_sequence == sequence:
+                self.ack_latency.record(time.perf_counter() - sent_at)
+                return
+
+    async def _check_status_loop(self):
+        """Periodically check connection status"""
+        while self.connected:
+            try:
+                async with self.http.get(f"{self.url}/status") as response:
+                    if response.status != 200:
+                        self._update_connection_status(False)
+                        return
+                    status = await response.json()
+                device_connected = status.get('device_connected', False)
+                if device_connected != self.device_connected:
+                    self._update_connection_status(True, device_connected)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Status check failed: {e}")
+                self._update_connection_status(False)
+                return
+            await asyncio.sleep(STATUS_INTERVAL)
+
+    def _update_connection_status(self, connected: bool, device_found: bool = False):
+        """Update connection status"""
+        self.connected = connected
+        self.device_connected = device_found
+        if self.connection_callback:
+            self.connection_callback(connected, device_found)
+
+    def send_position_command(self, position: float, duration: int, droppable: bool = True):
+        """Send position command to The Handy via C# server (never waits; call from the loop thread)"""
+        if not self.connected:
+            logger.warning("Cannot send command: not connected to C# server")
+            return
+
+        # Apply position rounding fix for smoother motion
+        position = round(max(0.0, min(1.0, position)), 2)
+
+        if self._send_frame(FRAME_MOVE, position, duration, droppable):
+            return
+        self._queue_http({"command": "move", "position": position, "duration": duration})
+
+    def send_stop_command(self):
+        """Send stop command (go to position 0)"""
+        if not self.connected:
+            return
+        if self._send_frame(FRAME_STOP, 0.0, 0, droppable=False):
+            return
+        self._queue_http({"command": "stop"})
+
+    def clear_pending(self):
+        """Drop a held stream move or queued HTTP command that has not been sent yet"""
+        if self._held_move is not None:
+            self._held_move = None
+            self.dropped += 1
+        if self._pending_http is not None:
+            self._pending_http = None
+            self.dropped += 1
+
+    def _send_frame(self, frame_type: int, position: float, duration: int, droppable: bool = True) -> bool:
+        """Buffer one frame on the stream; False if there is no usable stream"""
+        writer = self.stream_writer
+        if writer is None or writer.is_closing():
+            return False
+        if not droppable:
+            # Stops and home moves go out now and supersede a held move
+            self._held_move = None
+        elif self.in_flight >= self.max_in_flight:
+            # The bridge has not caught up - hold the newest target instead of queueing on it
+            if self._held_move is not None:
+                self.dropped += 1
+            self._held_move = (position, duration)
+            return True
+        self._write_frame(frame_type, position, duration)
+        return True
+
+    def _write_frame(self, frame_type: int, position: float, duration: int):
+        writer = self.stream_writer
+        if writer is None or writer.is_closing():
+            return
+        sent_at = time.perf_counter()
+        sequence = next(self._sequence)
+        writer.write(FRAME.pack(frame_type, sequence, position, max(0, int(duration))))
+        self._pending_acks.append((sequence, sent_at, frame_type == FRAME_MOVE))
+        if frame_type == FRAME_MOVE:
+            self._moves_in_flight += 1
+        self.sent += 1
+        self.send_latency.record(time.perf_counter() - sent_at)
+
+    def _queue_http(self, command: dict):
+        if self._pending_http is not None:
+            self.dropped += 1
+        self._pending_http = command
+        if self._http_task is None or self._http_task.done():
+            self._http_task = asyncio.create_task(self._http_sender())
+
+    async def _http_sender(self):
+        while self._pending_http is not None and self.http is not None:
+            command, self._pending_http = self._pending_http, None
+            sent_at = time.perf_counter()
+            try:
+                async with self.http.post(f"{self.url}/command", json=command) as response:
+                    # The bridge answers once the device command is issued, so this is the round-trip too
+                    round_trip = time.perf_counter() - sent_at
+                    self.send_latency.record(round_trip)
+                    self.ack_latency.record(round_trip)
+                    if response.status != 200:
+                        logger.error(f"Command failed: HTTP {response.status}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to send command: {e}")
+
+class AsyncPlaybackEngine(PlaybackEngine):
+    """PlaybackEngine driven by loop.call_at timers instead of a sleeping thread.
+
+    Engine state is only assigned on the loop: executor jobs pick patterns with
+    the state-free _pick_* helpers and hand their picks back. Batch upload is
+    not supported (the asyncio client has no /batch endpoint).
+    """
+
+    def __init__(self, pattern_manager: PatternManager, device_client, loop: Optional[asyncio.AbstractEventLoop] = None):
+        super().__init__(pattern_manager, device_client)
+        self.loop = loop
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._run = None  # Token of the current run; executor results for an older run are ignored
+        self._starting: Optional[asyncio.Future] = None
+
+        # Cursor into the pattern being played
+        self._timestamps = None
+        self._positions = None
+        self._action_index = 0
+        self._pattern_start = 0.0  # loop time of the pattern's t=0
+        self._scale = 1.0          # timeline_scale() of the pattern being played
+
+        # Lookahead prepared in the executor: next_pattern's buffers, and the job
+        # selecting the pattern after it
+        self._next_buffers = None
+        self._prefetch: Optional[asyncio.Future] = None
+
+    @property
+    def batch_upload(self) -> bool:
+        return False
+
+    @batch_upload.setter
+    def batch_upload(self, enabled: bool):
+        if enabled:
+            raise ValueError("AsyncPlaybackEngine does not support batch upload")
+
+    def start_playback(self, background: bool = True) -> bool:
+        """Start pattern playback on the event loop (call from the loop thread).
+
+        The first picks and their buffers are prepared in the default executor;
+        the first action is scheduled once they are ready.
+        """
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        if self.is_playing or self._starting is not None:
+            return False
+        if not self.pattern_manager or not self.device_client.connected:
+            return False
+
+        run = self._run = object()
+        self._prefetch = None
+        self._starting = self.loop.run_in_executor(None, self._prepare_start, self.dynamic_speed_multiplier)
+        self._starting.add_done_callback(lambda future: self._start_prepared(future, run))
+        return True
+
+    def _prepare_start(self, speed_mult: float):
+        """Executor: pick the first two patterns and load their buffers (state is assigned on the loop)"""
+        first, first_speed = self._pick_first_pattern(speed_mult)
+        if not first:
+            return None
+        next_pattern, next_speed = self._pick_pattern(first.end_pos, first_speed)
+        next_buffers = next_pattern.buffers() if next_pattern else None
+        return first, first_speed, next_pattern, next_speed, first.buffers(), next_buffers
+
+    def _start_prepared(self, future: asyncio.Future, run):
+        self._starting = None
+        if self._run is not run:
+            return  # Stopped while preparing
+        try:
+            prepared = future.result()
+        except Exception as e:
+            logger.error(f"Error starting async playback: {e}")
+            return
+        if prepared is None:
+            logger.error("No patterns available to start playback")
+            return
+
+        (self.current_pattern, self.dynamic_speed_multiplier, self.next_pattern,
+         self.next_speed_multiplier, current_buffers, self._next_buffers) = prepared
+        self.current_position = 0
+        self.is_playing = True
+        logger.info(f"Started smart chaining playback. First: {self.current_pattern.name} (ends at {self.current_pattern.end_pos})")
+        self._begin_pattern(self.loop.time(), current_buffers)
+
+    def stop_playback(self):
+        """Stop pattern playback"""
+        self._end_run()
+        super().stop_playback()
+
+    def emergency_stop(self):
+        """Emergency stop"""
+        self._end_run()
+        super().emergency_stop()
+
+    def _end_run(self):
+        self._run = None
+        self._starting = None
+        self._prefetch = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _begin_pattern(self, start: float, buffers):
+        """Make current_pattern (with its prepared buffers) play from loop time start"""
+        pattern = self.current_pattern
+        logger.info(f"Playing pattern: {pattern.name} ({pattern.start_pos}->{pattern.end_pos})")
+        self._timestamps, self._positions = buffers
+        self._action_index = 0
+        self._pattern_start = start
+        self._scale = self.timeline_scale()
+        if not len(self._timestamps):
+            self._chain(start)
+            return
+        self._timer = self.loop.call_at(self._due(0), self._step)
+
+    def _due(self, index: int) -> float:
+        return self._pattern_start + self._timestamps[index] / 1000.0 * self._scale
+
+    def _step(self):
+        """Timer callback: send the action due now and schedule the next one"""
+        self._timer = None
+        if not self.is_playing:
+            return
+        try:
+            # Same command as PlaybackEngine._play_pattern
+            timestamps = self._timestamps
+            index = self._action_index
+            action_at = timestamps[index]
+            position = self._apply_range_clamp(self._positions[index] / 100.0)
+            if index < len(timestamps) - 1:
+                duration = self._scale_duration(timestamps[index + 1] - action_at, self._scale)
+            else:
+                duration = 500
+            self.lateness.record(max(0.0, self.loop.time() - self._due(index)))
+            self.device_client.send_position_command(position, duration)
+
+            index += 1
+            if index < len(timestamps):
+                self._action_index = index
+                self._timer = self.loop.call_at(self._due(index), self._step)
+            else:
+                self._chain(self._due(index - 1))
+        except Exception as e:
+            logger.error(f"Error in async playback: {e}")
+            self.is_playing = False
+
+    def _prepare_next(self, current_pos: int, speed_mult: float):
+        """Executor: select the pattern after the current one and load its buffers"""
+        pattern, next_speed = self._pick_pattern(current_pos, speed_mult)
+        return pattern, next_speed, pattern.buffers() if pattern else None
+
+    def _chain(self, last_due: float):
+        """Seamless transition to the next pattern (PlaybackEngine.play_next without the sleep)"""
+        if not self.is_playing:
+            return
+        prefetch = self._prefetch
+        if prefetch is not None:
+            if not prefetch.done():
+                # Selection is running late - pick up as soon as it is ready
+                run = self._run
+                prefetch.add_done_callback(lambda _: self._run is run and self._chain(last_due))
+                return
+            self._prefetch = None
+            try:
+                self.next_pattern, self.next_speed_multiplier, self._next_buffers = prefetch.result()
+            except Exception as e:
+                logger.error(f"Error selecting next pattern: {e}")
+                self.is_playing = False
+                return
+
+        logger.info(f"Seamless transition: {self.current_pattern.name} -> {self.next_pattern.name if self.next_pattern else 'None'}")
+        self.current_position = self.current_pattern.end_pos
+        self.current_pattern = self.next_pattern
+        self.dynamic_speed_multiplier = self.next_speed_multiplier
+        if not self.current_pattern:
+            self.is_playing = False
+            return
+
+        # Timed from when the last action was due, so timer lateness does not accumulate;
+        # never earlier than now, or a late pick would burst its leading actions
+        self._begin_pattern(max(last_due + PATTERN_GAP, self.loop.time()), self._next_buffers)
+        # The pick after this one is made off the loop while this pattern plays
+        self._next_buffers = None
+        self._prefetch = self.loop.run_in_executor(None, self._prepare_next, self.current_pattern.end_pos,
+                                                   self.dynamic_speed_multiplier)
@@ -0,0 +1,222 @@
+"""
+Streaming channel to the C# Buttplug bridge
+One persistent TCP connection carries every move as a fixed 13-byte frame
+instead of an HTTP POST per action. The bridge answers each frame with an
+ack frame on the same socket, read by a background thread, so sending never
+waits for the device. At most max_in_flight moves are unacknowledged at a
+time; a move sent while the window is full is held, and replaced by any newer
+one, until an ack opens the window, so a slow device never builds a backlog
+on the bridge. Only moves count against the window; stops, pings and
+non-droppable moves are never held. HTTP stays the fallback (see
+IntifaceClient).
+
+Frame (little-endian, both directions): type u8, sequence u32, position f32, duration/status u32
+"""
+
+import itertools
+import logging
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from typing import Optional, Tuple
+
+from latency import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+STREAM_PORT = 8081
+
+FRAME = struct.Struct('<BIfI')
+FRAME_MOVE = 0x01
+FRAME_STOP = 0x02
+FRAME_PING = 0x03
+FRAME_ACK = 0x81
+
+STATUS_OK = 0
+STATUS_NO_DEVICE = 1
+STATUS_ERROR = 2
+
+DEFAULT_MAX_IN_FLIGHT = 4  # unacknowledged moves before further moves are held (latest wins)
+
+class BridgeStream:
+    """Persistent framed TCP channel to the bridge's stream port"""
+
+    def __init__(self, host: str = "localhost", port: int = STREAM_PORT, timeout: float = 2.0,
+                 ack_latency: Optional[LatencyHistogram] = None, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_in_flight = max(1, max_in_flight)
+        self.sock: Optional[socket.socket] = None
+        self.reader_thread = None
+        self.should_read = False
+        self._send_lock = threading.RLock()
+        self._window = threading.Condition(self._send_lock)  # notified on every ack
+        self._sequence = itertools.count(1)
+        self._held_move: Optional[Tuple[float, int]] = None  # newest move waiting for the window
+
+        # Counters (sent/acked frames, acks reporting a failure, held moves replaced by newer ones)
+        self.sent = 0
+        self.acked = 0
+        self.errors = 0
+        self.coalesced = 0
+        self.last_status = STATUS_OK
+
+        # Send -> ack round-trip; the bridge acks in order, after the device command
+        self.ack_latency = ack_latency or LatencyHistogram('ack')
+        self._pending_acks = deque()  # (sequence, perf_counter at send, is move) not acknowledged yet
+        self._moves_in_flight = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.sock is not None
+
+    @property
+    def in_flight(self) -> int:
+        """Moves sent but not yet acknowledged by the bridge (the window; control frames are not counted)"""
+        return self._moves_in_flight
+
+    def open(self) -> bool:
+        """Connect to the bridge; False if the stream port is not available"""
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.settimeout(None)
+        except OSError as e:
+            logger.warning(f"Stream channel unavailable at {self.host}:{self.port}: {e}")
+            return False
+
+        self.sock = sock
+        self.should_read = True
+        self.reader_thread = threading.Thread(target=self._reader_loop, args=(sock,))
+        self.reader_thread.daemon = True
+        self.reader_thread.start()
+        logger.info(f"Stream channel open to {self.host}:{self.port}")
+        return True
+
+    def close(self):
+        """Close the channel (the reader thread exits on its own)"""
+        self.should_read = False
+        sock, self.sock = self.sock, None
+        with self._window:
+            self._held_move = None
+            self._pending_acks.clear()  # Frames unacknowledged on this socket never will be
+            self._moves_in_flight = 0
+            self._window.notify_all()
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def wait_window(self, timeout: Optional[float] = None) -> bool:
+        """Block until a move can go out without being held; False on timeout or a closed channel"""
+        with self._window:
+            return self._window.wait_for(
+                lambda: self.sock is None or self.in_flight < self.max_in_flight, timeout
+            ) and self.sock is not None
+
+    def send_move(self, position: float, duration: int, droppable: bool = True) -> bool:
+        """Send a move, or hold it (replacing an older held move) while the window is full.
+
+        A non-droppable move (e.g. the home move after stopping) goes out right
+        away and supersedes a held move, like a stop.
+        """
+        with self._window:
+            if not droppable:
+                if self._held_move is not None:
+                    self._held_move = None
+                    self.coalesced += 1
+            elif self.sock is not None and self.in_flight >= self.max_in_flight:
+                if self._held_move is not None:
+                    self.coalesced += 1
+                self._held_move = (position, duration)
+                return True
+            return self._send(FRAME_MOVE, position, duration)
+
+    def send_stop(self) -> bool:
+        """Send a stop right away; it supersedes a held move"""
+        with self._window:
+            if self._held_move is not None:
+                self._held_move = None
+                self.coalesced += 1
+            return self._send(FRAME_STOP, 0.0, 0)
+
+    def ping(self) -> bool:
+        return self._send(FRAME_PING, 0.0, 0)
+
+    def _send(self, frame_type: int, position: float, duration: int) -> bool:
+        """Write one frame; False (and the channel closed) if the socket failed"""
+        sock = self.sock
+        if sock is None:
+            return False
+        try:
+            with self._send_lock:
+                sequence = next(self._sequence)
+                is_move = frame_type == FRAME_MOVE
+                self._pending_acks.append((sequence, time.perf_counter(), is_move))
+                if is_move:
+                    self._moves_in_flight += 1
+                sock.sendall(FRAME.pack(frame_type, sequence, position, max(0, int(duration))))
+                self.sent += 1
+            return True
+        except OSError as e:
+            logger.error(f"Stream channel send failed: {e}")
+            self.close()
+            return False
+
+    def _release_held_move(self):
+        """Called on every ack: wake waiters and send the held move once the window has room"""
+        with self._window:
+            self._window.notify_all()
+            held = self._held_move
+            if held is None or self.in_flight >= self.max_in_flight:
+                return
+            self._held_move = None
+            self._send(FRAME_MOVE, *held)
+
+    def _reader_loop(self, sock: socket.socket):
+        """Consume ack frames from the bridge"""
+        frame = bytearray(FRAME.size)
+        view = memoryview(frame)
+        while self.should_read:
+            try:
+                received = 0
+                while received < FRAME.size:
+                    count = sock.recv_into(view[received:])
+                    if count == 0:
+                        raise ConnectionError("bridge closed the stream")
+                    received += count
+            except (OSError, ConnectionError) as e:
+                if self.should_read:
+                    logger.warning(f"Stream channel closed: {e}")
+                    self.close()
+                return
+
+            frame_type, sequence, _, status = FRAME.unpack(frame)
+            if frame_type != FRAME_ACK:
+                continue
+            with self._window:
+                self._record_ack(sequence)
+                self.acked += 1
+            self.last_status = status
+            if status != STATUS_OK:
+                self.errors += 1
+            self._release_held_move()
+
+    def _record_ack(self, sequence: int):
+        """Retire frames up to sequence (acks arrive in order; a skipped one is taken as lost)"""
+        pending = self._pending_acks
+        while pending:
+            sent_sequence, sent_at, is_move = pending[0]
+            if sent_sequence > sequence:
+                return
+            pending.popleft()
+            if is_move:
+                self._moves_in_flight -= 1
+            if sent_sequence == sequence:
+                self.ack_latency.record(time.perf_counter() - sent_at)
+                return
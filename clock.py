@@ -0,0 +1,45 @@
+"""
+Clocks
+PlaybackEngine and SessionManager read time and sleep through a clock object,
+so the same code runs against wall time or against a virtual clock that jumps
+forward instead of blocking (see simulator.py).
+"""
+
+import threading
+import time
+
+class SystemClock:
+    """Wall-clock time"""
+
+    def time(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+SYSTEM_CLOCK = SystemClock()
+
+class VirtualClock:
+    """Simulated time: sleep() advances the clock instantly instead of blocking.
+
+    Meant for a single simulated thread of control - every sleeping thread
+    moves the shared clock forward.
+    """
+
+    def __init__(self, start: float = 1_000_000.0):
+        # Non-zero start: SessionManager treats session_start_time == 0 as "no session"
+        self._now = start
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        return self._now
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            with self._lock:
+                self._now += seconds
+
+    def advance(self, seconds: float):
+        """Move time forward without anyone sleeping"""
+        self.sleep(seconds)
@@ -0,0 +1,166 @@
+"""
+Non-blocking command sender
+Playback hands moves to a bounded queue and returns at once; one sender
+thread delivers them to the bridge. When delivery falls behind (a slow HTTP
+round-trip, a busy bridge), moves whose time has already passed are replaced
+by the newest target instead of being replayed late, so lateness never
+compounds on the playback thread. Stops, and moves submitted as
+non-droppable (e.g. the home move after stopping playback), are never
+dropped.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from latency import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_DEPTH = 8
+STOP = None  # Queue marker for a stop command
+
+class CommandSender:
+    """Bounded latest-wins queue of moves drained by one sender thread"""
+
+    def __init__(self, send_move: Callable[[float, int, bool], None], send_stop: Callable[[], None],
+                 max_depth: int = DEFAULT_MAX_DEPTH):
+        self.send_move = send_move  # send_move(position, duration, droppable)
+        self.send_stop = send_stop
+        self.max_depth = max(1, max_depth)
+        self.queue = deque()  # (queued at, position, duration ms, droppable), or STOP
+        self.condition = threading.Condition()
+        self.sender_thread = None
+        self.should_send = False
+        self._draining = False
+        self._busy = False
+
+        # Counters (delivered moves, moves dropped as stale or by overflow)
+        self.sent = 0
+        self.dropped = 0
+        self.max_seen_depth = 0
+        self.queue_latency = LatencyHistogram('queue')  # submit -> handed to the transport
+
+    @property
+    def depth(self) -> int:
+        """Moves waiting to be delivered"""
+        return len(self.queue)
+
+    def start(self):
+        self.should_send = True
+        self._draining = False
+        if not self.sender_thread or not self.sender_thread.is_alive():
+            self.sender_thread = threading.Thread(target=self._sender_loop)
+            self.sender_thread.daemon = True
+            self.sender_thread.start()
+
+    def stop(self, drain: bool = False, timeout: Optional[float] = None) -> bool:
+        """Stop the sender thread; queued moves are discarded, or delivered first with drain=True.
+
+        With drain=True and a timeout, waits up to timeout for the queue to be
+        delivered and discards whatever is left after it; returns False then.
+        """
+        with self.condition:
+            if drain:
+                self._draining = True
+            else:
+                self.should_send = False
+                self._drop_all()
+            self.condition.notify_all()
+        if not drain or timeout is None:
+            return True
+        if self.wait_idle(timeout):
+            return True
+        self.stop()
+        return False
+
+    def submit_move(self, position: float, duration: int, droppable: bool = True):
+        """Queue a move; never blocks on I/O. A non-droppable move is always delivered."""
+        with self.condition:
+            if len(self.queue) >= self.max_depth:
+                # Overflow drops the oldest droppable move; stops and pinned moves stay,
+                # even if that takes the queue past max_depth
+                for index, command in enumerate(self.queue):
+                    if command is not STOP and command[3]:
+                        del self.queue[index]
+                        self.dropped += 1
+                        break
+            self.queue.append((time.monotonic(), position, duration, droppable))
+            self.max_seen_depth = max(self.max_seen_depth, len(self.queue))
+            self.condition.notify()
+
+    def submit_stop(self):
+        """Drop every queued move and send a stop next"""
+        with self.condition:
+            self._drop_all()
+            self.queue.append(STOP)
+            self.condition.notify()
+
+    def clear(self):
+        """Drop every queued move (e.g. before a stop/home command)"""
+        with self.condition:
+            self._drop_all()
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Block until the queue is drained and nothing is in flight"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.queue or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def _drop_all(self):
+        self.dropped += sum(1 for command in self.queue if command is not STOP)
+        self.queue.clear()
+
+    def _next_command(self):
+        """Oldest live command; moves that expired while a newer one waits are dropped (latest wins)"""
+        now = time.monotonic()
+        while len(self.queue) > 1:
+            command = self.queue[0]
+            if command is STOP:
+                # A stop is never skipped, only merged into a following stop
+                if self.queue[1] is not STOP:
+                    break
+            elif not command[3] or now - command[0] < command[2] / 1000.0:
+                break
+            else:
+                self.dropped += 1
+            self.queue.popleft()
+        return self.queue.popleft()
+
+    def _sender_loop(self):
+        while True:
+            with self.condition:
+                while self.should_send and not self.queue and not self._draining:
+                    self.condition.wait()
+                if not self.should_send or not self.queue:
+                    self.should_send = False
+                    self._busy = False
+                    self.condition.notify_all()
+                    return
+                command = self._next_command()
+                self._busy = True
+            if command is not STOP:
+                self.queue_latency.record(time.monotonic() - command[0])
+
+            delivered = False
+            try:
+                if command is STOP:
+                    self.send_stop()
+                else:
+                    self.send_move(command[1], command[2], command[3])
+                    delivered = True
+            except Exception as e:
+                logger.error(f"Command sender failed to deliver: {e}")
+
+            with self.condition:
+                if delivered:
+                    self.sent += 1
+                self._busy = False
+                self.condition.notify_all()
@@ -1,48 +1,272 @@
-import json
 import os
+import queue
 import random
 import threading
 import time
 import logging
-from typing import List, Dict, Optional
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+from urllib.parse import urlparse
+from bridge_stream import STREAM_PORT, BridgeStream
+from clock import SYSTEM_CLOCK
+from command_sender import DEFAULT_MAX_DEPTH, CommandSender
+from latency import DEFAULT_REPORT_INTERVAL, LatencyHistogram, LatencyReporter
+from funscript_io import file_content_hash, iter_funscript_actions, read_funscript_buffers, read_funscript_metadata
+from pattern_categories import (CATEGORY_ENDPOINTS, PATTERN_CATEGORIES, _pattern_stem, classify_pattern_endpoints,
+                                pattern_key)
+from pattern_pack import DEFAULT_PACK_NAME, library_signature, open_pack, write_pack
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class PatternActions:
+    """Read-only list-like view over a pattern's timestamp and position buffers.
+
+    Indexing yields ``{'at': ..., 'pos': ...}`` dicts built on demand, so code
+    written against the old list-of-dicts ``actions`` keeps working while the
+    pattern itself only holds two compact typed arrays.
+    """
+    __slots__ = ('_at', '_pos')
+
+    def __init__(self, at, pos):
+        self._at = at
+        self._pos = pos
+
+    def __len__(self):
+        return len(self._at)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [{'at': at, 'pos': pos} for at, pos in zip(self._at[index], self._pos[index])]
+        return {'at': self._at[index], 'pos': self._pos[index]}
+
+    def __iter__(self):
+        for at, pos in zip(self._at, self._pos):
+            yield {'at': at, 'pos': pos}
+
+    def __repr__(self):
+        return f"PatternActions({len(self)} actions)"
+
 class FunscriptPattern:
-    """Class to handle individual funscript pattern data"""
-    def __init__(self, file_path: str):
+    """Class to handle individual funscript pattern data
+
+    Actions are stored as two parallel typed arrays (``at`` in ms, ``pos`` 0-100)
+    instead of a list of dicts, which keeps thousands of loaded slices small and
+    out of the garbage collector's way during playback.
+
+    A lazy pattern (see ``make_lazy``) keeps only its metadata and fetches the
+    arrays through an ``ActionCache`` whenever they are needed.
+    """
+    __slots__ = ('file_path', 'name', '_at', '_pos', 'duration', 'start_pos', 'end_pos',
+                 'action_count', 'file_offset', '_cache')
+
+    def __init__(self, file_path: str, load: bool = True):
         self.file_path = file_path
         self.name = os.path.basename(file_path)
-        self.actions = []
+        self._at = array('i')
+        self._pos = array('B')
         self.duration = 0
         self.start_pos = 0
         self.end_pos = 0
-        self.load_pattern()
-    
+        self.action_count = 0
+        self.file_offset = -1  # Action offset inside a pattern pack, -1 for loose files
+        self._cache = None
+        if load:
+            self.load_pattern()
+
+    @property
+    def at(self):
+        """Timestamps in ms"""
+        return self.buffers()[0]
+
+    @property
+    def pos(self):
+        """Positions 0-100"""
+        return self.buffers()[1]
+
+    @property
+    def actions(self) -> PatternActions:
+        """Read-only view that behaves like the original list of action dicts"""
+        return PatternActions(*self.buffers())
+
+    @property
+    def is_lazy(self) -> bool:
+        return self._cache is not None
+
+    def buffers(self):
+        """Return (timestamps, positions), loading them through the cache if lazy"""
+        if self._cache is not None:
+            return self._cache.get(self)
+        return self._at, self._pos
+
+    def set_actions(self, at, pos):
+        """Install timestamp/position buffers and refresh the derived metadata"""
+        self._at = at
+        self._pos = pos
+        self.action_count = len(at)
+        if len(at):
+            self.duration = at[-1]
+            self.start_pos = pos[0]
+            self.end_pos = pos[-1]
+        else:
+            self.duration = 0
+            self.start_pos = 0
+            self.end_pos = 0
+
+    def set_metadata(self, duration: int, start_pos: int, end_pos: int, action_count: int, file_offset: int = -1):
+        """Describe the pattern without holding its actions (lazy catalogs)"""
+        self.duration = duration
+        self.start_pos = start_pos
+        self.end_pos = end_pos
+        self.action_count = action_count
+        self.file_offset = file_offset
+
+    def make_lazy(self, cache: 'ActionCache'):
+        """Drop the in-memory actions; they are reloaded on demand through ``cache``"""
+        self._cache = cache
+        self._at = None
+        self._pos = None
+
+    def read_buffers(self, pack=None):
+        """Read this pattern's actions from its source (pack slice or funscript file)"""
+        if pack is not None and self.file_offset >= 0:
+            return pack.slice_buffers(self.file_offset, self.action_count)
+        return read_funscript_buffers(self.file_path)
+
     def load_pattern(self):
         """Load and parse funscript data from file"""
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.actions = data.get('actions', [])
+            self.set_actions(*read_funscript_buffers(self.file_path))
                 
-                if self.actions:
-                    self.duration = self.actions[-1]['at']
-                    self.start_pos = self.actions[0]['pos']
-                    self.end_pos = self.actions[-1]['pos']
-                    
-                logger.info(f"Loaded pattern: {self.name} ({len(self.actions)} actions, "
-                           f"{self.start_pos}->{self.end_pos}, {self.duration}ms)")
+            logger.info(f"Loaded pattern: {self.name} ({self.action_count} actions, "
+                       f"{self.start_pos}->{self.end_pos}, {self.duration}ms)")
                 
         except Exception as e:
             logger.error(f"Error loading pattern {self.file_path}: {e}")
+    
+    def load_metadata(self):
+        """Read duration, endpoints and action count only (lazy catalogs)"""
+        try:
+            self.set_metadata(*read_funscript_metadata(self.file_path))
+            
+            logger.info(f"Indexed pattern: {self.name} ({self.action_count} actions, "
+                       f"{self.start_pos}->{self.end_pos}, {self.duration}ms)")
+            
+        except Exception as e:
+            logger.error(f"Error reading pattern {self.file_path}: {e}")
+
+class ActionCache:
+    """Thread-safe LRU cache of action buffers for lazily loaded patterns"""
+    def __init__(self, max_patterns: int = 256, pack=None):
+        self.max_patterns = max(1, max_patterns)
+        self.pack = pack
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pattern: FunscriptPattern):
+        """Return (timestamps, positions) for a pattern, loading it on a miss"""
+        key = pattern.file_path
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        
+        # Read outside the lock so a slow disk does not block other lookups
+        try:
+            entry = pattern.read_buffers(self.pack)
+        except Exception as e:
+            logger.error(f"Error loading pattern actions {pattern.file_path}: {e}")
+            return array('i'), array('B')
+        
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_patterns:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, file_path: str):
+        """Forget cached actions for a file (e.g. after it changed on disk)"""
+        with self._lock:
+            self._entries.pop(file_path, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+# Playback modes over one shared library: mode -> library subfolders it draws from
+# (None = the whole library)
+PATTERN_MODES = {
+    'normal': None,
+    'twerk': ('twerk',),
+}
+
+# Library subfolders (relative to the funscript folder) and whether they hold transitions
+LIBRARY_FOLDERS = (
+    ('bj', False),
+    ('transitions', True),
+    ('twerk', False),   # Twerk patterns (50->50)
+)
+
+class ManifestEntry:
+    """What the library knew about one file at its last (re)scan"""
+    __slots__ = ('mtime_ns', 'size', 'content_hash', 'pattern', 'category')
+
+    def __init__(self, mtime_ns: int, size: int, content_hash: Optional[str],
+                 pattern: Optional[FunscriptPattern], category: Optional[str]):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.content_hash = content_hash
+        self.pattern = pattern
+        self.category = category
+
+def _parse_pattern(file_path: str, metadata_only: bool = False) -> Optional[FunscriptPattern]:
+    """Parse one funscript (metadata only for lazy catalogs); None if it has no actions"""
+    pattern = FunscriptPattern(file_path, load=not metadata_only)
+    if metadata_only:
+        pattern.load_metadata()
+    return pattern if pattern.action_count else None
+
+class _PackEntries:
+    """(relative path, timestamps, positions) per pattern for write_pack, read on iteration"""
+    
+    def __init__(self, funscript_folder: str, patterns: List[FunscriptPattern]):
+        self.funscript_folder = funscript_folder
+        self.patterns = patterns
+    
+    def __len__(self):
+        return len(self.patterns)
+    
+    def __iter__(self):
+        for pattern in self.patterns:
+            rel_path = os.path.relpath(pattern.file_path, self.funscript_folder)
+            if pattern.is_lazy:
+                yield (rel_path, *pattern.read_buffers())
+            else:
+                yield (rel_path, *pattern.buffers())
 
 class PatternManager:
     """Manages loading and categorizing funscript patterns"""
-    def __init__(self, funscript_folder: str):
+    def __init__(self, funscript_folder: str, use_pack: bool = False, pack_path: Optional[str] = None,
+                 load_workers: int = 1, load_processes: bool = False,
+                 lazy: bool = False, cache_size: int = 256):
         self.funscript_folder = funscript_folder
+        
+        # Parallel ingestion: >1 worker parses files on a thread (or process) pool
+        self.load_workers = max(1, load_workers)
+        self.load_processes = load_processes
+        
         self.main_patterns_0_to_0 = []
         self.main_patterns_100_to_100 = []
         self.main_patterns_50_to_50 = []  # Twerk patterns
@@ -52,100 +276,199 @@ class PatternManager:
         self.transitions_50_to_100 = [] # Twerk to surface
         self.transitions_0_to_50 = []   # Deep to twerk
         self.transitions_100_to_50 = [] # Surface to twerk
-        self.load_all_patterns()
+        
+        # Registry: O(1) lookups by name/stem and precomputed views; rebuilt in
+        # category order after every load and rescan (see _rebuild_registry)
+        self._by_name: Dict[str, FunscriptPattern] = {}
+        self._by_stem: Dict[str, FunscriptPattern] = {}
+        self._by_key: Dict[str, FunscriptPattern] = {}  # '<folder>/<name>', unique across folders
+        self.patterns_by_category: Dict[str, List[FunscriptPattern]] = {
+            category: getattr(self, category) for category in PATTERN_CATEGORIES
+        }
+        self.patterns_by_endpoints: Dict[Tuple[int, int], List[FunscriptPattern]] = {
+            CATEGORY_ENDPOINTS[category]: getattr(self, category) for category in PATTERN_CATEGORIES
+        }
+        self._all_patterns: Optional[Tuple[int, List[FunscriptPattern]]] = None  # (generation, patterns)
+        self._total_count = 0
+        self._generation = 0  # Bumped on every library change (mode views refresh on it)
+        self._mode_views: Dict[str, 'PatternModeView'] = {}
+        
+        # Pack mode: memory-map a prebuilt binary library instead of parsing every file
+        if use_pack and not pack_path:
+            pack_path = os.path.join(funscript_folder, DEFAULT_PACK_NAME)
+        self.pack_path = pack_path
+        self._pack = None
+        
+        # Lazy catalog mode: keep only per-pattern metadata, load actions on demand into an LRU
+        self.action_cache = ActionCache(cache_size) if lazy else None
+        
+        if self.pack_path:
+            self.load_from_pack()
+        else:
+            self.load_all_patterns()
+        
+        # Manifest of library files for incremental rescans / hot reload
+        self.manifest: Dict[str, ManifestEntry] = {}
+        self._rescan_lock = threading.Lock()
+        self._library_lock = threading.Lock()  # Held while swapping in updated category lists
+        self.watch_thread = None
+        self.should_watch = False
+        self._build_manifest()
     
     def load_all_patterns(self):
         """Load and categorize all patterns from folders"""
         logger.info(f"Loading patterns from: {self.funscript_folder}")
         
-        # Load main BJ patterns
-        bj_folder = os.path.join(self.funscript_folder, 'bj')
-        if os.path.exists(bj_folder):
-            self._load_patterns_from_folder(bj_folder, is_transition=False)
+        # bj/ (main), transitions/ and twerk/ (50->50) subfolders
+        for folder, is_transition in LIBRARY_FOLDERS:
+            folder_path = os.path.join(self.funscript_folder, folder)
+            if os.path.exists(folder_path):
+                self._load_patterns_from_folder(folder_path, is_transition=is_transition)
+        
+        self._rebuild_registry()
+        self._log_pattern_summary()
+    
+    def load_from_pack(self):
+        """Load patterns as zero-copy views over the pack, rebuilding it when the folders changed"""
+        signature = library_signature(self.funscript_folder, [folder for folder, _ in LIBRARY_FOLDERS])
+        pack = open_pack(self.pack_path, signature)
         
-        # Load transition patterns
-        transitions_folder = os.path.join(self.funscript_folder, 'transitions')
-        if os.path.exists(transitions_folder):
-            self._load_patterns_from_folder(transitions_folder, is_transition=True)
+        if pack is None:
+            # Missing or stale pack - parse the folders once and write a fresh pack
+            logger.info(f"Rebuilding pattern pack: {self.pack_path}")
+            self.load_all_patterns()
+            try:
+                self.build_pack(self.pack_path, signature)
+            except OSError as e:
+                logger.error(f"Failed to write pattern pack {self.pack_path}: {e}")
+                return
+            pack = open_pack(self.pack_path, signature)
+            if pack is not None:
+                self._attach_pack(pack)
+            return
         
-        # Load twerk patterns (50->50) directly from twerk subfolder
-        twerk_folder = os.path.join(self.funscript_folder, 'twerk')
-        if os.path.exists(twerk_folder):
-            self._load_patterns_from_folder(twerk_folder, is_transition=False)
+        self._pack = pack
+        if self.action_cache is not None:
+            self.action_cache.pack = pack
+        for record in pack.records():
+            if record.category not in PATTERN_CATEGORIES:
+                logger.warning(f"Skipping pattern with unknown category in pack: {record.path}")
+                continue
+            pattern = FunscriptPattern(os.path.join(self.funscript_folder, record.path), load=False)
+            if self.action_cache is not None:
+                # Lazy: metadata only, actions are sliced out of the pack on first use
+                pattern.set_metadata(record.duration, record.start_pos, record.end_pos,
+                                     record.action_count, record.action_offset)
+            else:
+                pattern.set_actions(*pack.action_buffers(record))
+                pattern.file_offset = record.action_offset
+            self._add_pattern(pattern, record.category)
         
+        self._rebuild_registry()
+        logger.info(f"Loaded {pack.pattern_count} patterns from pack: {self.pack_path}")
         self._log_pattern_summary()
     
+    def build_pack(self, pack_path: Optional[str] = None, signature: Optional[bytes] = None):
+        """Write the currently loaded library to a binary pack file"""
+        pack_path = pack_path or self.pack_path or os.path.join(self.funscript_folder, DEFAULT_PACK_NAME)
+        if signature is None:
+            signature = library_signature(self.funscript_folder, [folder for folder, _ in LIBRARY_FOLDERS])
+        
+        # Lazy patterns are read straight from disk, one at a time, instead of churning the LRU
+        categories = [(category, _PackEntries(self.funscript_folder, getattr(self, category)))
+                      for category in PATTERN_CATEGORIES]
+        write_pack(pack_path, signature, categories)
+    
+    def _attach_pack(self, pack):
+        """Point the loaded patterns at a freshly written pack"""
+        by_path = {os.path.normpath(pattern.file_path): pattern for pattern in self.get_all_patterns()}
+        for record in pack.records():
+            pattern = by_path.get(os.path.normpath(os.path.join(self.funscript_folder, record.path)))
+            if pattern is None:
+                continue
+            if pattern.is_lazy:
+                pattern.file_offset = record.action_offset
+            else:
+                pattern.set_actions(*pack.action_buffers(record))
+                pattern.file_offset = record.action_offset
+        
+        self._pack = pack
+        if self.action_cache is not None:
+            self.action_cache.pack = pack
+            self.action_cache.clear()
+    
     def _load_patterns_from_folder(self, folder_path: str, is_transition: bool):
         """Load patterns from specific folder and categorize them"""
-        for filename in os.listdir(folder_path):
-            if filename.lower().endswith('.funscript'):
-                file_path = os.path.join(folder_path, filename)
-                pattern = FunscriptPattern(file_path)
-                
-                if pattern.actions:  # Only add valid patterns
+        # Sorted so category lists come out in the same order on every load
+        file_paths = [
+            os.path.join(folder_path, filename)
+            for filename in sorted(os.listdir(folder_path))
+            if filename.lower().endswith('.funscript')
+        ]
+        
+        if self.load_workers > 1 and len(file_paths) > 1:
+            self._load_patterns_parallel(file_paths, is_transition)
+            return
+        
+        metadata_only = self.action_cache is not None
+        for file_path in file_paths:
+            pattern = _parse_pattern(file_path, metadata_only)
+            
+            if pattern is not None:  # Only add valid patterns
+                self._categorize_pattern(pattern, is_transition)
+    
+    def _load_patterns_parallel(self, file_paths: List[str], is_transition: bool):
+        """Parse files on a worker pool, then categorize them in file order"""
+        executor_class = ProcessPoolExecutor if self.load_processes else ThreadPoolExecutor
+        chunksize = max(1, len(file_paths) // (self.load_workers * 4))
+        
+        with executor_class(max_workers=self.load_workers) as executor:
+            # map() yields in submission order, so the merge is deterministic
+            metadata_only = [self.action_cache is not None] * len(file_paths)
+            for pattern in executor.map(_parse_pattern, file_paths, metadata_only, chunksize=chunksize):
+                if pattern is not None:
                     self._categorize_pattern(pattern, is_transition)
     
-    def _categorize_pattern(self, pattern: FunscriptPattern, is_transition: bool):
+    def _categorize_pattern(self, pattern: FunscriptPattern, is_transition: bool) -> Optional[str]:
         """Categorize pattern based on start/end positions with relaxed thresholds"""
         
         # DEBUG: Log every pattern's actual positions
         logger.info(f"DEBUG: {pattern.name} -> start:{pattern.start_pos} end:{pattern.end_pos}")
         
-        # RELAXED THRESHOLDS - More flexible position ranges
-        start_deep = pattern.start_pos <= 30      # Was <=10, now <=30
-        end_deep = pattern.end_pos <= 30          # Was <=10, now <=30
-        start_shallow = pattern.start_pos >= 70   # Was >=90, now >=70
-        end_shallow = pattern.end_pos >= 70       # Was >=90, now >=70
-        start_mid = 35 <= pattern.start_pos <= 65 # Slightly wider range for twerk
-        end_mid = 35 <= pattern.end_pos <= 65     # Slightly wider range for twerk
-        
-        if is_transition:
-            # Transition patterns: start != end
-            if start_deep and end_shallow:
-                self.transitions_0_to_100.append(pattern)
-                logger.info(f"Categorized {pattern.name} as transition 0->100")
-            elif start_shallow and end_deep:
-                self.transitions_100_to_0.append(pattern)
-                logger.info(f"Categorized {pattern.name} as transition 100->0")
-            elif start_mid and end_deep:
-                self.transitions_50_to_0.append(pattern)
-                logger.info(f"Categorized {pattern.name} as transition 50->0")
-            elif start_mid and end_shallow:
-                self.transitions_50_to_100.append(pattern)
-                logger.info(f"Categorized {pattern.name} as transition 50->100")
-            elif start_deep and end_mid:
-                self.transitions_0_to_50.append(pattern)
-                logger.info(f"Categorized {pattern.name} as transition 0->50")
-            elif start_shallow and end_mid:
-                self.transitions_100_to_50.append(pattern)
-                logger.info(f"Categorized {pattern.name} as transition 100->50")
-            else:
-                logger.warning(f"Uncategorized transition pattern {pattern.name}: {pattern.start_pos}→{pattern.end_pos}")
-        else:
-            # Main patterns: start ≈ end (allow some variance)
-            position_diff = abs(pattern.start_pos - pattern.end_pos)
-            
-            if start_deep and end_deep and position_diff <= 20:  # Allow 20 position variance
-                self.main_patterns_0_to_0.append(pattern)
-                logger.info(f"Categorized {pattern.name} as main 0->0")
-            elif start_shallow and end_shallow and position_diff <= 20:
-                self.main_patterns_100_to_100.append(pattern)
-                logger.info(f"Categorized {pattern.name} as main 100->100")
-            elif start_mid and end_mid and position_diff <= 20:
-                self.main_patterns_50_to_50.append(pattern)
-                logger.info(f"Categorized {pattern.name} as main 50->50 (twerk)")
-            else:
-                # FALLBACK: If pattern doesn't fit strict categories, guess based on average position
-                avg_pos = (pattern.start_pos + pattern.end_pos) / 2
-                if avg_pos <= 35:
-                    self.main_patterns_0_to_0.append(pattern)
-                    logger.info(f"Categorized {pattern.name} as main 0->0 (fallback - avg pos {avg_pos:.1f})")
-                elif avg_pos >= 65:
-                    self.main_patterns_100_to_100.append(pattern)
-                    logger.info(f"Categorized {pattern.name} as main 100->100 (fallback - avg pos {avg_pos:.1f})")
-                else:
-                    self.main_patterns_50_to_50.append(pattern)
-                    logger.info(f"Categorized {pattern.name} as main 50->50 (fallback - avg pos {avg_pos:.1f})")
+        category, label = classify_pattern_endpoints(pattern.start_pos, pattern.end_pos, is_transition)
+        if category is None:
+            logger.warning(f"Uncategorized transition pattern {pattern.name}: {pattern.start_pos}→{pattern.end_pos}")
+            return None
+        
+        self._add_pattern(pattern, category)
+        logger.info(f"Categorized {pattern.name} as {label}")
+        return category
+    
+    def _add_pattern(self, pattern: FunscriptPattern, category: str):
+        """Append a pattern to its category list (dropping its actions in lazy mode)"""
+        if self.action_cache is not None and not pattern.is_lazy:
+            pattern.make_lazy(self.action_cache)
+        getattr(self, category).append(pattern)
+        self._total_count += 1
+        self._generation += 1
+    
+    def _rebuild_registry(self):
+        """Rebuild the name/stem/key lookups from the category lists.
+        
+        Walks the patterns in category order and keeps the first one per name,
+        exactly like the old linear scan over get_all_patterns(), so duplicate
+        names resolve the same way after a load and after any rescan.
+        """
+        by_name: Dict[str, FunscriptPattern] = {}
+        by_stem: Dict[str, FunscriptPattern] = {}
+        by_key: Dict[str, FunscriptPattern] = {}
+        for pattern in self.get_all_patterns():
+            by_name.setdefault(pattern.name, pattern)
+            by_stem.setdefault(_pattern_stem(pattern.name), pattern)
+            by_key.setdefault(pattern_key(pattern), pattern)
+        self._by_name = by_name
+        self._by_stem = by_stem
+        self._by_key = by_key
     
     def _log_pattern_summary(self):
         """Log summary of loaded patterns"""
@@ -160,42 +483,273 @@ class PatternManager:
         logger.info(f"  Transitions 0->50: {len(self.transitions_0_to_50)} patterns")
         logger.info(f"  Transitions 100->50: {len(self.transitions_100_to_50)} patterns")
     
+    def _iter_library_files(self):
+        """Yield (file_path, stat, is_transition) for every funscript in the library folders"""
+        for folder, is_transition in LIBRARY_FOLDERS:
+            folder_path = os.path.join(self.funscript_folder, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            for entry in sorted(os.scandir(folder_path), key=lambda entry: entry.name):
+                if entry.name.lower().endswith('.funscript') and entry.is_file():
+                    yield entry.path, entry.stat(), is_transition
+    
+    def _build_manifest(self):
+        """Record path/mtime/size for every library file and the pattern loaded from it"""
+        loaded = {}
+        for category in PATTERN_CATEGORIES:
+            for pattern in getattr(self, category):
+                loaded[os.path.normpath(pattern.file_path)] = (pattern, category)
+        
+        for file_path, stat, _ in self._iter_library_files():
+            pattern, category = loaded.get(os.path.normpath(file_path), (None, None))
+            # Content hashes are filled in lazily, the first time a file looks changed
+            self.manifest[file_path] = ManifestEntry(stat.st_mtime_ns, stat.st_size, None, pattern, category)
+    
+    def rescan(self) -> Dict[str, int]:
+        """Reparse only added/changed files and swap in updated category lists"""
+        with self._rescan_lock:
+            changes = {'added': 0, 'changed': 0, 'removed': 0}
+            removed: List[Tuple[FunscriptPattern, str]] = []
+            added: List[Tuple[FunscriptPattern, str]] = []
+            current = {file_path: (stat, is_transition)
+                       for file_path, stat, is_transition in self._iter_library_files()}
+            
+            for file_path in [path for path in self.manifest if path not in current]:
+                entry = self.manifest.pop(file_path)
+                if entry.pattern is not None:
+                    removed.append((entry.pattern, entry.category))
+                changes['removed'] += 1
+                logger.info(f"Rescan: removed {os.path.basename(file_path)}")
+            
+            for file_path, (stat, is_transition) in current.items():
+                entry = self.manifest.get(file_path)
+                if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                    continue
+                
+                try:
+                    content_hash = file_content_hash(file_path)
+                except OSError as e:
+                    logger.error(f"Rescan: cannot read {file_path}: {e}")
+                    continue
+                
+                if entry is not None and entry.content_hash == content_hash:
+                    # Touched but not modified
+                    entry.mtime_ns = stat.st_mtime_ns
+                    entry.size = stat.st_size
+                    continue
+                
+                pattern = _parse_pattern(file_path, self.action_cache is not None)
+                category = None
+                if pattern is not None:
+                    category, label = classify_pattern_endpoints(pattern.start_pos, pattern.end_pos, is_transition)
+                
+                if entry is not None and entry.pattern is not None:
+                    removed.append((entry.pattern, entry.category))
+                if self.action_cache is not None:
+                    self.action_cache.invalidate(file_path)
+                if category is not None:
+                    added.append((pattern, category))
+                    logger.info(f"Rescan: {os.path.basename(file_path)} categorized as {label}")
+                
+                self.manifest[file_path] = ManifestEntry(stat.st_mtime_ns, stat.st_size, content_hash,
+                                                         pattern if category else None, category)
+                changes['changed' if entry is not None else 'added'] += 1
+            
+            if removed or added:
+                self._apply_changes(removed, added)
+            if any(changes.values()):
+                logger.info(f"Rescan complete: {changes['added']} added, {changes['changed']} changed, "
+                            f"{changes['removed']} removed ({self.get_total_count()} patterns)")
+            return changes
+    
+    def _apply_changes(self, removed: List[Tuple[FunscriptPattern, str]],
+                       added: List[Tuple[FunscriptPattern, str]]):
+        """Copy-on-write update: build new category lists and swap them in.
+        
+        Lists already handed out are never mutated, so playback can keep calling
+        random.choice on them while the watcher thread applies a rescan.
+        """
+        removed_ids = {id(pattern) for pattern, _ in removed}
+        touched = {category for _, category in removed} | {category for _, category in added}
+        
+        with self._library_lock:
+            for category in PATTERN_CATEGORIES:
+                if category not in touched:
+                    continue
+                patterns = [pattern for pattern in getattr(self, category) if id(pattern) not in removed_ids]
+                for pattern, added_category in added:
+                    if added_category == category:
+                        if self.action_cache is not None and not pattern.is_lazy:
+                            pattern.make_lazy(self.action_cache)
+                        patterns.append(pattern)
+                setattr(self, category, patterns)
+                self.patterns_by_category[category] = patterns
+                self.patterns_by_endpoints[CATEGORY_ENDPOINTS[category]] = patterns
+            
+            self._total_count = sum(len(getattr(self, category)) for category in PATTERN_CATEGORIES)
+            self._generation += 1
+            self._rebuild_registry()
+    
+    def start_watching(self, interval: float = 2.0, callback=None):
+        """Poll the library folders and apply changes while playback keeps running"""
+        self.should_watch = True
+        if not self.watch_thread or not self.watch_thread.is_alive():
+            self.watch_thread = threading.Thread(target=self._watch_loop, args=(interval, callback))
+            self.watch_thread.daemon = True
+            self.watch_thread.start()
+    
+    def stop_watching(self):
+        """Stop the folder watcher"""
+        self.should_watch = False
+    
+    def _watch_loop(self, interval: float, callback):
+        """Periodically rescan the library"""
+        while self.should_watch:
+            try:
+                changes = self.rescan()
+                if callback and any(changes.values()):
+                    callback(changes)
+            except Exception as e:
+                logger.error(f"Pattern folder watch failed: {e}")
+            
+            time.sleep(interval)
+    
     def get_all_patterns(self):
-        """Get all patterns combined"""
-        return (
-            self.main_patterns_0_to_0 +
-            self.main_patterns_100_to_100 +
-            self.main_patterns_50_to_50 +
-            self.transitions_0_to_100 +
-            self.transitions_100_to_0 +
-            self.transitions_50_to_0 +
-            self.transitions_50_to_100 +
-            self.transitions_0_to_50 +
-            self.transitions_100_to_50
-        )
+        """Get all patterns combined (cached until the library changes - do not mutate)"""
+        cached = self._all_patterns
+        generation = self._generation  # Read first: a concurrent swap then forces a rebuild
+        if cached is None or cached[0] != generation:
+            all_patterns = []
+            for category in PATTERN_CATEGORIES:
+                all_patterns.extend(getattr(self, category))
+            cached = (generation, all_patterns)
+            self._all_patterns = cached
+        return cached[1]
+    
+    def get_patterns_by_endpoints(self, start_endpoint: int, end_endpoint: int) -> List[FunscriptPattern]:
+        """Category list for an endpoint pair such as (0, 100); empty if there is none"""
+        return self.patterns_by_endpoints.get((start_endpoint, end_endpoint), [])
     
     def find_pattern_by_name(self, pattern_name: str):
-        """Find pattern by filename - Enhanced for session manager integration"""
-        for pattern in self.get_all_patterns():
-            if pattern.name == pattern_name:
-                return pattern
+        """Find pattern by filename or '<folder>/<name>' key - Enhanced for session manager integration"""
+        pattern = self._by_name.get(pattern_name) or self._by_key.get(pattern_name)
+        if pattern is not None:
+            return pattern
         
         # If exact name not found, try without extension
-        pattern_name_base = pattern_name.replace('.funscript', '')
-        for pattern in self.get_all_patterns():
-            if pattern.name.replace('.funscript', '') == pattern_name_base:
-                return pattern
+        pattern = self._by_stem.get(_pattern_stem(pattern_name))
+        if pattern is not None:
+            return pattern
         
         logger.warning(f"Pattern not found: {pattern_name}")
         return None
     
     def get_total_count(self):
         """Get total pattern count"""
+        return self._total_count
+    
+    @property
+    def generation(self) -> int:
+        """Bumped on every add/remove, so derived tables can tell they are stale"""
+        return self._generation
+    
+    def mode_view(self, mode: str):
+        """Get the named playback mode over this library ('normal' is the manager itself)"""
+        if mode not in PATTERN_MODES:
+            raise ValueError(f"Unknown pattern mode: {mode}")
+        folders = PATTERN_MODES[mode]
+        if folders is None:
+            return self
+        
+        view = self._mode_views.get(mode)
+        if view is None:
+            view = PatternModeView(self, mode, folders)
+            self._mode_views[mode] = view
+        return view
+
+class PatternModeView:
+    """Filtered, read-only view of a shared PatternManager for one playback mode
+
+    Exposes the same category lists and lookups as PatternManager, so a
+    PlaybackEngine can be pointed at it directly. Patterns are shared with the
+    manager, not reloaded; the filtered lists are rebuilt only after the
+    library changes.
+    """
+    def __init__(self, manager: PatternManager, mode: str, folders: Tuple[str, ...]):
+        self.manager = manager
+        self.mode = mode
+        self.folders = frozenset(folders)
+        self.funscript_folder = manager.funscript_folder
+        self._generation = -1
+        self._categories: Dict[str, List[FunscriptPattern]] = {}
+        self._all_patterns: List[FunscriptPattern] = []
+        self._refresh()
+    
+    def __getattr__(self, name):
+        # Category lists (main_patterns_0_to_0, transitions_0_to_100, ...)
+        if name in PATTERN_CATEGORIES:
+            self._refresh()
+            return self._categories[name]
+        raise AttributeError(f"{type(self).__name__} has no attribute {name!r}")
+    
+    @property
+    def generation(self) -> int:
+        """Library generation of the underlying manager"""
+        return self.manager._generation
+    
+    def _includes(self, pattern: FunscriptPattern) -> bool:
+        return os.path.basename(os.path.dirname(pattern.file_path)) in self.folders
+    
+    def _refresh(self):
+        """Rebuild the filtered lists if the underlying library changed"""
+        generation = self.manager._generation
+        if generation == self._generation:
+            return
+        
+        categories = {
+            category: [pattern for pattern in getattr(self.manager, category) if self._includes(pattern)]
+            for category in PATTERN_CATEGORIES
+        }
+        all_patterns = []
+        for category in PATTERN_CATEGORIES:
+            all_patterns.extend(categories[category])
+        
+        self._categories = categories
+        self._all_patterns = all_patterns
+        self._generation = generation
+    
+    def get_all_patterns(self):
+        """Get all patterns in this mode (do not mutate)"""
+        self._refresh()
+        return self._all_patterns
+    
+    def get_patterns_by_endpoints(self, start_endpoint: int, end_endpoint: int) -> List[FunscriptPattern]:
+        """Category list for an endpoint pair within this mode"""
+        for category, endpoints in CATEGORY_ENDPOINTS.items():
+            if endpoints == (start_endpoint, end_endpoint):
+                return getattr(self, category)
+        return []
+    
+    def find_pattern_by_name(self, pattern_name: str):
+        """Find a pattern by filename, limited to this mode"""
+        pattern = (self.manager._by_name.get(pattern_name) or self.manager._by_key.get(pattern_name)
+                   or self.manager._by_stem.get(_pattern_stem(pattern_name)))
+        if pattern is not None and self._includes(pattern):
+            return pattern
+        
+        logger.warning(f"Pattern not found in {self.mode} mode: {pattern_name}")
+        return None
+    
+    def get_total_count(self):
+        """Get pattern count in this mode"""
         return len(self.get_all_patterns())
 
+SENDER_DRAIN_TIMEOUT = 2.0  # seconds disconnect() waits for queued moves to be delivered
+
 class IntifaceClient:
-    """Handles HTTP communication with C# Buttplug Server"""
-    def __init__(self, url: str = "http://localhost:8080"):
+    """Handles communication with C# Buttplug Server (stream channel for moves, HTTP for the rest)"""
+    def __init__(self, url: str = "http://localhost:8080", use_stream: bool = True, stream_port: int = STREAM_PORT,
+                 use_sender: bool = True, sender_depth: int = DEFAULT_MAX_DEPTH):
         self.url = url
         self.connected = False
         self.device_connected = False
@@ -203,6 +757,20 @@ class IntifaceClient:
         self.session = None
         self.check_thread = None
         self.should_check = False
+        
+        # Persistent TCP channel for move/stop commands; None means HTTP POST per command
+        self.use_stream = use_stream
+        self.stream_port = stream_port
+        self.stream: Optional[BridgeStream] = None
+        
+        # Moves are queued and delivered by a sender thread so callers never wait on I/O
+        self.sender: Optional[CommandSender] = None
+        if use_sender:
+            self.sender = CommandSender(self._deliver_move, self._deliver_stop, sender_depth)
+        
+        # Time blocked delivering a move, and send -> bridge confirmation (stream ack or HTTP response)
+        self.send_latency = LatencyHistogram('send')
+        self.ack_latency = LatencyHistogram('ack')
     
     def set_connection_callback(self, callback):
         """Set callback for connection status changes"""
@@ -225,6 +793,10 @@ class IntifaceClient:
                 self._update_connection_status(True, self.device_connected)
                 
                 self._start_status_checking()
+                if self.use_stream:
+                    self._open_stream()
+                if self.sender:
+                    self.sender.start()
                 logger.info("Connected to C# Buttplug Server")
             else:
                 logger.error(f"Failed to connect: HTTP {response.status_code}")
@@ -239,9 +811,24 @@ class IntifaceClient:
             logger.error(f"Failed to connect to C# server: {e}")
             self._update_connection_status(False)
     
+    def _open_stream(self):
+        """Open the streaming channel; commands fall back to HTTP if the bridge has none"""
+        stream = BridgeStream(urlparse(self.url).hostname or "localhost", self.stream_port,
+                              ack_latency=self.ack_latency)
+        self.stream = stream if stream.open() else None
+        if self.stream is None:
+            logger.info("Using HTTP commands (no stream channel)")
+    
     def disconnect(self):
         """Disconnect from C# server"""
         self.should_check = False
+        if self.sender:
+            # Deliver a queued stop or home move before the channel closes
+            if not self.sender.stop(drain=True, timeout=SENDER_DRAIN_TIMEOUT):
+                logger.warning("Disconnecting with undelivered moves")
+        if self.stream:
+            self.stream.close()
+            self.stream = None
         if self.session:
             try:
                 self.session.post(f"{self.url}/disconnect")
@@ -294,8 +881,12 @@ class IntifaceClient:
         if self.connection_callback:
             self.connection_callback(connected, device_found)
     
-    def send_position_command(self, position: float, duration: int):
-        """Send position command to The Handy via C# server"""
+    def send_position_command(self, position: float, duration: int, droppable: bool = True):
+        """Send position command to The Handy via C# server.
+        
+        droppable=False (stop/home moves) keeps the move from being replaced by
+        latest-wins when delivery falls behind.
+        """
         if not self.connected or not self.session:
             logger.warning("Cannot send command: not connected to C# server")
             return
@@ -303,6 +894,34 @@ class IntifaceClient:
         # Apply position rounding fix for smoother motion
         position = round(max(0.0, min(1.0, position)), 2)
         
+        if self.sender:
+            self.sender.submit_move(position, duration, droppable)
+        else:
+            self._deliver_move(position, duration, droppable)
+    
+    def latency_histograms(self) -> Dict[str, LatencyHistogram]:
+        histograms = {'send': self.send_latency, 'ack': self.ack_latency}
+        if self.sender:
+            histograms['queue'] = self.sender.queue_latency
+        return histograms
+    
+    def clear_pending(self):
+        """Drop queued moves that have not been delivered yet"""
+        if self.sender:
+            self.sender.clear()
+    
+    def _deliver_move(self, position: float, duration: int, droppable: bool = True):
+        # One frame on the open stream instead of an HTTP round-trip; never waits for acks,
+        # past the window the stream holds the newest move and drops the superseded one
+        sent_at = time.perf_counter()
+        stream = self.stream
+        if stream is not None:
+            if stream.send_move(position, duration, droppable):
+                self.send_latency.record(time.perf_counter() - sent_at)
+                return
+            logger.warning("Stream channel lost - falling back to HTTP commands")
+            self.stream = None
+        
         try:
             command = {
                 "command": "move",
@@ -311,6 +930,10 @@ class IntifaceClient:
             }
             
             response = self.session.post(f"{self.url}/command", json=command)
+            # The bridge answers once the device command is issued, so this is the round-trip too
+            round_trip = time.perf_counter() - sent_at
+            self.send_latency.record(round_trip)
+            self.ack_latency.record(round_trip)
             if response.status_code != 200:
                 logger.error(f"Command failed: HTTP {response.status_code}")
                 
@@ -321,18 +944,80 @@ class IntifaceClient:
         """Send stop command (go to position 0)"""
         if not self.connected or not self.session:
             return
+        
+        if self.sender:
+            self.sender.submit_stop()
+        else:
+            self._deliver_stop()
+    
+    def _deliver_stop(self):
+        if self.stream is not None and self.stream.send_stop():
+            return
             
         try:
             command = {"command": "stop"}
             self.session.post(f"{self.url}/command", json=command)
         except Exception as e:
             logger.error(f"Failed to send stop command: {e}")
+    
+    def send_batch(self, actions, start_at: Optional[float] = None, replace: bool = False) -> bool:
+        """Upload a timed action list for the C# server to play on its own timer.
+        
+        actions are (offset ms from start_at, position 0-1, duration ms), already
+        scaled by range and speed; start_at is an epoch timestamp in seconds
+        shared by both sides (default: now). replace drops batches still pending.
+        """
+        if not self.connected or not self.session:
+            logger.warning("Cannot send batch: not connected to C# server")
+            return False
+        
+        if start_at is None:
+            start_at = time.time()
+        
+        try:
+            batch = {
+                "start_at": int(start_at * 1000),
+                "replace": replace,
+                "actions": [[int(offset), round(max(0.0, min(1.0, position)), 2), int(duration)]
+                            for offset, position, duration in actions]
+            }
+            
+            response = self.session.post(f"{self.url}/batch", json=batch)
+            if response.status_code != 200:
+                logger.error(f"Batch upload failed: HTTP {response.status_code}")
+                return False
+            result = response.json()
+            if "error" in result:
+                logger.error(f"Batch rejected: {result['error']}")
+                return False
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to send batch: {e}")
+            return False
+    
+    def cancel_batch(self):
+        """Drop every uploaded batch that has not finished playing"""
+        if not self.connected or not self.session:
+            return
+        
+        try:
+            self.session.post(f"{self.url}/command", json={"command": "cancel"})
+        except Exception as e:
+            logger.error(f"Failed to cancel batch: {e}")
+
+BATCH_LEAD = 0.5       # seconds before a batch ends that the next one is uploaded
+BATCH_MIN_LEAD = 0.2   # a batch never starts sooner than this after its upload
+BATCH_GAP = 0.1        # pause between chained batches (the play_next breathing room)
+
+SLOW_MODE_MULTIPLIER = 1.5  # timeline stretch of the manual slow mode
 
 class PlaybackEngine:
     """Handles pattern playback logic with smart chaining and session integration"""
-    def __init__(self, pattern_manager: PatternManager, device_client: IntifaceClient):
+    def __init__(self, pattern_manager: PatternManager, device_client: IntifaceClient, clock=None):
         self.pattern_manager = pattern_manager
         self.device_client = device_client
+        self.clock = clock or SYSTEM_CLOCK  # VirtualClock in the simulator
         self.is_playing = False
         self.playback_thread = None
         self.min_range = 0
@@ -347,6 +1032,18 @@ class PlaybackEngine:
         # Session integration - ENHANCED
         self.session_manager = None  # Set by GUI
         self.dynamic_speed_multiplier = 1.0  # From session manager
+        self.next_speed_multiplier = 1.0     # Multiplier that belongs to next_pattern
+        
+        # Batch upload: whole patterns go to the server, which times the moves itself
+        self.batch_upload = False
+        self._batch_start_at = 0.0  # Server timeline: when the next batch may start
+        
+        # Streaming playback: stop token of the current run (a fresh one per run)
+        self._stream_stop: Optional[threading.Event] = None
+        
+        # How late each action is sent compared with its (stretched) funscript timestamp
+        self.lateness = LatencyHistogram('lateness')
+        self.latency_reporter = None
     
     def set_range(self, min_range: int, max_range: int):
         """Set position range limits"""
@@ -357,26 +1054,22 @@ class PlaybackEngine:
         """Set slow mode on/off"""
         self.slow_mode = slow_mode
     
-    def start_playback(self):
-        """Start pattern playback with session integration"""
+    def timeline_scale(self) -> float:
+        """Stretch of a pattern's timeline and move durations: manual slow mode x dynamic session speed"""
+        return (SLOW_MODE_MULTIPLIER if self.slow_mode else 1.0) * self.dynamic_speed_multiplier
+    
+    def start_playback(self, background: bool = True):
+        """Start pattern playback with session integration.
+        
+        With background=False no thread is started; the caller drives playback
+        with play_next() (the simulator does this on a virtual clock).
+        """
         if not self.pattern_manager or not self.device_client.connected:
             return False
         
         # Pick first pattern using session manager if available
-        if self.session_manager and self.session_manager.is_session_active():
-            # Use session-based pattern selection
-            pattern_rec, speed_mult = self.session_manager.get_next_pattern_recommendation(0)
-            if pattern_rec:
-                self.current_pattern = self.pattern_manager.find_pattern_by_name(pattern_rec['name'])
-                self.dynamic_speed_multiplier = speed_mult
-                logger.info(f"Session selected first pattern: {pattern_rec['name']} (speed: {speed_mult:.2f}x)")
-            else:
-                logger.warning("Session manager failed to recommend pattern, using fallback")
-                self.current_pattern = self._select_pattern_random(0)
-        else:
-            # Fallback to random selection
-            self.current_position = 0
-            self.current_pattern = self._select_pattern_random(0)
+        self.current_position = 0
+        self.current_pattern, self.dynamic_speed_multiplier = self._pick_first_pattern(self.dynamic_speed_multiplier)
         
         if not self.current_pattern:
             logger.error("No patterns available to start playback")
@@ -386,9 +1079,11 @@ class PlaybackEngine:
         self.next_pattern = self._select_pattern_for_position(self.current_pattern.end_pos)
         
         self.is_playing = True
-        self.playback_thread = threading.Thread(target=self._playback_loop)
-        self.playback_thread.daemon = True
-        self.playback_thread.start()
+        self._batch_start_at = 0.0
+        if background:
+            self.playback_thread = threading.Thread(target=self._playback_loop)
+            self.playback_thread.daemon = True
+            self.playback_thread.start()
         
         logger.info(f"Started smart chaining playback. First: {self.current_pattern.name} (ends at {self.current_pattern.end_pos})")
         if self.next_pattern:
@@ -398,67 +1093,129 @@ class PlaybackEngine:
     def stop_playback(self):
         """Stop pattern playback"""
         self.is_playing = False
+        self._stop_stream()
+        self._cancel_pending()
         if self.device_client.connected and self.device_client.device_connected:
-            self.device_client.send_position_command(0.0, 1000)
+            self.device_client.send_position_command(0.0, 1000, droppable=False)
         logger.info("Stopped playback")
     
     def emergency_stop(self):
         """Emergency stop"""
         logger.info("EMERGENCY STOP - Going to full depth")
         self.is_playing = False
+        self._stop_stream()
+        self._cancel_pending()
         if self.device_client.connected and self.device_client.device_connected:
-            self.device_client.send_position_command(0.0, 500)
+            self.device_client.send_position_command(0.0, 500, droppable=False)
         logger.info("Emergency stop complete")
     
+    def latency_histograms(self) -> Dict[str, LatencyHistogram]:
+        """Schedule lateness plus the device client's send/ack/queue histograms"""
+        histograms = {'lateness': self.lateness}
+        if hasattr(self.device_client, 'latency_histograms'):
+            histograms.update(self.device_client.latency_histograms())
+        return histograms
+    
+    def start_latency_report(self, interval: float = DEFAULT_REPORT_INTERVAL, path: Optional[str] = None):
+        """Log the latency histograms every interval seconds (and dump them to path as JSON)"""
+        if self.latency_reporter:
+            self.latency_reporter.stop()
+        self.latency_reporter = LatencyReporter(self.latency_histograms, interval, path)
+        self.latency_reporter.start()
+    
+    def stop_latency_report(self):
+        if self.latency_reporter:
+            self.latency_reporter.stop()
+            self.latency_reporter = None
+    
+    def _cancel_pending(self):
+        """Drop queued moves and uploaded batches so a stop/home command goes out next"""
+        if hasattr(self.device_client, 'clear_pending'):
+            self.device_client.clear_pending()
+        if self.batch_upload and hasattr(self.device_client, 'cancel_batch'):
+            self.device_client.cancel_batch()
+    
     def _playback_loop(self):
         """Main playback loop with seamless pattern chaining"""
         while self.is_playing and self.current_pattern:
-            # Play current pattern
-            self._play_pattern(self.current_pattern)
-            
-            if not self.is_playing:
-                break
-            
-            # Seamless transition to next pattern
-            logger.info(f"Seamless transition: {self.current_pattern.name} -> {self.next_pattern.name if self.next_pattern else 'None'}")
-            
-            # Move to next pattern
-            self.current_position = self.current_pattern.end_pos
-            self.current_pattern = self.next_pattern
-            
-            # Look ahead - select pattern after next
-            if self.current_pattern:
-                self.next_pattern = self._select_pattern_for_position(self.current_pattern.end_pos)
-            else:
-                # No more patterns available
+            if not self.play_next():
                 break
-            
-            # Small breathing room between patterns (optional)
-            if self.is_playing:
-                time.sleep(0.1)
+    
+    def play_next(self) -> bool:
+        """Play the current pattern and chain to the next one; False once playback should end"""
+        # Play current pattern
+        self._play_pattern(self.current_pattern)
+        
+        if not self.is_playing:
+            return False
+        
+        # Seamless transition to next pattern
+        logger.info(f"Seamless transition: {self.current_pattern.name} -> {self.next_pattern.name if self.next_pattern else 'None'}")
+        
+        # Move to next pattern (with the speed it was selected for)
+        self.current_position = self.current_pattern.end_pos
+        self.current_pattern = self.next_pattern
+        self.dynamic_speed_multiplier = self.next_speed_multiplier
+        
+        # Look ahead - select pattern after next
+        if self.current_pattern:
+            self.next_pattern = self._select_pattern_for_position(self.current_pattern.end_pos)
+        else:
+            # No more patterns available
+            return False
+        
+        # Small breathing room between patterns (optional)
+        if self.is_playing:
+            self.clock.sleep(0.1)
+        return True
     
     def _select_pattern_for_position(self, current_pos):
         """ENHANCED: Select next pattern with session manager integration"""
         if not self.pattern_manager:
             return None
         
+        # Lookahead pick: its multiplier applies once it becomes the current pattern
+        selected, self.next_speed_multiplier = self._pick_pattern(current_pos, self.dynamic_speed_multiplier)
+        return selected
+    
+    def _pick_first_pattern(self, speed_mult: float):
+        """(first pattern, its speed multiplier), speed_mult unless the session sets one.
+        
+        Reads but never assigns engine state, so it can run off the playback thread.
+        """
+        if self.session_manager and self.session_manager.is_session_active():
+            # Use session-based pattern selection
+            pattern_rec, session_speed = self.session_manager.get_next_pattern_recommendation(0)
+            if pattern_rec:
+                logger.info(f"Session selected first pattern: {pattern_rec['name']} (speed: {session_speed:.2f}x)")
+                return self.pattern_manager.find_pattern_by_name(pattern_rec.get('key', pattern_rec['name'])), session_speed
+            logger.warning("Session manager failed to recommend pattern, using fallback")
+        
+        # Fallback to random selection
+        return self._select_pattern_random(0), speed_mult
+    
+    def _pick_pattern(self, current_pos, speed_mult: float):
+        """(pattern to play from current_pos, its speed multiplier), speed_mult unless the session sets one.
+        
+        Reads but never assigns engine state, so it can run off the playback thread.
+        """
         # NEW: Use session manager if available and active
         if self.session_manager and self.session_manager.is_session_active():
-            pattern_rec, speed_mult = self.session_manager.get_next_pattern_recommendation(current_pos)
+            pattern_rec, session_speed = self.session_manager.get_next_pattern_recommendation(current_pos)
             if pattern_rec:
                 # Apply speed multiplier
-                self.dynamic_speed_multiplier = speed_mult
+                speed_mult = session_speed
                 
                 # Find actual pattern object from recommendation
-                selected = self.pattern_manager.find_pattern_by_name(pattern_rec['name'])
+                selected = self.pattern_manager.find_pattern_by_name(pattern_rec.get('key', pattern_rec['name']))
                 if selected:
                     logger.info(f"Session selected: {selected.name} (speed: {speed_mult:.2f}x)")
-                    return selected
+                    return selected, speed_mult
                 else:
                     logger.warning(f"Session recommended pattern not found: {pattern_rec['name']}")
         
         # Fallback to original random selection logic
-        return self._select_pattern_random(current_pos)
+        return self._select_pattern_random(current_pos), speed_mult
     
     def _select_pattern_random(self, current_pos):
         """Random pattern selection logic with relaxed position matching"""
@@ -545,45 +1302,202 @@ class PlaybackEngine:
             return
             
         logger.info(f"Playing pattern: {pattern.name} ({pattern.start_pos}->{pattern.end_pos})")
-        start_time = time.time()
+        if self.batch_upload and hasattr(self.device_client, 'send_batch'):
+            if self._play_pattern_batch(pattern):
+                return
+            logger.warning("Batch upload failed - falling back to per-action commands")
+            self.batch_upload = False
         
-        for action_index, action in enumerate(pattern.actions):
+        clock = self.clock
+        start_time = clock.time()
+        
+        # Read the typed buffers directly - no per-action dict allocation
+        # (lazy patterns load through the action cache here, on first play)
+        timestamps, positions = pattern.buffers()
+        action_count = len(timestamps)
+        
+        # Slow mode and session speed stretch the whole pattern, as the session plan assumes;
+        # a slow mode toggle applies from the next pattern
+        scale = self.timeline_scale()
+        
+        for action_index in range(action_count):
             if not self.is_playing:
                 break
                 
-            # Calculate timing
-            target_time = start_time + (action['at'] / 1000.0)
-            current_time = time.time()
+            action_at = timestamps[action_index]
+            target_time = start_time + (action_at / 1000.0) * scale
+            current_time = clock.time()
             
             # Wait until it's time for this action
             if target_time > current_time:
-                time.sleep(target_time - current_time)
+                clock.sleep(target_time - current_time)
+            self.lateness.record(max(0.0, clock.time() - target_time))
             
             # Apply range clamping and send command
-            position = action['pos'] / 100.0
+            position = positions[action_index] / 100.0
             clamped_position = self._apply_range_clamp(position)
             
             # ENHANCED: Calculate duration with both manual and dynamic speed control
-            if action_index < len(pattern.actions) - 1:
-                next_action = pattern.actions[action_index + 1]
-                duration = next_action['at'] - action['at']
-                
-                # Apply manual slow mode first
-                manual_multiplier = 1.5 if self.slow_mode else 1.0
-                
-                # Then apply dynamic session speed
-                total_multiplier = manual_multiplier * self.dynamic_speed_multiplier
-                
-                duration = int(duration * total_multiplier)
-                
-                # Log speed changes for debugging
-                if abs(self.dynamic_speed_multiplier - 1.0) > 0.1:  # Only log significant changes
-                    logger.debug(f"Speed control: manual={manual_multiplier:.1f}x, dynamic={self.dynamic_speed_multiplier:.2f}x, total={total_multiplier:.2f}x")
+            if action_index < action_count - 1:
+                duration = self._scale_duration(timestamps[action_index + 1] - action_at, scale)
             else:
                 duration = 500
             
             self.device_client.send_position_command(clamped_position, duration)
     
+    def _play_pattern_batch(self, pattern) -> bool:
+        """Upload the whole pattern and wait while the server plays it; False if the upload failed"""
+        clock = self.clock
+        timestamps, positions = pattern.buffers()
+        action_count = len(timestamps)
+        if not action_count:
+            return True
+        
+        # Same commands as the per-action loop, with offsets on the stretched timeline
+        multiplier = self.timeline_scale()
+        actions = []
+        for action_index in range(action_count):
+            action_at = timestamps[action_index]
+            if action_index < action_count - 1:
+                duration = self._scale_duration(timestamps[action_index + 1] - action_at, multiplier)
+            else:
+                duration = 500
+            actions.append((int(action_at * multiplier),
+                            self._apply_range_clamp(positions[action_index] / 100.0), duration))
+        
+        # Chain onto the end of the previous batch unless that is already too close
+        start_at = max(self._batch_start_at, clock.time() + BATCH_MIN_LEAD)
+        if not self.device_client.send_batch(actions, start_at):
+            return False
+        end_at = start_at + (timestamps[-1] / 1000.0) * multiplier
+        self._batch_start_at = end_at + BATCH_GAP
+        
+        # Come back early enough to upload the next pattern before this one ends
+        upload_at = end_at - BATCH_LEAD
+        while self.is_playing and clock.time() < upload_at:
+            clock.sleep(min(0.1, upload_at - clock.time()))
+        return True
+    
+    def _scale_duration(self, duration, scale: Optional[float] = None):
+        """Apply manual slow mode and dynamic session speed to a move duration.
+        
+        Pass the scale the pattern's timeline was stretched by, so moves and
+        timing always agree; None uses the current timeline_scale().
+        """
+        total_multiplier = self.timeline_scale() if scale is None else scale
+        
+        # Log speed changes for debugging
+        if abs(self.dynamic_speed_multiplier - 1.0) > 0.1:  # Only log significant changes
+            logger.debug(f"Speed control: slow_mode={self.slow_mode}, dynamic={self.dynamic_speed_multiplier:.2f}x, total={total_multiplier:.2f}x")
+        
+        return int(duration * total_multiplier)
+    
+    def start_stream_playback(self, file_path: str, buffer_size: int = 512):
+        """Play a full-length funscript straight from disk through a bounded buffer"""
+        if not self.device_client.connected or self.is_playing:
+            return False
+        
+        action_buffer = queue.Queue(maxsize=max(2, buffer_size))
+        self.current_pattern = None
+        self.next_pattern = None
+        self.is_playing = True
+        
+        # Loops of an earlier run only ever watch their own token, so a quick
+        # stop/start cannot bring them back to life
+        stop = threading.Event()
+        self._stream_stop = stop
+        
+        reader_thread = threading.Thread(target=self._stream_reader_loop, args=(file_path, action_buffer, stop))
+        reader_thread.daemon = True
+        reader_thread.start()
+        
+        self.playback_thread = threading.Thread(target=self._stream_playback_loop,
+                                                args=(file_path, action_buffer, stop))
+        self.playback_thread.daemon = True
+        self.playback_thread.start()
+        
+        logger.info(f"Started streaming playback: {os.path.basename(file_path)} (buffer {buffer_size} actions)")
+        return True
+    
+    def _stop_stream(self):
+        if self._stream_stop is not None:
+            self._stream_stop.set()
+    
+    def _stream_reader_loop(self, file_path: str, action_buffer: queue.Queue, stop: threading.Event):
+        """Producer: read actions from disk into the bounded buffer"""
+        try:
+            for action in iter_funscript_actions(file_path):
+                # Blocks while the buffer is full, waking up to notice a stop
+                while not stop.is_set():
+                    try:
+                        action_buffer.put(action, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    break
+        except Exception as e:
+            logger.error(f"Error streaming funscript {file_path}: {e}")
+        finally:
+            # End-of-stream marker, always - the consumer must never wait on a dead producer
+            while True:
+                try:
+                    action_buffer.put(None, timeout=0.5)
+                    break
+                except queue.Full:
+                    if stop.is_set():
+                        break  # Consumer is exiting on the token anyway
+    
+    def _next_buffered_action(self, action_buffer: queue.Queue, stop: threading.Event):
+        """Next (at, pos) from the buffer; None at end of stream or once stopped"""
+        while not stop.is_set():
+            try:
+                return action_buffer.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return None
+    
+    def _stream_playback_loop(self, file_path: str, action_buffer: queue.Queue, stop: threading.Event):
+        """Consumer: play buffered actions with one action of lookahead for durations"""
+        start_time = self.clock.time()
+        origin_at = 0  # Script time at start_time
+        scale = self.timeline_scale()
+        action = self._next_buffered_action(action_buffer, stop)
+        
+        while action is not None and not stop.is_set():
+            next_action = self._next_buffered_action(action_buffer, stop)
+            action_at, action_pos = action
+            
+            # Same stretch as pattern playback; a slow mode toggle re-bases the
+            # timeline here so the played part is not shifted
+            new_scale = self.timeline_scale()
+            if new_scale != scale:
+                start_time += (action_at - origin_at) / 1000.0 * scale
+                origin_at = action_at
+                scale = new_scale
+            target_time = start_time + (action_at - origin_at) / 1000.0 * scale
+            current_time = self.clock.time()
+            if target_time > current_time:
+                self.clock.sleep(target_time - current_time)
+            
+            if stop.is_set():
+                break
+            self.lateness.record(max(0.0, self.clock.time() - target_time))
+            
+            clamped_position = self._apply_range_clamp(action_pos / 100.0)
+            if next_action is not None:
+                duration = self._scale_duration(next_action[0] - action_at, scale)
+            else:
+                duration = 500
+            
+            self.device_client.send_position_command(clamped_position, duration)
+            action = next_action
+        
+        if not stop.is_set():
+            stop.set()
+            self.is_playing = False
+            logger.info(f"Finished streaming playback: {os.path.basename(file_path)}")
+    
     def _apply_range_clamp(self, position):
         """Apply min/max range clamping to position"""
         range_size = self.max_range - self.min_range
@@ -0,0 +1,133 @@
+"""
+Funscript file readers
+Plain parsing helpers shared by the library loader, the analyzer and the
+slicer. Importing this module has no side effects.
+"""
+
+import hashlib
+import json
+from array import array
+from typing import Tuple
+
+def read_funscript_buffers(file_path: str):
+    """Parse a funscript file into (timestamps, positions) typed arrays"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        actions = json.load(f).get('actions', [])
+    return (
+        array('i', [int(action['at']) for action in actions]),
+        array('B', [max(0, min(100, int(round(action['pos'])))) for action in actions])
+    )
+
+STREAM_MAX_BUFFER = 4 * 1024 * 1024  # characters held while streaming a funscript
+
+def _skip_whitespace(text: str, index: int) -> int:
+    while index < len(text) and text[index] in ' \t\r\n':
+        index += 1
+    return index
+
+def find_actions_array(text: str) -> int:
+    """Index just past the '[' of the top-level "actions" array, or -1 if there is none.
+
+    Walks the top-level keys only, skipping other values whole, so an "actions"
+    key nested in metadata is never mistaken for the real one. Raises ValueError
+    if text ends before the array is reached (e.g. a partial read).
+    """
+    decoder = json.JSONDecoder()
+    try:
+        index = _skip_whitespace(text, 0)
+        if text[index] != '{':
+            return -1
+        index += 1
+        while True:
+            index = _skip_whitespace(text, index)
+            if text[index] == '}':
+                return -1
+            if text[index] == ',':
+                index += 1
+                continue
+            key, index = decoder.raw_decode(text, index)
+            index = _skip_whitespace(text, index)
+            if text[index] != ':':
+                raise ValueError(f"Expected ':' after key {key!r}")
+            index = _skip_whitespace(text, index + 1)
+            if key == 'actions':
+                return index + 1 if text[index] == '[' else -1
+            _, index = decoder.raw_decode(text, index)
+    except IndexError:
+        raise ValueError("Funscript ended before its actions array")
+
+def iter_funscript_actions(file_path: str, chunk_size: int = 64 * 1024,
+                           max_buffer: int = STREAM_MAX_BUFFER):
+    """Yield (at, pos) pairs from a funscript incrementally, without loading the whole file.
+
+    Finds the top-level ``"actions"`` array (see find_actions_array) and decodes one
+    action object at a time from a sliding text buffer, so memory stays constant for
+    hour-long scripts. The buffer never grows past max_buffer characters: a header or
+    action object that does not fit is treated as malformed.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        # Read until the opening bracket of the top-level actions array is in the buffer
+        buffer = ''
+        while True:
+            chunk = f.read(chunk_size)
+            buffer += chunk
+            try:
+                start = find_actions_array(buffer)
+            except ValueError:
+                if not chunk:
+                    raise ValueError(f"Malformed funscript header in {file_path}")
+                if len(buffer) > max_buffer:
+                    raise ValueError(f"Funscript header larger than {max_buffer} characters in {file_path}")
+                continue
+            if start < 0:
+                return
+            buffer = buffer[start:]
+            break
+        
+        position = 0
+        while True:
+            # Skip separators between action objects
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            
+            if position < len(buffer):
+                if buffer[position] == ']':
+                    return
+                try:
+                    action, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    pass  # Object cut off at the end of the buffer - read more
+                else:
+                    yield int(action['at']), max(0, min(100, int(round(action['pos']))))
+                    continue
+            
+            chunk = f.read(chunk_size)
+            if not chunk:
+                if buffer[position:].strip():
+                    raise ValueError(f"Truncated actions array in {file_path}")
+                return
+            buffer = buffer[position:] + chunk
+            position = 0
+            if len(buffer) > max_buffer:
+                raise ValueError(f"Malformed action object in {file_path} (over {max_buffer} characters)")
+
+def read_funscript_metadata(file_path: str) -> Tuple[int, int, int, int]:
+    """(duration, start_pos, end_pos, action_count) without holding the actions.
+
+    Streams the actions (see iter_funscript_actions) keeping only the first and
+    the last, so memory stays constant and nested values are never miscounted.
+    """
+    action_count = 0
+    start_pos = duration = end_pos = 0
+    for at, pos in iter_funscript_actions(file_path):
+        if not action_count:
+            start_pos = pos
+        duration, end_pos = at, pos
+        action_count += 1
+    return duration, start_pos, end_pos, action_count
+
+def file_content_hash(file_path: str) -> str:
+    """Hash a file's bytes (used to skip touched-but-unchanged files on rescan)"""
+    with open(file_path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
@@ -0,0 +1,134 @@
+"""
+Latency instrumentation
+Fixed-size log-bucketed histograms for command send time, bridge round-trip
+and playback schedule lateness. Recording is O(1) with constant memory, so
+they stay on in production; LatencyReporter logs them (and optionally dumps
+JSON) periodically to track down stutter.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MIN_LATENCY = 1e-5        # 10 us - anything faster lands in the first bucket
+BUCKETS_PER_DECADE = 20   # ~12% bucket width
+DECADES = 7               # up to 100 s
+DEFAULT_REPORT_INTERVAL = 60.0
+
+class LatencyHistogram:
+    """Constant-size histogram of durations in seconds (thread-safe)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.buckets = [0] * (BUCKETS_PER_DECADE * DECADES + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        if seconds <= MIN_LATENCY:
+            index = 0
+        else:
+            index = min(len(self.buckets) - 1, int(math.log10(seconds / MIN_LATENCY) * BUCKETS_PER_DECADE) + 1)
+        with self._lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (0-100), capped at the max seen"""
+        with self._lock:
+            return self._percentile_locked(q)
+
+    def _percentile_locked(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * q / 100.0))
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank:
+                return min(self.max, MIN_LATENCY * 10 ** (index / BUCKETS_PER_DECADE))
+        return self.max
+
+    def reset(self):
+        with self._lock:
+            self.buckets = [0] * len(self.buckets)
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def snapshot(self) -> Dict[str, float]:
+        """count, mean, p50/p95/p99 and max in milliseconds, all from one consistent state"""
+        with self._lock:
+            count = self.count
+            return {
+                'count': count,
+                'mean_ms': self.total / count * 1000 if count else 0.0,
+                'p50_ms': self._percentile_locked(50) * 1000,
+                'p95_ms': self._percentile_locked(95) * 1000,
+                'p99_ms': self._percentile_locked(99) * 1000,
+                'max_ms': self.max * 1000,
+            }
+
+    def summary(self) -> str:
+        stats = self.snapshot()
+        return (f"{self.name}: n={stats['count']} p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms "
+                f"p99={stats['p99_ms']:.1f}ms max={stats['max_ms']:.1f}ms")
+
+class LatencyReporter:
+    """Periodically logs a set of histograms and optionally writes them to a JSON file"""
+
+    def __init__(self, histograms: Callable[[], Dict[str, LatencyHistogram]],
+                 interval: float = DEFAULT_REPORT_INTERVAL, path: Optional[str] = None):
+        self.histograms = histograms
+        self.interval = interval
+        self.path = path
+        self.report_thread = None
+        self.should_report = False
+        self._wake = threading.Event()
+
+    def start(self):
+        self.should_report = True
+        self._wake.clear()
+        if not self.report_thread or not self.report_thread.is_alive():
+            self.report_thread = threading.Thread(target=self._report_loop)
+            self.report_thread.daemon = True
+            self.report_thread.start()
+
+    def stop(self):
+        self.should_report = False
+        self._wake.set()
+
+    def report(self):
+        """Log (and dump) the current histograms once"""
+        histograms = self.histograms()
+        for histogram in histograms.values():
+            if histogram.count:
+                logger.info(f"Latency {histogram.summary()}")
+        if self.path:
+            try:
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, 'w') as f:
+                    json.dump({name: histogram.snapshot() for name, histogram in histograms.items()}, f, indent=2)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                logger.error(f"Failed to write latency report {self.path}: {e}")
+
+    def _report_loop(self):
+        while self.should_report:
+            self._wake.wait(self.interval)
+            if not self.should_report:
+                break
+            try:
+                self.report()
+            except Exception as e:
+                logger.error(f"Latency report failed: {e}")
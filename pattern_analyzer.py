@@ -1,6 +1,33 @@
+import argparse
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from funscript_io import file_content_hash, read_funscript_buffers
+from pattern_index import DEFAULT_INDEX_FILE, write_pattern_index
+
+try:
+    import numpy as np
+except ImportError:  # Optional - pure Python fallback
+    np = None
+
+# Library subfolders analyzed under each root
+PATTERN_FOLDERS = ('bj', 'transitions', 'twerk')
+
+# Content-hash cache so re-runs only analyze new or changed slices
+DEFAULT_CACHE_FILE = 'pattern_speeds.cache.json'
+ANALYSIS_CACHE_VERSION = 2
+PARALLEL_THRESHOLD = 256  # Below this many changed files, a process pool costs more than it saves
+
+# Per-pattern metrics produced by analyze_patterns_batch
+INTENSITY_METRICS = (
+    'mean_velocity',   # Mean |pos change| / ms over action pairs (same as 'intensity')
+    'p95_velocity',    # 95th percentile velocity
+    'max_velocity',    # Peak velocity
+    'stroke_rate',     # Direction changes (half strokes) per minute
+    'amplitude',       # Mean position travel per moving segment (0-100)
+    'duty_cycle',      # Fraction of the pattern's duration spent moving
+)
 
 def analyze_pattern_speed(funscript_path):
     """Analyze a funscript and return intensity metrics"""
@@ -22,32 +49,270 @@ def analyze_pattern_speed(funscript_path):
     
     return sum(speeds) / len(speeds) if speeds else 0
 
-def classify_all_patterns():
-    """Scan all patterns and classify them"""
-    funscript_folder = "FUNSCRIPTS"  # Your folder path
+def _percentile(sorted_values, fraction):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = fraction * (len(sorted_values) - 1)
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+def compute_intensity_metrics(at, pos):
+    """Intensity metrics for one pattern's timestamps/positions (pure Python)"""
+    metrics = dict.fromkeys(INTENSITY_METRICS, 0.0)
+    if len(at) < 2:
+        return metrics
+    
+    speeds = []
+    moving_time = 0
+    travel = []
+    direction_changes = 0
+    last_direction = 0
+    for i in range(1, len(at)):
+        time_diff = at[i] - at[i-1]
+        pos_diff = pos[i] - pos[i-1]
+        if time_diff > 0:
+            speeds.append(abs(pos_diff) / time_diff)
+        if pos_diff != 0:
+            moving_time += max(0, time_diff)
+            travel.append(abs(pos_diff))
+            direction = 1 if pos_diff > 0 else -1
+            if last_direction and direction != last_direction:
+                direction_changes += 1
+            last_direction = direction
+    
+    duration = at[-1] - at[0]
+    speeds.sort()
+    if speeds:
+        metrics['mean_velocity'] = sum(speeds) / len(speeds)
+        metrics['p95_velocity'] = _percentile(speeds, 0.95)
+        metrics['max_velocity'] = speeds[-1]
+    if travel:
+        metrics['amplitude'] = sum(travel) / len(travel)
+    if duration > 0:
+        metrics['stroke_rate'] = direction_changes * 60000.0 / duration
+        metrics['duty_cycle'] = moving_time / duration
+    return metrics
+
+def analyze_patterns_batch(buffers):
+    """Compute intensity metrics for many patterns in one vectorized pass.
+
+    ``buffers`` is a sequence of (timestamps, positions) pairs; returns one
+    metrics dict per pattern, in order. Falls back to a per-pattern loop when
+    NumPy is not installed.
+    """
+    if np is None:
+        return [compute_intensity_metrics(at, pos) for at, pos in buffers]
+    
+    count = len(buffers)
+    if count == 0:
+        return []
+    
+    lengths = np.fromiter((len(at) for at, _ in buffers), dtype=np.int64, count=count)
+    at = np.concatenate([np.asarray(a, dtype=np.float64) for a, _ in buffers])
+    pos = np.concatenate([np.asarray(p, dtype=np.float64) for _, p in buffers])
+    
+    # Pair i connects action i and i+1; drop pairs that straddle two patterns
+    group = np.repeat(np.arange(count), lengths)
+    same_pattern = group[1:] == group[:-1]
+    pair_group = group[:-1][same_pattern]
+    time_diff = np.diff(at)[same_pattern]
+    pos_diff = np.diff(pos)[same_pattern]
+    
+    # Velocity over pairs with time_diff > 0 (matches analyze_pattern_speed)
+    timed = time_diff > 0
+    velocity = np.abs(pos_diff[timed]) / time_diff[timed]
+    velocity_group = pair_group[timed]
+    velocity_count = np.bincount(velocity_group, minlength=count)
+    mean_velocity = np.bincount(velocity_group, weights=velocity, minlength=count) / np.maximum(velocity_count, 1)
+    
+    max_velocity = np.zeros(count)
+    np.maximum.at(max_velocity, velocity_group, velocity)
+    
+    # p95 per pattern: sort by (group, velocity) and interpolate inside each group
+    order = np.lexsort((velocity, velocity_group))
+    sorted_velocity = velocity[order]
+    group_start = np.concatenate(([0], np.cumsum(velocity_count)[:-1]))
+    rank = 0.95 * np.maximum(velocity_count - 1, 0)
+    low = np.floor(rank).astype(np.int64)
+    high = np.minimum(low + 1, np.maximum(velocity_count - 1, 0))
+    has_velocity = velocity_count > 0
+    p95_velocity = np.zeros(count)
+    if has_velocity.any():
+        low_values = sorted_velocity[(group_start + low)[has_velocity]]
+        high_values = sorted_velocity[(group_start + high)[has_velocity]]
+        p95_velocity[has_velocity] = low_values + (high_values - low_values) * (rank - low)[has_velocity]
+    
+    # Movement: amplitude, duty cycle and direction changes
+    moving = pos_diff != 0
+    moving_group = pair_group[moving]
+    moving_count = np.bincount(moving_group, minlength=count)
+    amplitude = np.bincount(moving_group, weights=np.abs(pos_diff[moving]), minlength=count) / np.maximum(moving_count, 1)
+    moving_time = np.bincount(moving_group, weights=np.maximum(time_diff[moving], 0), minlength=count)
+    
+    direction = np.sign(pos_diff[moving])
+    reversal = (direction[1:] != direction[:-1]) & (moving_group[1:] == moving_group[:-1])
+    direction_changes = np.bincount(moving_group[1:][reversal], minlength=count)
+    
+    starts = np.cumsum(lengths) - lengths
+    non_empty = lengths > 0
+    duration = np.zeros(count)
+    duration[non_empty] = at[starts[non_empty] + lengths[non_empty] - 1] - at[starts[non_empty]]
+    safe_duration = np.where(duration > 0, duration, 1)
+    stroke_rate = np.where(duration > 0, direction_changes * 60000.0 / safe_duration, 0.0)
+    duty_cycle = np.where(duration > 0, moving_time / safe_duration, 0.0)
+    
+    columns = (mean_velocity, p95_velocity, max_velocity, stroke_rate, amplitude, duty_cycle)
+    return [
+        {name: float(column[i]) for name, column in zip(INTENSITY_METRICS, columns)}
+        for i in range(count)
+    ]
+
+def _analyze_files(file_paths):
+    """Pool worker: load and batch-analyze a chunk of funscripts (None for files that failed to read)"""
+    buffers = []
+    read_ok = []
+    for file_path in file_paths:
+        try:
+            buffers.append(read_funscript_buffers(file_path))
+            read_ok.append(True)
+        except Exception as e:
+            print(f"  Failed to read {file_path}: {e}")
+            read_ok.append(False)
+    
+    all_metrics = analyze_patterns_batch(buffers)
+    for (at, pos), metrics in zip(buffers, all_metrics):
+        # Endpoints and length for the pattern index
+        metrics['start_pos'] = pos[0] if len(pos) else 0
+        metrics['end_pos'] = pos[-1] if len(pos) else 0
+        metrics['duration'] = at[-1] if len(at) else 0
+    metrics_iter = iter(all_metrics)
+    return [next(metrics_iter) if ok else None for ok in read_ok]
+
+def _load_analysis_cache(cache_file):
+    """Load the content-hash cache ({'files': path -> stat/hash, 'metrics': hash -> metrics})"""
+    try:
+        with open(cache_file, 'r') as f:
+            cache = json.load(f)
+        if cache.get('version') == ANALYSIS_CACHE_VERSION:
+            return cache
+    except (OSError, ValueError):
+        pass
+    return {'version': ANALYSIS_CACHE_VERSION, 'files': {}, 'metrics': {}}
+
+def classify_all_patterns(roots=None, folders=PATTERN_FOLDERS, output_file='pattern_speeds.json',
+                          cache_file=DEFAULT_CACHE_FILE, workers=None, index_file=DEFAULT_INDEX_FILE):
+    """Scan all patterns and classify them, re-analyzing only new or changed files.
+
+    Patterns are identified by their library key ``<folder>/<file>``. When
+    several roots hold the same key, the first root wins and later copies are
+    skipped; files that cannot be read are skipped for this run.
+    """
+    roots = roots or ["FUNSCRIPTS"]  # Your folder path(s)
+    cache = _load_analysis_cache(cache_file)
+    cached_files = cache['files']
+    cached_metrics = cache['metrics']
+    
+    # Resolve every file to a content hash; unchanged stat -> hash from the cache
+    entries = []
+    seen_files = {}
+    seen_keys = {}
+    for root in roots:
+        for folder in folders:
+            folder_path = os.path.join(root, folder)
+            if not os.path.exists(folder_path):
+                continue
+            for file in sorted(os.listdir(folder_path)):
+                if not file.endswith('.funscript'):
+                    continue
+                file_path = os.path.abspath(os.path.join(folder_path, file))
+                key = f"{folder}/{file}"
+                if key in seen_keys:
+                    print(f"  Skipping {file_path}: {key} already found in {seen_keys[key]}")
+                    continue
+                try:
+                    stat = os.stat(file_path)
+                    known = cached_files.get(file_path)
+                    if known and known['mtime_ns'] == stat.st_mtime_ns and known['size'] == stat.st_size:
+                        content_hash = known['hash']
+                    else:
+                        content_hash = file_content_hash(file_path)
+                except OSError as e:
+                    print(f"  Failed to read {file_path}: {e}")
+                    continue
+                seen_keys[key] = root
+                seen_files[file_path] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'hash': content_hash}
+                entries.append((file, folder, file_path, content_hash))
+    
+    # Analyze only content we have not seen before (one path per new hash)
+    pending = {}
+    for _, _, file_path, content_hash in entries:
+        if content_hash not in cached_metrics and content_hash not in pending:
+            pending[content_hash] = file_path
+    
+    if pending:
+        hashes = list(pending)
+        paths = [pending[content_hash] for content_hash in hashes]
+        if len(paths) < PARALLEL_THRESHOLD:
+            metrics_list = _analyze_files(paths)
+        else:
+            workers = workers or os.cpu_count() or 1
+            chunk_size = max(1, -(-len(paths) // (workers * 4)))
+            chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+            metrics_list = []
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for chunk_metrics in executor.map(_analyze_files, chunks):
+                    metrics_list.extend(chunk_metrics)
+        # Failed reads are not cached, so the next run retries them
+        cached_metrics.update((h, m) for h, m in zip(hashes, metrics_list) if m is not None)
+    
     results = {}
+    index_rows = []
+    for file, folder, _, content_hash in entries:
+        metrics = cached_metrics.get(content_hash)
+        if metrics is None:
+            continue  # Could not be read this run
+        intensity = metrics['mean_velocity']
+        info = {
+            'category': folder,
+            'key': f"{folder}/{file}",
+            'intensity': intensity,
+            'speed_class': 'slow' if intensity < 0.1 else 'medium' if intensity < 0.3 else 'fast',
+            **metrics
+        }
+        # The index is keyed by folder/file, so equal file names in different folders don't collide;
+        # the JSON is keyed by file name and keeps the first, as name lookups resolve in folder order
+        index_rows.append({'name': file, **info})
+        results.setdefault(file, info)
     
-    for folder in ['bj', 'transitions', 'twerk']:
-        folder_path = os.path.join(funscript_folder, folder)
-        if os.path.exists(folder_path):
-            for file in os.listdir(folder_path):
-                if file.endswith('.funscript'):
-                    file_path = os.path.join(folder_path, file)
-                    intensity = analyze_pattern_speed(file_path)
-                    results[file] = {
-                        'category': folder,
-                        'intensity': intensity,
-                        'speed_class': 'slow' if intensity < 0.1 else 'medium' if intensity < 0.3 else 'fast'
-                    }
-    
-    # Save results
-    with open('pattern_speeds.json', 'w') as f:
+    # Save results (JSON for compatibility, columnar index for SessionManager)
+    with open(output_file, 'w') as f:
         json.dump(results, f, indent=2)
+    if index_file:
+        write_pattern_index(index_file, index_rows, INTENSITY_METRICS)
     
-    print(f"Analyzed {len(results)} patterns:")
+    # Drop cache entries for files and content that no longer exist
+    live_hashes = {content_hash for _, _, _, content_hash in entries}
+    cache['files'] = seen_files
+    cache['metrics'] = {h: m for h, m in cached_metrics.items() if h in live_hashes}
+    with open(cache_file, 'w') as f:
+        json.dump(cache, f, separators=(',', ':'))
+    
+    print(f"Analyzed {len(index_rows)} patterns ({len(pending)} new or changed):")
     for speed_class in ['slow', 'medium', 'fast']:
-        count = sum(1 for p in results.values() if p['speed_class'] == speed_class)
+        count = sum(1 for p in index_rows if p['speed_class'] == speed_class)
         print(f"  {speed_class}: {count} patterns")
+    return results
 
 if __name__ == "__main__":
-    classify_all_patterns()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Analyze pattern intensity and write pattern_speeds.json")
+    parser.add_argument('roots', nargs='*', help="Pattern library roots (default: FUNSCRIPTS)")
+    parser.add_argument('--output', default='pattern_speeds.json', help="Output file")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_FILE, help="Content-hash analysis cache")
+    parser.add_argument('--index', default=DEFAULT_INDEX_FILE, help="Columnar pattern index")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args()
+    
+    classify_all_patterns(args.roots, output_file=args.output, cache_file=args.cache,
+                          workers=args.workers, index_file=args.index)
\ No newline at end of file
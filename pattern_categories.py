@@ -0,0 +1,108 @@
+"""
+Pattern categories
+Category names, endpoint thresholds and the endpoint classifier shared by
+the library loader, the analyzer, the session planner and the slicer.
+Importing this module has no side effects.
+"""
+
+import os
+from typing import Optional, Tuple
+
+# PatternManager category lists, in load and summary order
+PATTERN_CATEGORIES = (
+    'main_patterns_0_to_0',
+    'main_patterns_100_to_100',
+    'main_patterns_50_to_50',
+    'transitions_0_to_100',
+    'transitions_100_to_0',
+    'transitions_50_to_0',
+    'transitions_50_to_100',
+    'transitions_0_to_50',
+    'transitions_100_to_50',
+)
+
+# (start endpoint, end endpoint) of each category
+CATEGORY_ENDPOINTS = {
+    'main_patterns_0_to_0': (0, 0),
+    'main_patterns_100_to_100': (100, 100),
+    'main_patterns_50_to_50': (50, 50),
+    'transitions_0_to_100': (0, 100),
+    'transitions_100_to_0': (100, 0),
+    'transitions_50_to_0': (50, 0),
+    'transitions_50_to_100': (50, 100),
+    'transitions_0_to_50': (0, 50),
+    'transitions_100_to_50': (100, 50),
+}
+
+# Endpoint thresholds (relaxed)
+DEEP_MAX_POS = 30       # Was <=10, now <=30
+SHALLOW_MIN_POS = 70    # Was >=90, now >=70
+MID_MIN_POS = 35        # Slightly wider range for twerk
+MID_MAX_POS = 65
+MAIN_MAX_DRIFT = 20     # Allow 20 position variance between start and end of main patterns
+
+def endpoint_zone(pos: int) -> Optional[int]:
+    """Map a position to its endpoint (0 deep, 50 mid, 100 shallow), or None between zones"""
+    if pos <= DEEP_MAX_POS:
+        return 0
+    if pos >= SHALLOW_MIN_POS:
+        return 100
+    if MID_MIN_POS <= pos <= MID_MAX_POS:
+        return 50
+    return None
+
+def classify_pattern_endpoints(start_pos: int, end_pos: int, is_transition: bool) -> Tuple[Optional[str], str]:
+    """Return (category attribute, description) for a pattern's endpoints.
+
+    Uses the relaxed thresholds of the pattern library; the category is None for
+    transitions that do not fit any bucket.
+    """
+    # RELAXED THRESHOLDS - More flexible position ranges
+    start_deep = start_pos <= DEEP_MAX_POS
+    end_deep = end_pos <= DEEP_MAX_POS
+    start_shallow = start_pos >= SHALLOW_MIN_POS
+    end_shallow = end_pos >= SHALLOW_MIN_POS
+    start_mid = MID_MIN_POS <= start_pos <= MID_MAX_POS
+    end_mid = MID_MIN_POS <= end_pos <= MID_MAX_POS
+    
+    if is_transition:
+        # Transition patterns: start != end
+        if start_deep and end_shallow:
+            return 'transitions_0_to_100', "transition 0->100"
+        elif start_shallow and end_deep:
+            return 'transitions_100_to_0', "transition 100->0"
+        elif start_mid and end_deep:
+            return 'transitions_50_to_0', "transition 50->0"
+        elif start_mid and end_shallow:
+            return 'transitions_50_to_100', "transition 50->100"
+        elif start_deep and end_mid:
+            return 'transitions_0_to_50', "transition 0->50"
+        elif start_shallow and end_mid:
+            return 'transitions_100_to_50', "transition 100->50"
+        return None, "uncategorized transition"
+    
+    # Main patterns: start ≈ end (allow some variance)
+    position_diff = abs(start_pos - end_pos)
+    
+    if start_deep and end_deep and position_diff <= MAIN_MAX_DRIFT:
+        return 'main_patterns_0_to_0', "main 0->0"
+    elif start_shallow and end_shallow and position_diff <= MAIN_MAX_DRIFT:
+        return 'main_patterns_100_to_100', "main 100->100"
+    elif start_mid and end_mid and position_diff <= MAIN_MAX_DRIFT:
+        return 'main_patterns_50_to_50', "main 50->50 (twerk)"
+    
+    # FALLBACK: If pattern doesn't fit strict categories, guess based on average position
+    avg_pos = (start_pos + end_pos) / 2
+    if avg_pos <= 35:
+        return 'main_patterns_0_to_0', f"main 0->0 (fallback - avg pos {avg_pos:.1f})"
+    elif avg_pos >= 65:
+        return 'main_patterns_100_to_100', f"main 100->100 (fallback - avg pos {avg_pos:.1f})"
+    return 'main_patterns_50_to_50', f"main 50->50 (fallback - avg pos {avg_pos:.1f})"
+
+def _pattern_stem(pattern_name: str) -> str:
+    """Pattern name without the .funscript extension"""
+    return pattern_name.replace('.funscript', '')
+
+def pattern_key(pattern) -> str:
+    """Library key '<folder>/<name>' of a FunscriptPattern, used by the pattern index"""
+    return f"{os.path.basename(os.path.dirname(pattern.file_path))}/{pattern.name}"
@@ -0,0 +1,287 @@
+"""
+Columnar pattern index
+Compact, schema-versioned replacement for pattern_speeds.json. Each column is a
+contiguous typed array, so readers map the file and index columns directly
+instead of parsing JSON and reshaping dicts.
+
+Layout (little-endian):
+    header   magic, schema version, column count, row count, string table offset/size
+    columns  descriptor per column: name, array typecode, byte offset
+    strings  UTF-8 string table (names, library keys, categories)
+    data     one 4-byte aligned typed array per column, row_count items each
+"""
+
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # Optional - row subsets fall back to array('I')
+    np = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_MAGIC = b'HSPI'
+INDEX_SCHEMA_VERSION = 1
+DEFAULT_INDEX_FILE = 'pattern_speeds.idx'
+
+SPEED_CLASSES = ('slow', 'medium', 'fast')
+
+# String columns are stored as (offset, length) pairs into the string table
+STRING_COLUMNS = ('name', 'key', 'category')
+
+# Fixed numeric columns; float metric columns are appended after these
+BASE_COLUMNS = (
+    ('start_pos', 'B'),
+    ('end_pos', 'B'),
+    ('speed_class', 'B'),
+    ('duration', 'i'),
+    ('intensity', 'f'),
+)
+
+# magic, schema version, column count, row count, string table offset, string table size
+_HEADER = struct.Struct('<4sHHIII')
+# column name, array typecode, byte offset of the column data
+_COLUMN = struct.Struct('<24s1s3xI')
+
+def write_pattern_index(index_path: str, rows: Sequence[Dict], metric_columns: Sequence[str] = ()):
+    """Write rows (dicts with name/key/category/endpoints/duration/intensity/metrics) as an index.
+
+    ``key`` (``<folder>/<file name>``) is the unique identifier; rows with a
+    duplicate key are dropped with a warning.
+    """
+    seen_keys = set()
+    unique_rows = []
+    for row in rows:
+        if row['key'] in seen_keys:
+            logger.warning(f"Duplicate pattern key in index, keeping first: {row['key']}")
+            continue
+        seen_keys.add(row['key'])
+        unique_rows.append(row)
+
+    strings = bytearray()
+    string_cache: Dict[str, tuple] = {}
+    columns: Dict[str, array] = {}
+    for column in STRING_COLUMNS:
+        columns[f'{column}_offset'] = array('I')
+        columns[f'{column}_length'] = array('H')
+    for column, typecode in BASE_COLUMNS:
+        columns[column] = array(typecode)
+    for column in metric_columns:
+        columns[column] = array('f')
+
+    for row in unique_rows:
+        for column in STRING_COLUMNS:
+            value = row[column]
+            if value not in string_cache:
+                encoded = value.encode('utf-8')
+                string_cache[value] = (len(strings), len(encoded))
+                strings += encoded
+            offset, length = string_cache[value]
+            columns[f'{column}_offset'].append(offset)
+            columns[f'{column}_length'].append(length)
+        columns['start_pos'].append(int(row.get('start_pos', 0)))
+        columns['end_pos'].append(int(row.get('end_pos', 0)))
+        columns['speed_class'].append(SPEED_CLASSES.index(row.get('speed_class', 'medium')))
+        columns['duration'].append(int(row.get('duration', 0)))
+        columns['intensity'].append(float(row.get('intensity', 0.0)))
+        for column in metric_columns:
+            columns[column].append(float(row.get(column, 0.0)))
+
+    strings_offset = _HEADER.size + _COLUMN.size * len(columns)
+    data_offset = (strings_offset + len(strings) + 3) & ~3
+
+    descriptors = bytearray()
+    payload = bytearray()
+    for column, values in columns.items():
+        if sys.byteorder != 'little':
+            values.byteswap()
+        descriptors += _COLUMN.pack(column.encode('utf-8'), values.typecode.encode(), data_offset + len(payload))
+        payload += values.tobytes()
+        payload += b'\0' * (-len(payload) % 4)
+
+    header = _HEADER.pack(INDEX_MAGIC, INDEX_SCHEMA_VERSION, len(columns), len(unique_rows),
+                          strings_offset, len(strings))
+
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(descriptors)
+        f.write(strings)
+        f.write(b'\0' * (data_offset - strings_offset - len(strings)))
+        f.write(payload)
+    os.replace(tmp_path, index_path)
+
+    logger.info(f"Wrote pattern index {index_path}: {len(unique_rows)} patterns, {len(columns)} columns")
+
+class PatternIndex:
+    """Memory-mapped, read-only view of a pattern index file.
+
+    ``columns`` maps column names to typed memoryviews over the file; string
+    columns are read through ``string(column, row)``.
+    """
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.columns: Dict[str, memoryview] = {}
+        self._strings = None
+        self._lookup: Optional[Dict[str, int]] = None
+        with open(index_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._map_columns()
+        except Exception:
+            self.close()
+            raise
+
+    def _map_columns(self):
+        index_path = self.index_path
+        magic, version, column_count, row_count, strings_offset, strings_size = _HEADER.unpack_from(self._mmap, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"Not a pattern index: {index_path}")
+        if version != INDEX_SCHEMA_VERSION:
+            raise ValueError(f"Unsupported pattern index schema {version} (expected {INDEX_SCHEMA_VERSION})")
+        if sys.byteorder != 'little':
+            raise ValueError("Pattern indexes can only be memory-mapped on little-endian hosts")
+
+        # Validate every descriptor before creating views, so a bad file leaves nothing exported
+        file_size = len(self._mmap)
+        if strings_offset + strings_size > file_size:
+            raise ValueError(f"Truncated pattern index: {index_path}")
+        descriptors = []
+        for i in range(column_count):
+            raw_name, typecode, offset = _COLUMN.unpack_from(self._mmap, _HEADER.size + i * _COLUMN.size)
+            typecode = typecode.decode()
+            size = row_count * array(typecode).itemsize
+            if offset + size > file_size:
+                raise ValueError(f"Truncated pattern index: {index_path}")
+            descriptors.append((raw_name.rstrip(b'\0').decode('utf-8'), typecode, offset, size))
+
+        self.schema_version = version
+        self.row_count = row_count
+        with memoryview(self._mmap) as view:
+            self._strings = view[strings_offset:strings_offset + strings_size]
+            for name, typecode, offset, size in descriptors:
+                self.columns[name] = view[offset:offset + size].cast(typecode)
+
+        self.metric_columns: List[str] = [
+            name for name in self.columns
+            if name not in dict(BASE_COLUMNS) and not name.endswith(('_offset', '_length'))
+        ]
+
+    def close(self):
+        """Release the column views and unmap the file"""
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+        if self._strings is not None:
+            self._strings.release()
+            self._strings = None
+        self._mmap.close()
+
+    def __len__(self):
+        return self.row_count
+
+    def string(self, column: str, row: int) -> str:
+        """Decode one string cell"""
+        offset = self.columns[f'{column}_offset'][row]
+        length = self.columns[f'{column}_length'][row]
+        return bytes(self._strings[offset:offset + length]).decode('utf-8')
+
+    def row(self, row: int) -> Dict:
+        """Materialize one row as a pattern info dict"""
+        columns = self.columns
+        info = {
+            'name': self.string('name', row),
+            'key': self.string('key', row),
+            'category': self.string('category', row),
+            'intensity': columns['intensity'][row],
+            'speed_class': SPEED_CLASSES[columns['speed_class'][row]],
+            'start_pos': columns['start_pos'][row],
+            'end_pos': columns['end_pos'][row],
+            'duration': columns['duration'][row],
+        }
+        for metric in self.metric_columns:
+            info[metric] = columns[metric][row]
+        return info
+
+    def rows_where(self, column: str, value) -> 'PatternRows':
+        """Rows whose numeric column equals value, as a PatternRows view"""
+        values = self.columns[column]
+        if np is not None:
+            return PatternRows(self, np.flatnonzero(np.asarray(values) == value))
+        return PatternRows(self, array('I', (row for row in range(self.row_count) if values[row] == value)))
+
+    def get(self, name_or_key: str, default=None) -> Optional[Dict]:
+        """Row dict for a library key, or the first row with that file name"""
+        if self._lookup is None:
+            lookup = {}
+            for row in range(self.row_count):
+                lookup.setdefault(self.string('key', row), row)
+            for row in range(self.row_count):
+                lookup.setdefault(self.string('name', row), row)
+            self._lookup = lookup
+        row = self._lookup.get(name_or_key)
+        return default if row is None else self.row(row)
+
+class PatternRows:
+    """List-like subset of an index's rows.
+
+    Only row numbers are held; indexing materializes that one row as an info
+    dict, so pools over the whole index decode nothing until a pattern is
+    picked. ``column`` reads a numeric column for the subset without dicts.
+    """
+    __slots__ = ('index', 'rows')
+
+    def __init__(self, index: PatternIndex, rows):
+        self.index = index
+        self.rows = rows  # numpy integer array, or array('I') without numpy
+
+    @classmethod
+    def concat(cls, pools: Sequence['PatternRows']) -> 'PatternRows':
+        """One view over several subsets of the same index"""
+        if np is not None:
+            return cls(pools[0].index, np.concatenate([pool.rows for pool in pools]))
+        rows = array('I')
+        for pool in pools:
+            rows.extend(pool.rows)
+        return cls(pools[0].index, rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return PatternRows(self.index, self.rows[position])
+        return self.index.row(int(self.rows[position]))
+
+    def __iter__(self):
+        for row in self.rows:
+            yield self.index.row(int(row))
+
+    def column(self, name: str):
+        """Values of a numeric column for these rows (numpy array, or list without numpy)"""
+        values = self.index.columns[name]
+        if np is not None:
+            return np.asarray(values)[self.rows]
+        return [values[row] for row in self.rows]
+
+    def take(self, positions: Sequence[int]) -> 'PatternRows':
+        """Subset by positions within this view"""
+        if np is not None:
+            return PatternRows(self.index, self.rows[np.asarray(positions, dtype=np.intp)])
+        return PatternRows(self.index, array('I', (self.rows[position] for position in positions)))
+
+def open_pattern_index(index_path: str) -> Optional[PatternIndex]:
+    """Open an index, returning None if it is missing or unreadable"""
+    if not os.path.exists(index_path):
+        return None
+    try:
+        return PatternIndex(index_path)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable pattern index {index_path}: {e}")
+        return None
@@ -0,0 +1,255 @@
+"""
+Binary pattern library pack
+Packs the whole funscript library into one memory-mappable file so startup
+does not have to walk the folders and json.load every slice.
+
+Layout (little-endian):
+    header      magic, version, counts, section offsets, source signature
+    categories  fixed-size name + first record + record count per category
+    records     per pattern: action offset/count, duration, endpoints, path
+    strings     UTF-8 relative paths
+    timestamps  int32 'at' values of every pattern, contiguous
+    positions   uint8 'pos' values of every pattern, contiguous
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+PACK_MAGIC = b'HSPK'
+PACK_VERSION = 1
+DEFAULT_PACK_NAME = 'patterns.pack'
+
+# magic, version, category count, pattern count, total actions,
+# categories/records/strings/timestamps/positions offsets, source signature
+_HEADER = struct.Struct('<4sHHIIIIIII32s')
+# category name, first record index, record count
+_CATEGORY = struct.Struct('<32sII')
+# action offset, action count, duration, path offset, path length, start pos, end pos
+_RECORD = struct.Struct('<IIiIHBB')
+
+class PackRecord:
+    """Index entry for one pattern stored in a pack"""
+    __slots__ = ('category', 'path', 'action_offset', 'action_count', 'duration', 'start_pos', 'end_pos')
+
+    def __init__(self, category, path, action_offset, action_count, duration, start_pos, end_pos):
+        self.category = category
+        self.path = path
+        self.action_offset = action_offset
+        self.action_count = action_count
+        self.duration = duration
+        self.start_pos = start_pos
+        self.end_pos = end_pos
+
+def library_signature(funscript_folder: str, folders: Iterable[str]) -> bytes:
+    """Fingerprint the library folders from file names, sizes and mtimes (no file reads)"""
+    digest = hashlib.sha256()
+    digest.update(f"pack-v{PACK_VERSION}".encode())
+    for folder in folders:
+        folder_path = os.path.join(funscript_folder, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        entries = sorted(
+            (entry for entry in os.scandir(folder_path)
+             if entry.name.lower().endswith('.funscript') and entry.is_file()),
+            key=lambda entry: entry.name
+        )
+        for entry in entries:
+            stat = entry.stat()
+            digest.update(f"{folder}/{entry.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.digest()
+
+def write_pack(pack_path: str, signature: bytes,
+               categories: Sequence[Tuple[str, Sequence[Tuple[str, Sequence[int], Sequence[int]]]]]):
+    """Write a pack file.
+
+    ``categories`` is an ordered sequence of ``(category_name, entries)`` where each
+    entry is ``(relative_path, timestamps, positions)``. The file is written to a
+    temporary name and moved into place so readers never see a partial pack.
+    """
+    records = bytearray()
+    strings = bytearray()
+    category_table = bytearray()
+    timestamps = array('i')
+    positions = array('B')
+    record_index = 0
+
+    for category_name, entries in categories:
+        category_table += _CATEGORY.pack(category_name.encode('utf-8'), record_index, len(entries))
+        for rel_path, at, pos in entries:
+            encoded_path = rel_path.replace(os.sep, '/').encode('utf-8')
+            duration = at[-1] if len(at) else 0
+            start_pos = pos[0] if len(pos) else 0
+            end_pos = pos[-1] if len(pos) else 0
+            records += _RECORD.pack(len(timestamps), len(at), duration,
+                                    len(strings), len(encoded_path), start_pos, end_pos)
+            strings += encoded_path
+            timestamps.extend(at)
+            positions.extend(pos)
+            record_index += 1
+
+    if sys.byteorder != 'little':
+        timestamps.byteswap()
+
+    categories_offset = _HEADER.size
+    records_offset = categories_offset + len(category_table)
+    strings_offset = records_offset + len(records)
+    timestamps_offset = (strings_offset + len(strings) + 3) & ~3  # int32 alignment
+    positions_offset = timestamps_offset + len(timestamps) * 4
+
+    header = _HEADER.pack(PACK_MAGIC, PACK_VERSION, len(categories), record_index, len(timestamps),
+                          categories_offset, records_offset, strings_offset,
+                          timestamps_offset, positions_offset, signature)
+
+    tmp_path = pack_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(category_table)
+        f.write(records)
+        f.write(strings)
+        f.write(b'\0' * (timestamps_offset - strings_offset - len(strings)))
+        f.write(timestamps.tobytes())
+        f.write(positions.tobytes())
+    os.replace(tmp_path, pack_path)
+
+    logger.info(f"Wrote pattern pack {pack_path}: {record_index} patterns, {len(timestamps)} actions")
+
+class PatternPack:
+    """Read-only, memory-mapped view of a pack file.
+
+    ``timestamps`` and ``positions`` are memoryviews straight over the mapping,
+    so slicing them per pattern copies nothing. Every section and record is
+    checked against the file size on open, so a truncated or corrupted pack
+    raises ValueError here instead of yielding short action slices later.
+    """
+    def __init__(self, pack_path: str):
+        self.pack_path = pack_path
+        self.timestamps = None
+        self.positions = None
+        self._view = None
+        self._mmap = None
+        self._file = open(pack_path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._map_sections()
+        except Exception:
+            self.close()
+            raise
+
+    def _map_sections(self):
+        pack_path = self.pack_path
+        file_size = len(self._mmap)
+        if file_size < _HEADER.size:
+            raise ValueError(f"Truncated pattern pack: {pack_path}")
+        (magic, version, category_count, pattern_count, total_actions,
+         categories_offset, records_offset, strings_offset,
+         timestamps_offset, positions_offset, signature) = _HEADER.unpack_from(self._mmap, 0)
+
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise ValueError(f"Unsupported pattern pack {pack_path} (magic={magic!r}, version={version})")
+        if sys.byteorder != 'little':
+            raise ValueError("Pattern packs can only be memory-mapped on little-endian hosts")
+
+        # Sections must follow each other in layout order and end inside the file
+        sections = (
+            (categories_offset, category_count * _CATEGORY.size),
+            (records_offset, pattern_count * _RECORD.size),
+            (strings_offset, timestamps_offset - strings_offset),
+            (timestamps_offset, total_actions * 4),
+            (positions_offset, total_actions),
+        )
+        section_end = _HEADER.size
+        for offset, size in sections:
+            if offset < section_end or size < 0:
+                raise ValueError(f"Corrupted pattern pack: {pack_path}")
+            section_end = offset + size
+        if section_end > file_size:
+            raise ValueError(f"Truncated pattern pack: {pack_path}")
+
+        categories: List[Tuple[str, int, int]] = []
+        for i in range(category_count):
+            raw_name, first, count = _CATEGORY.unpack_from(self._mmap, categories_offset + i * _CATEGORY.size)
+            if first + count > pattern_count:
+                raise ValueError(f"Corrupted pattern pack: {pack_path}")
+            categories.append((raw_name.rstrip(b'\0').decode('utf-8'), first, count))
+
+        # Decode and bounds-check every record up front; records() serves this list
+        strings_size = timestamps_offset - strings_offset
+        records: List[PackRecord] = []
+        for category, first, count in categories:
+            for index in range(first, first + count):
+                (action_offset, action_count, duration, path_offset, path_length,
+                 start_pos, end_pos) = _RECORD.unpack_from(self._mmap, records_offset + index * _RECORD.size)
+                if action_offset + action_count > total_actions or path_offset + path_length > strings_size:
+                    raise ValueError(f"Corrupted pattern pack: {pack_path}")
+                path_start = strings_offset + path_offset
+                path = self._mmap[path_start:path_start + path_length].decode('utf-8')
+                records.append(PackRecord(category, path, action_offset, action_count, duration, start_pos, end_pos))
+
+        self.signature = signature
+        self.pattern_count = pattern_count
+        self.categories = categories
+        self._records = records
+        self._view = memoryview(self._mmap)
+        self.timestamps = self._view[timestamps_offset:timestamps_offset + total_actions * 4].cast('i')
+        self.positions = self._view[positions_offset:positions_offset + total_actions]
+
+    def records(self) -> Iterable[PackRecord]:
+        """Yield every pattern record in category order"""
+        return iter(self._records)
+
+    def action_buffers(self, record: PackRecord):
+        """Zero-copy (timestamps, positions) views for one record"""
+        return self.slice_buffers(record.action_offset, record.action_count)
+
+    def slice_buffers(self, action_offset: int, action_count: int):
+        """Zero-copy (timestamps, positions) views for an action range"""
+        end = action_offset + action_count
+        return self.timestamps[action_offset:end], self.positions[action_offset:end]
+
+    def close(self):
+        """Release the mapping (only safe once no pattern views are in use)"""
+        try:
+            for view in (self.timestamps, self.positions, self._view):
+                if view is not None:
+                    view.release()
+            if self._mmap is not None:
+                self._mmap.close()
+        except (BufferError, ValueError):
+            # Pattern views still reference the mapping; leave it to the GC
+            pass
+        self._file.close()
+
+def open_pack(pack_path: str, expected_signature: Optional[bytes] = None) -> Optional[PatternPack]:
+    """Open a pack, returning None if it is missing, unreadable or stale"""
+    if not os.path.exists(pack_path):
+        return None
+    try:
+        pack = PatternPack(pack_path)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable pattern pack {pack_path}: {e}")
+        return None
+    if expected_signature is not None and pack.signature != expected_signature:
+        logger.info(f"Pattern pack {pack_path} is stale - source folders changed")
+        pack.close()
+        return None
+    return pack
+
+if __name__ == "__main__":
+    # Build step: python pattern_pack.py <funscript_folder> [pack_path]
+    from device_handler import PatternManager
+
+    if len(sys.argv) < 2:
+        print("Usage: python pattern_pack.py <funscript_folder> [pack_path]")
+        sys.exit(1)
+
+    folder = sys.argv[1]
+    target = sys.argv[2] if len(sys.argv) > 2 else os.path.join(folder, DEFAULT_PACK_NAME)
+    PatternManager(folder).build_pack(target)
@@ -0,0 +1,338 @@
+"""
+Headless multi-session host
+Loads the pattern library and the speed index once and runs many independent
+sessions - one per user/device - from one process.
+
+Sessions share every read-only structure (patterns, speed lists, intensity
+index, samplers, transition graph); each one only owns its clock position,
+arousal curve and playback cursor. Sessions are driven from a heap of
+next-action deadlines per shard thread instead of one sleeping thread per
+session. Shard threads keep a slow step from delaying unrelated sessions, but
+they share one core (GIL): to use more cores, run one host process per core.
+Benchmarks fan out over worker processes that way; given a pack_path they
+share the memory-mapped pack's pages through the OS page cache.
+"""
+
+import argparse
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from clock import SYSTEM_CLOCK, VirtualClock
+from command_sender import CommandSender
+from device_handler import PatternManager, PlaybackEngine
+from pattern_index import DEFAULT_INDEX_FILE
+from session_manager import PATTERN_GAP, SessionManager
+
+logger = logging.getLogger(__name__)
+
+HOST_CURVE_RESOLUTION = 15.0  # seconds between curve points; lookups still interpolate
+MAX_WAIT = 0.5                # shard threads re-check for new sessions at least this often
+
+class SessionLibrary:
+    """Pattern library and speed data loaded once, shared read-only by every hosted session"""
+
+    def __init__(self, funscript_folder: str, pattern_speeds_file: str = "pattern_speeds.json",
+                 pattern_index_file: str = DEFAULT_INDEX_FILE, selection_mode: str = 'graph',
+                 precompile_queue: bool = False, pack_path: Optional[str] = None):
+        # pack_path opts in to a memory-mapped pack (written there if missing or stale);
+        # by default nothing is written next to the library
+        self.pattern_manager = PatternManager(funscript_folder, pack_path=pack_path)
+
+        # Template every session is forked from
+        self.template = SessionManager(pattern_speeds_file, pattern_index_file)
+        self.template.build_transition_graph(self.pattern_manager)
+        self.template.selection_mode = selection_mode
+        self.template.precompile_queue = precompile_queue
+        self.template.curve_resolution = HOST_CURVE_RESOLUTION
+        self.template.curve_preview = False
+
+    def new_session(self, clock) -> SessionManager:
+        return self.template.fork(clock)
+
+class HostedSession:
+    """One session's playback cursor: the pattern being played and the next action due"""
+    __slots__ = ('session_id', 'device', 'sender', 'session', 'engine', 'pattern', 'timestamps', 'positions',
+                 'action_index', 'pattern_start', 'scale', 'stopped')
+
+    def __init__(self, session_id: int, device, session: SessionManager, engine: PlaybackEngine,
+                 sender: Optional[CommandSender] = None):
+        self.session_id = session_id
+        self.device = device
+        self.sender = sender  # Host-owned sender for devices that would block the shard thread
+        self.session = session
+        self.engine = engine
+        self.pattern = None
+        self.timestamps = None
+        self.positions = None
+        self.action_index = 0
+        self.pattern_start = 0.0
+        self.scale = 1.0  # engine.timeline_scale() of the current pattern
+        self.stopped = False
+
+    def begin(self, pattern, start_time: float) -> float:
+        """Make pattern current, starting at start_time; returns when its first action is due"""
+        self.pattern = pattern
+        self.timestamps, self.positions = pattern.buffers()
+        self.action_index = 0
+        self.pattern_start = start_time
+        self.scale = self.engine.timeline_scale()
+        if not len(self.timestamps):
+            return start_time
+        return start_time + self.timestamps[0] / 1000.0 * self.scale
+
+    def send(self, position: float, duration: int, droppable: bool = True):
+        """Hand a move to the device without waiting on I/O"""
+        if self.sender is not None:
+            self.sender.submit_move(position, duration, droppable)
+        else:
+            self.device.send_position_command(position, duration, droppable=droppable)
+
+    def step(self, due: float) -> Optional[float]:
+        """Send the action due now; returns when the next one is due (None once the session is over)"""
+        engine = self.engine
+        timestamps = self.timestamps
+        index = self.action_index
+
+        if index < len(timestamps):
+            # Same command as PlaybackEngine._play_pattern
+            action_at = timestamps[index]
+            position = engine._apply_range_clamp(self.positions[index] / 100.0)
+            if index < len(timestamps) - 1:
+                duration = engine._scale_duration(timestamps[index + 1] - action_at, self.scale)
+            else:
+                duration = 500
+            self.send(position, duration)
+
+            index += 1
+            if index < len(timestamps):
+                self.action_index = index
+                return self.pattern_start + timestamps[index] / 1000.0 * self.scale
+
+        # Pattern finished: chain to the next one after the usual breathing room
+        if self.stopped or not self.session.is_session_active():
+            return None
+        next_pattern = engine._select_pattern_for_position(self.pattern.end_pos)
+        if next_pattern is None:
+            return None
+        engine.current_position = self.pattern.end_pos
+        engine.dynamic_speed_multiplier = engine.next_speed_multiplier
+        return self.begin(next_pattern, due + PATTERN_GAP)
+
+class _Shard:
+    """Heap of (due time, sequence, session) driven by one thread"""
+    __slots__ = ('heap', 'condition', 'thread')
+
+    def __init__(self):
+        self.heap = []
+        self.condition = threading.Condition()
+        self.thread = None
+
+class SessionHost:
+    """Runs many independent sessions over one shared SessionLibrary"""
+
+    def __init__(self, library: SessionLibrary, clock=None, shards: int = 1):
+        self.library = library
+        self.clock = clock or SYSTEM_CLOCK
+        self.sessions: Dict[int, HostedSession] = {}
+        self.shards = [_Shard() for _ in range(max(1, shards))]
+        self.should_run = False
+        self._ids = itertools.count(1)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def add_session(self, device_client, session_time: str, peaks: int = 3, seed: Optional[int] = None,
+                    min_range: int = 0, max_range: int = 100) -> Optional[int]:
+        """Start a session for one device; returns its id, or None if it could not start"""
+        session = self.library.new_session(self.clock)
+        session.peaks_count = peaks
+        session.curve_seed = seed
+        if not session.start_session(session_time):
+            return None
+
+        engine = PlaybackEngine(self.library.pattern_manager, device_client, clock=self.clock)
+        engine.session_manager = session
+        engine.set_range(min_range, max_range)
+
+        first_pattern = engine._select_pattern_for_position(0)
+        if first_pattern is None:
+            logger.error("No patterns available to start hosted session")
+            return None
+        engine.dynamic_speed_multiplier = engine.next_speed_multiplier
+
+        # Shard threads must never block on a device: clients without their own
+        # sender thread get one (virtual-clock runs send synchronously, in order)
+        sender = None
+        if getattr(device_client, 'sender', None) is None and not isinstance(self.clock, VirtualClock):
+            sender = CommandSender(device_client.send_position_command, device_client.send_stop_command)
+            sender.start()
+
+        with self._lock:
+            session_id = next(self._ids)
+            hosted = HostedSession(session_id, device_client, session, engine, sender)
+            self.sessions[session_id] = hosted
+        self._schedule(hosted, hosted.begin(first_pattern, self.clock.time()))
+        logger.info(f"Hosted session {session_id} started: {session.session_length}s, {peaks} peaks")
+        return session_id
+
+    def remove_session(self, session_id: int):
+        """Stop a session, drop its scheduled step and send its device home"""
+        hosted = self.sessions.get(session_id)
+        if hosted is not None:
+            hosted.stopped = True
+            self._unschedule(hosted)
+            self._finish(hosted)
+
+    def _shard_of(self, hosted: HostedSession) -> _Shard:
+        return self.shards[hosted.session_id % len(self.shards)]
+
+    def _schedule(self, hosted: HostedSession, due: float):
+        shard = self._shard_of(hosted)
+        with shard.condition:
+            heapq.heappush(shard.heap, (due, next(self._sequence), hosted))
+            shard.condition.notify()
+
+    def _unschedule(self, hosted: HostedSession):
+        """Remove a session's pending step from its shard heap"""
+        shard = self._shard_of(hosted)
+        with shard.condition:
+            shard.heap = [entry for entry in shard.heap if entry[2] is not hosted]
+            heapq.heapify(shard.heap)
+
+    def _finish(self, hosted: HostedSession):
+        with self._lock:
+            if self.sessions.pop(hosted.session_id, None) is None:
+                return  # Already finished (e.g. removed while its step was running)
+        try:
+            hosted.send(0.0, 1000, droppable=False)
+        except Exception as e:
+            logger.error(f"Failed to stop device for session {hosted.session_id}: {e}")
+        if hosted.sender is not None:
+            hosted.sender.stop(drain=True)  # The home move still goes out
+        hosted.session.stop_session()
+        logger.info(f"Hosted session {hosted.session_id} finished")
+
+    def _run_step(self, hosted: HostedSession, due: float):
+        next_due = None
+        if not hosted.stopped:
+            try:
+                next_due = hosted.step(due)
+            except Exception as e:
+                logger.error(f"Error in hosted session {hosted.session_id}: {e}")
+        if next_due is None:
+            self._finish(hosted)
+        else:
+            self._schedule(hosted, next_due)
+
+    def start(self):
+        """Start one scheduler thread per shard (wall-clock hosting)"""
+        self.should_run = True
+        for shard in self.shards:
+            if not shard.thread or not shard.thread.is_alive():
+                shard.thread = threading.Thread(target=self._shard_loop, args=(shard,))
+                shard.thread.daemon = True
+                shard.thread.start()
+
+    def stop(self):
+        """Stop the scheduler threads and send every device home"""
+        self.should_run = False
+        for shard in self.shards:
+            with shard.condition:
+                shard.heap.clear()
+                shard.condition.notify_all()
+        for hosted in list(self.sessions.values()):
+            hosted.stopped = True
+            self._finish(hosted)
+
+    def _shard_loop(self, shard: _Shard):
+        while self.should_run:
+            with shard.condition:
+                if not shard.heap:
+                    shard.condition.wait(MAX_WAIT)
+                    continue
+                due, _, hosted = shard.heap[0]
+                delay = due - self.clock.time()
+                if delay > 0:
+                    shard.condition.wait(min(delay, MAX_WAIT))
+                    continue
+                heapq.heappop(shard.heap)
+            self._run_step(hosted, due)
+
+    def run_until_idle(self):
+        """Drive every session to completion in the calling thread (VirtualClock runs)"""
+        while True:
+            shard = min((shard for shard in self.shards if shard.heap),
+                        key=lambda shard: shard.heap[0][0], default=None)
+            if shard is None:
+                return
+            due, _, hosted = heapq.heappop(shard.heap)
+            delay = due - self.clock.time()
+            if delay > 0:
+                self.clock.sleep(delay)
+            self._run_step(hosted, due)
+
+_worker_library: Optional[SessionLibrary] = None
+
+def _init_worker(funscript_folder: str, pattern_speeds_file: str, pattern_index_file: str,
+                 pack_path: Optional[str]):
+    """Process pool initializer: load the shared library once per worker"""
+    global _worker_library
+    logging.getLogger().setLevel(logging.WARNING)
+    _worker_library = SessionLibrary(funscript_folder, pattern_speeds_file, pattern_index_file,
+                                     pack_path=pack_path)
+
+def _simulate_worker(job) -> List[int]:
+    """Run a batch of sessions on a virtual clock; returns commands sent per session"""
+    from simulator import FakeDeviceClient
+
+    session_count, session_time, peaks = job
+    clock = VirtualClock()
+    host = SessionHost(_worker_library, clock=clock, shards=1)
+    devices = [FakeDeviceClient(clock) for _ in range(session_count)]
+    for device in devices:
+        host.add_session(device, session_time, peaks)
+    host.run_until_idle()
+    return [len(device.commands) for device in devices]
+
+def simulate_sessions(funscript_folder: str, sessions: int, session_time: str = "30:00", peaks: int = 3,
+                      processes: Optional[int] = None, pattern_speeds_file: str = "pattern_speeds.json",
+                      pattern_index_file: str = DEFAULT_INDEX_FILE, pack_path: Optional[str] = None) -> List[int]:
+    """Simulate many hosted sessions on virtual clocks across worker processes"""
+    processes = max(1, processes or os.cpu_count() or 1)
+    if pack_path:
+        # Build the pack once up front so the workers only map it
+        PatternManager(funscript_folder, pack_path=pack_path)
+    per_process = [sessions // processes + (1 if i < sessions % processes else 0) for i in range(processes)]
+    jobs = [(count, session_time, peaks) for count in per_process if count]
+
+    commands: List[int] = []
+    with ProcessPoolExecutor(max_workers=len(jobs), initializer=_init_worker,
+                             initargs=(funscript_folder, pattern_speeds_file, pattern_index_file,
+                                       pack_path)) as executor:
+        for result in executor.map(_simulate_worker, jobs):
+            commands.extend(result)
+    return commands
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate many concurrent hosted sessions")
+    parser.add_argument('library', help="Pattern library folder (bj/, transitions/, twerk/)")
+    parser.add_argument('--sessions', type=int, default=100, help="Concurrent sessions")
+    parser.add_argument('--session', default="30:00", help="Session length (MM:SS)")
+    parser.add_argument('--peaks', type=int, default=3, help="Arousal peaks (1-10)")
+    parser.add_argument('--processes', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--speeds', default="pattern_speeds.json", help="Pattern speed analysis JSON")
+    parser.add_argument('--index', default=DEFAULT_INDEX_FILE, help="Pattern speed index")
+    parser.add_argument('--pack', default=None, help="Pattern pack to map (built there if missing or stale)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = simulate_sessions(args.library, args.sessions, args.session, args.peaks,
+                               args.processes, args.speeds, args.index, args.pack)
+    elapsed = time.perf_counter() - started
+    print(f"Simulated {len(counts)} sessions of {args.session} in {elapsed:.2f}s "
+          f"({sum(counts)} commands, {sum(counts) / elapsed:.0f} commands/s)")
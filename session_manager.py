@@ -3,20 +3,300 @@ Enhanced Session Manager with Multi-Peak Arousal Curves
 Supports 1-10 peaks with visual timeline integration
 """
 
+import copy
 import json
 import random
-import time
 import math
 import logging
+from bisect import bisect_left
 from typing import List, Dict, Optional, Tuple
+from clock import SYSTEM_CLOCK, VirtualClock
+from arousal_curve import DEFAULT_CURVE_RESOLUTION, ArousalCurve, build_arousal_curve, generate_arousal_curve
+from pattern_categories import CATEGORY_ENDPOINTS, PATTERN_CATEGORIES, endpoint_zone, pattern_key
+from pattern_analyzer import INTENSITY_METRICS
+from pattern_index import DEFAULT_INDEX_FILE, PatternRows, open_pattern_index
 
 logger = logging.getLogger(__name__)
 
+# Per-pattern weight of each speed class in each arousal band ('bands' selection mode).
+# Neighbouring classes get the same total share the old "first third" slices had,
+# but spread over every pattern in the class.
+DEFAULT_BAND_WEIGHTS = {
+    'low': {'slow': 1.0, 'medium': 1 / 3},
+    'medium': {'slow': 1 / 3, 'medium': 1.0, 'fast': 1 / 3},
+    'high': {'medium': 0.5, 'fast': 1.0},
+}
+
+SPEED_CLASS_ORDER = ('slow', 'medium', 'fast')
+ENDPOINTS = (0, 50, 100)
+
+# Speed class targeted by each arousal band ('graph' selection mode)
+BAND_SPEED_CLASS = {'low': 'slow', 'medium': 'medium', 'high': 'fast'}
+
+# Classes to try for each target when it is unreachable, closest first
+SPEED_CLASS_FALLBACK = {
+    target: sorted(SPEED_CLASS_ORDER,
+                   key=lambda c: abs(SPEED_CLASS_ORDER.index(c) - SPEED_CLASS_ORDER.index(target)))
+    for target in SPEED_CLASS_ORDER
+}
+
+# Library key, endpoints and length written by classify_all_patterns next to the metrics
+PATTERN_SHAPE_FIELDS = ('key', 'start_pos', 'end_pos', 'duration')
+
+PATTERN_GAP = 0.1                     # seconds PlaybackEngine pauses between patterns
+DEFAULT_PATTERN_DURATION_MS = 10000   # sort.py slice length, for infos without a duration
+
+# Duration-exact planning ('exact' planner)
+PLAN_STEP = 1.0           # DP time resolution in seconds
+PLAN_TOLERANCE = 5.0      # DP may land this many seconds off; multipliers absorb the rest
+PLAN_MAX_STRETCH = 0.1    # largest uniform multiplier correction applied to hit the length exactly
+PLAN_JITTER = 0.1         # random tie-breaking per pick (below one speed class of mismatch)
+PLAN_LANDING_PENALTY = 1e6  # cost per step a plan lands away from the session end (dominates any mismatch)
+
+def arousal_band(target_arousal: float) -> str:
+    """Map arousal to speed preference band"""
+    if target_arousal < 30:
+        return 'low'      # Low arousal - prefer slow patterns
+    elif target_arousal < 70:
+        return 'medium'   # Medium arousal - prefer medium patterns
+    return 'high'         # High arousal - prefer fast patterns
+
+def nearest_endpoint(pos: int) -> int:
+    """Closest of the 0/50/100 endpoints"""
+    return min(ENDPOINTS, key=lambda endpoint: abs(endpoint - pos))
+
+def _join_pools(pools) -> List:
+    """Concatenate pattern pools; index-backed pools stay row views"""
+    if pools and all(isinstance(pool, PatternRows) for pool in pools):
+        return PatternRows.concat(pools)
+    return [info for pool in pools for info in pool]
+
+def _take(pool, positions: List[int]) -> List:
+    """Items of a pool at the given positions (a row view for index-backed pools)"""
+    if isinstance(pool, PatternRows):
+        return pool.take(positions)
+    return [pool[position] for position in positions]
+
+def _pool_column(pool, name: str, default: float = 0.0) -> List:
+    """One field for every item of a pool, read from the index columns when it has them"""
+    if isinstance(pool, PatternRows):
+        if name not in pool.index.columns:
+            return [default] * len(pool)
+        values = pool.column(name)
+        return values.tolist() if hasattr(values, 'tolist') else values
+    return [info.get(name, default) for info in pool]
+
+def _start_zones(pool) -> List[Optional[int]]:
+    """Start endpoint zone of every item of a pool (None when unknown)"""
+    if isinstance(pool, PatternRows):
+        return [endpoint_zone(int(pos)) for pos in pool.column('start_pos')]
+    return [endpoint_zone(info['start_pos']) if 'start_pos' in info else None for info in pool]
+
+class AliasSampler:
+    """Walker/Vose alias table: O(1) weighted draws with no allocation per draw"""
+    
+    def __init__(self, items: List, weights: List[float]):
+        count = len(items)
+        total = float(sum(weights))
+        self.items = items
+        self.probability = [1.0] * count
+        self.alias = list(range(count))
+        
+        scaled = [weight * count / total for weight in weights]
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            low = small.pop()
+            high = large.pop()
+            self.probability[low] = scaled[low]
+            self.alias[low] = high
+            scaled[high] -= 1.0 - scaled[low]
+            (small if scaled[high] < 1.0 else large).append(high)
+        # Leftovers are 1.0 up to rounding error
+    
+    def __len__(self):
+        return len(self.items)
+    
+    def draw(self):
+        """Weighted random item"""
+        column = random.randrange(len(self.items))
+        if random.random() < self.probability[column]:
+            return self.items[column]
+        return self.items[self.alias[column]]
+
+class IntensityIndex:
+    """Sorted intensity index over pattern infos for nearest-neighbour selection
+
+    Patterns are partitioned by start endpoint (0/50/100, plus an 'any' group)
+    and sorted by intensity, with amplitude as tie-breaker. A query is a bisect
+    plus an O(k) walk outwards, so no pools are built per call.
+    """
+    
+    def __init__(self, patterns: List[Dict]):
+        # Sort positions on the intensity columns; index-backed infos are only built when picked
+        intensities = _pool_column(patterns, 'intensity')
+        amplitudes = _pool_column(patterns, 'amplitude')
+        groups: Dict[Optional[int], List[int]] = {None: list(range(len(patterns)))}
+        for position, zone in enumerate(_start_zones(patterns)):
+            if zone is not None:
+                groups.setdefault(zone, []).append(position)
+        
+        self._patterns: Dict[Optional[int], List[Dict]] = {}
+        self._keys: Dict[Optional[int], List[float]] = {}
+        for zone, positions in groups.items():
+            positions.sort(key=lambda position: (intensities[position], amplitudes[position]))
+            self._patterns[zone] = _take(patterns, positions)
+            self._keys[zone] = [intensities[position] for position in positions]
+    
+    def __len__(self):
+        return len(self._patterns[None])
+    
+    def target_intensity(self, arousal: float) -> float:
+        """Map arousal 0-100 onto the library's intensity distribution (same percentile)"""
+        keys = self._keys[None]
+        if not keys:
+            return 0.0
+        rank = max(0.0, min(1.0, arousal / 100.0)) * (len(keys) - 1)
+        low = int(rank)
+        high = min(low + 1, len(keys) - 1)
+        return keys[low] + (keys[high] - keys[low]) * (rank - low)
+    
+    def nearest(self, target: float, current_pos: Optional[int] = None, k: int = 5) -> Optional[Dict]:
+        """Random pick among the k patterns closest to target intensity, starting near current_pos"""
+        zone = endpoint_zone(current_pos) if current_pos is not None else None
+        if not self._patterns.get(zone):
+            zone = None
+        patterns = self._patterns[zone]
+        keys = self._keys[zone]
+        if not patterns:
+            return None
+        
+        # Walk outwards from the insertion point, always taking the closer side
+        high = bisect_left(keys, target)
+        low = high - 1
+        for _ in range(min(k, len(keys))):
+            if low < 0:
+                high += 1
+            elif high >= len(keys) or target - keys[low] <= keys[high] - target:
+                low -= 1
+            else:
+                high += 1
+        
+        return patterns[random.randrange(low + 1, high)]
+
+class TransitionGraph:
+    """Endpoint x speed class graph over a PatternManager's category lists
+
+    Every main/transition pattern is an edge from its start endpoint to its end
+    endpoint, labelled with the pattern's speed class. For each (current
+    endpoint, target class) the first hops of all cheapest paths (one unit per
+    pattern) are precomputed into an alias sampler, so a pick is O(1) and always
+    starts where the stroker currently is.
+    """
+    
+    def __init__(self, pattern_manager, speed_info: Dict[str, Dict]):
+        self.pattern_manager = pattern_manager
+        self.generation = getattr(pattern_manager, 'generation', None)
+        
+        # Edge groups: (start endpoint, end endpoint, speed class) -> pattern infos
+        edges: Dict[Tuple[int, int, str], List[Dict]] = {}
+        for category in PATTERN_CATEGORIES:
+            start, end = CATEGORY_ENDPOINTS[category]
+            for pattern in getattr(pattern_manager, category):
+                key = pattern_key(pattern)
+                info = speed_info.get(key) or speed_info.get(pattern.name) or {}
+                speed_class = info.get('speed_class', 'medium')
+                # Always name this exact pattern, even if the speed data was matched by name
+                edges.setdefault((start, end, speed_class), []).append(
+                    dict(info, name=pattern.name, key=key, speed_class=speed_class,
+                         category=category, start_pos=start, end_pos=end, duration=pattern.duration)
+                )
+        self.edges = edges
+        self.edge_count = sum(len(infos) for infos in edges.values())
+        
+        # Hops from each endpoint to the first pattern of the target class
+        self.distance: Dict[str, Dict[int, float]] = {}
+        self.samplers: Dict[Tuple[int, str], AliasSampler] = {}
+        for target in SPEED_CLASS_ORDER:
+            distance = {endpoint: math.inf for endpoint in ENDPOINTS}
+            # Bellman-Ford over three nodes: a path never needs more than three hops
+            for _ in ENDPOINTS:
+                for (start, end, speed_class) in edges:
+                    cost = 1 if speed_class == target else 1 + distance[end]
+                    if cost < distance[start]:
+                        distance[start] = cost
+            self.distance[target] = distance
+            
+            for endpoint in ENDPOINTS:
+                if distance[endpoint] == math.inf:
+                    continue
+                first_hops = []
+                for (start, end, speed_class), infos in edges.items():
+                    if start != endpoint:
+                        continue
+                    cost = 1 if speed_class == target else 1 + distance[end]
+                    if cost == distance[endpoint]:
+                        first_hops.extend(infos)
+                self.samplers[(endpoint, target)] = AliasSampler(first_hops, [1.0] * len(first_hops))
+    
+    def is_stale(self) -> bool:
+        """True once the pattern library changed since the graph was built"""
+        return getattr(self.pattern_manager, 'generation', None) != self.generation
+    
+    def next_pattern(self, current_pos: int, target_class: str) -> Optional[Dict]:
+        """First pattern on a cheapest path from current_pos to target_class (nearest reachable class)"""
+        endpoint = nearest_endpoint(current_pos)
+        for speed_class in SPEED_CLASS_FALLBACK[target_class]:
+            sampler = self.samplers.get((endpoint, speed_class))
+            if sampler is not None:
+                return sampler.draw()
+        return None
+
+class PlannedPattern:
+    """One entry of a compiled session queue"""
+    __slots__ = ('pattern', 'speed_multiplier', 'start_time', 'duration')
+    
+    def __init__(self, pattern: Dict, speed_multiplier: float, start_time: float, duration: float):
+        self.pattern = pattern                    # Pattern info dict (name, key, endpoints, ...)
+        self.speed_multiplier = speed_multiplier
+        self.start_time = start_time              # Seconds into the session
+        self.duration = duration                  # Seconds, including the gap after it
+    
+    @property
+    def end_time(self) -> float:
+        return self.start_time + self.duration
+    
+    def to_dict(self) -> Dict:
+        return {
+            'start_time': round(self.start_time, 3),
+            'duration': round(self.duration, 3),
+            'name': self.pattern['name'],
+            'key': self.pattern.get('key', self.pattern['name']),
+            'speed_class': self.pattern.get('speed_class', 'medium'),
+            'speed_multiplier': self.speed_multiplier,
+        }
+
+class _PlanTable:
+    """Cost-to-go table of one exact plan: the cheapest continuation from any (step, endpoint)"""
+    __slots__ = ('graph', 'start_time', 'options', 'multipliers', 'cost', 'choice')
+    
+    def __init__(self, graph: TransitionGraph, start_time: float, options, multipliers, cost, choice):
+        self.graph = graph
+        self.start_time = start_time      # Session time of step 0
+        self.options = options            # Per start endpoint: (end index, class index, base steps, patterns)
+        self.multipliers = multipliers    # Curve speed multiplier per step
+        self.cost = cost                  # cost[step][endpoint index]
+        self.choice = choice              # (option index, arrival step) per cell, None to stop there
+
 class SessionManager:
     """Manages session timing and pattern progression with multi-peak support"""
     
-    def __init__(self, pattern_speeds_file: str = "pattern_speeds.json"):
+    def __init__(self, pattern_speeds_file: str = "pattern_speeds.json",
+                 pattern_index_file: str = DEFAULT_INDEX_FILE,
+                 band_weights: Optional[Dict[str, Dict[str, float]]] = None, clock=None):
+        self.clock = clock or SYSTEM_CLOCK  # VirtualClock in the simulator
         self.pattern_speeds = {}
+        self.pattern_index = None
         self.session_queue = []
         self.session_length = 0  # seconds
         self.session_start_time = 0
@@ -24,14 +304,66 @@ class SessionManager:
         self.target_arousal_curve = []
         self.peaks_count = 3  # NEW: Number of peaks in session
         
-        # Load pattern speed data
-        self._load_pattern_speeds(pattern_speeds_file)
+        # Interpolated curve engine; target_arousal_curve is a 15 s preview of it for drawing
+        self.arousal_curve: Optional[ArousalCurve] = None
+        self.curve_resolution = DEFAULT_CURVE_RESOLUTION
+        self.curve_seed: Optional[int] = None  # Set for reproducible (and cached) curves
+        self.curve_preview = True  # Fill target_arousal_curve (headless sessions skip it)
+        
+        # Load pattern speed data (columnar index if available, JSON otherwise)
+        self.pattern_index = open_pattern_index(pattern_index_file)
+        if self.pattern_index is not None:
+            logger.info(f"Loaded pattern index for {len(self.pattern_index)} patterns "
+                        f"(schema v{self.pattern_index.schema_version})")
+        else:
+            self._load_pattern_speeds(pattern_speeds_file)
         
         # Organize patterns by speed class
         self.slow_patterns = []
         self.medium_patterns = []
         self.fast_patterns = []
         self._organize_patterns_by_speed()
+        
+        # Nearest-neighbour selection: 'nearest' queries the intensity index for a
+        # continuous target; 'bands' is the original three-band random pool
+        self.selection_mode = 'nearest'
+        self.nearest_k = 5
+        self.intensity_index = IntensityIndex(_join_pools((self.slow_patterns, self.medium_patterns, self.fast_patterns)))
+        
+        # Band mode: O(1) alias draws per (arousal band, start endpoint)
+        self.band_weights = band_weights or DEFAULT_BAND_WEIGHTS
+        self.band_samplers: Dict[Tuple[str, Optional[int]], AliasSampler] = {}
+        self.build_band_samplers()
+        
+        # Graph mode: position-continuous picks over the loaded library (see build_transition_graph)
+        self.transition_graph: Optional[TransitionGraph] = None
+        self._transition_graphs: Dict[int, TransitionGraph] = {}  # id(manager or mode view) -> graph
+        
+        # Session queue compiled at start_session; playback just reads the next entry
+        self.precompile_queue = True
+        self.planner = 'exact'  # 'exact' (DP, needs the transition graph) or 'greedy'
+        self._queue_cursor = 0
+        self._replan_needed = False
+        self._plan_table: Optional[_PlanTable] = None
+    
+    def fork(self, clock=None) -> 'SessionManager':
+        """New session sharing this manager's loaded speed data, indexes and graph (read-only).
+        
+        Only per-session state is fresh, so an extra session costs a few
+        kilobytes instead of another copy of the library data.
+        """
+        session = copy.copy(self)
+        session.clock = clock or self.clock
+        session.session_queue = []
+        session.session_length = 0
+        session.session_start_time = 0
+        session.current_arousal = 0.0
+        session.target_arousal_curve = []
+        session.arousal_curve = None
+        session._queue_cursor = 0
+        session._replan_needed = False
+        session._plan_table = None
+        return session
     
     def _load_pattern_speeds(self, file_path: str):
         """Load pattern speed analysis data"""
@@ -45,6 +377,18 @@ class SessionManager:
     
     def _organize_patterns_by_speed(self):
         """Organize patterns into speed categories"""
+        if self.pattern_index is not None:
+            # Speed class is a column: each list is a view of row numbers, and a
+            # pattern info dict is only materialized for the pattern picked
+            self.slow_patterns, self.medium_patterns, self.fast_patterns = (
+                self.pattern_index.rows_where('speed_class', speed_class)
+                for speed_class in range(len(SPEED_CLASS_ORDER))
+            )
+            
+            logger.info(f"Organized patterns: {len(self.slow_patterns)} slow, "
+                       f"{len(self.medium_patterns)} medium, {len(self.fast_patterns)} fast")
+            return
+        
         for pattern_name, data in self.pattern_speeds.items():
             speed_class = data.get('speed_class', 'medium')
             pattern_info = {
@@ -54,6 +398,12 @@ class SessionManager:
                 'speed_class': speed_class
             }
             
+            # Richer intensity metrics (velocity percentiles, stroke rate, ...) and the
+            # endpoints used by position-aware selection, when analyzed
+            for field in INTENSITY_METRICS + PATTERN_SHAPE_FIELDS:
+                if field in data:
+                    pattern_info[field] = data[field]
+            
             if speed_class == 'slow':
                 self.slow_patterns.append(pattern_info)
             elif speed_class == 'fast':
@@ -89,61 +439,16 @@ class SessionManager:
             return 300  # Default 5 minutes
     
     def create_multi_peak_arousal_curve(self, session_length: int, peaks: int) -> List[float]:
-        """Create multi-peak arousal progression curve"""
-        peaks = max(1, min(10, peaks))  # Clamp to 1-10 peaks
-        curve_points = max(20, session_length // 15)  # Point every 15 seconds, minimum 20 points
-        curve = []
-        
-        logger.info(f"Creating {peaks}-peak arousal curve with {curve_points} points")
-        
-        for i in range(curve_points):
-            progress = i / (curve_points - 1)  # 0 to 1
-            
-            # Base arousal level (gradual increase over session)
-            base_arousal = 20 + (progress * 30)  # 20-50 base level
-            
-            # Calculate wave component based on peaks
-            wave_frequency = peaks * math.pi * 2  # Full cycles over session
-            wave_amplitude = 35 + (progress * 20)  # Increasing amplitude over time
-            
-            # Create wave pattern
-            wave_component = math.sin(progress * wave_frequency) * wave_amplitude
-            
-            # Combine base and wave
-            arousal = base_arousal + (wave_component * 0.5)  # Reduce wave intensity
-            
-            # Add some controlled randomness
-            noise = random.uniform(-3, 3)
-            arousal += noise
-            
-            # Ensure peaks get progressively more intense
-            if peaks > 1:
-                peak_progress = (progress * peaks) % 1.0
-                if peak_progress > 0.7:  # Near peak
-                    peak_bonus = (progress * 20) + 10  # Later peaks are more intense
-                    arousal += peak_bonus * (peak_progress - 0.7) / 0.3
-            
-            # Clamp to valid range
-            arousal = max(10, min(95, arousal))
-            curve.append(arousal)
-        
-        # Ensure curve starts low and has proper peaks
-        curve[0] = random.uniform(15, 25)  # Always start low
-        
-        # Smooth the curve slightly
-        smoothed_curve = []
-        for i in range(len(curve)):
-            if i == 0 or i == len(curve) - 1:
-                smoothed_curve.append(curve[i])
-            else:
-                # Simple moving average
-                avg = (curve[i-1] + curve[i] + curve[i+1]) / 3
-                smoothed_curve.append(avg)
-        
-        return smoothed_curve
+        """Create multi-peak arousal progression curve (one point every 15 seconds)"""
+        curve = generate_arousal_curve(session_length, peaks, resolution=15.0)
+        logger.info(f"Creating {curve.peaks}-peak arousal curve with {len(curve)} points")
+        return list(curve.points)
     
     def get_target_arousal(self, elapsed_time: int) -> float:
         """Get target arousal for current time in session"""
+        if self.arousal_curve is not None and self.session_length > 0:
+            return self.arousal_curve.at(elapsed_time)
+        
         if not self.target_arousal_curve or self.session_length == 0:
             return 50.0
         
@@ -155,21 +460,80 @@ class SessionManager:
     
     def select_pattern_by_arousal(self, target_arousal: float, current_pos: int = 0) -> Optional[Dict]:
         """Select appropriate pattern based on target arousal level"""
-        # Map arousal to speed preference
-        if target_arousal < 30:
-            # Low arousal - prefer slow patterns
-            pattern_pool = self.slow_patterns + (self.medium_patterns[:len(self.medium_patterns)//3])
-        elif target_arousal < 70:
-            # Medium arousal - prefer medium patterns
-            pattern_pool = self.medium_patterns + (self.slow_patterns[:len(self.slow_patterns)//3]) + (self.fast_patterns[:len(self.fast_patterns)//3])
-        else:
-            # High arousal - prefer fast patterns
-            pattern_pool = self.fast_patterns + (self.medium_patterns[:len(self.medium_patterns)//2])
+        if self.selection_mode == 'nearest' and len(self.intensity_index):
+            target_intensity = self.intensity_index.target_intensity(target_arousal)
+            return self.intensity_index.nearest(target_intensity, current_pos, self.nearest_k)
+        
+        band = arousal_band(target_arousal)
+        
+        if self.selection_mode == 'graph' and self.transition_graph is not None:
+            graph = self.transition_graph
+            if graph.is_stale():
+                graph = self.build_transition_graph(graph.pattern_manager)
+            pattern = graph.next_pattern(current_pos or 0, BAND_SPEED_CLASS[band])
+            if pattern is not None:
+                return pattern
+        
+        # Precomputed sampler for (band, start endpoint), else the band over all endpoints
+        zone = endpoint_zone(current_pos) if current_pos is not None else None
+        sampler = self.band_samplers.get((band, zone)) or self.band_samplers.get((band, None))
+        if sampler is not None:
+            return sampler.draw()
         
-        if not pattern_pool:
-            pattern_pool = self.medium_patterns  # Fallback
+        return random.choice(self.medium_patterns) if self.medium_patterns else None  # Fallback
+    
+    def build_band_samplers(self):
+        """Precompute alias samplers per (arousal band, start endpoint) from band_weights"""
+        speed_lists = {'slow': self.slow_patterns, 'medium': self.medium_patterns, 'fast': self.fast_patterns}
+        samplers = {}
+        for band, class_weights in self.band_weights.items():
+            pools = []
+            weights = []
+            for speed_class, weight in class_weights.items():
+                if weight > 0:
+                    pools.append(speed_lists[speed_class])
+                    weights.extend([weight] * len(speed_lists[speed_class]))
+            items = _join_pools(pools)
+            
+            groups: Dict[Optional[int], List[int]] = {None: list(range(len(items)))}
+            for position, zone in enumerate(_start_zones(items)):
+                if zone is not None:
+                    groups.setdefault(zone, []).append(position)
+            
+            for zone, positions in groups.items():
+                if positions:
+                    samplers[(band, zone)] = AliasSampler(_take(items, positions),
+                                                          [weights[position] for position in positions])
+        
+        # Swap in one assignment so concurrent callers never see a half-built table
+        self.band_samplers = samplers
+    
+    def build_transition_graph(self, pattern_manager) -> TransitionGraph:
+        """Use the endpoint/speed class graph over a PatternManager (or mode view) for 'graph' mode.
+        
+        One graph is kept per manager/view and reused until its library generation
+        changes, so switching modes back and forth does not rebuild it.
+        """
+        graph = self._transition_graphs.get(id(pattern_manager))
+        if graph is not None and graph.pattern_manager is pattern_manager and not graph.is_stale():
+            self.transition_graph = graph
+            return graph
+        
+        if self.pattern_index is not None:
+            speed_info = self.pattern_index  # Looked up per library pattern by key or name
+        else:
+            speed_info = {}
+            for info in self.slow_patterns + self.medium_patterns + self.fast_patterns:
+                speed_info.setdefault(info['name'], info)
+                if 'key' in info:
+                    speed_info.setdefault(info['key'], info)
         
-        return random.choice(pattern_pool) if pattern_pool else None
+        graph = TransitionGraph(pattern_manager, speed_info)
+        self._transition_graphs[id(pattern_manager)] = graph
+        self.transition_graph = graph
+        logger.info(f"Built transition graph: {graph.edge_count} patterns, "
+                    f"{len(graph.samplers)} (endpoint, speed class) pickers")
+        return graph
     
     def calculate_speed_multiplier(self, current_arousal: float, target_arousal: float) -> float:
         """Calculate speed multiplier based on arousal levels"""
@@ -199,16 +563,25 @@ class SessionManager:
         """Start a new session with given time and peaks"""
         try:
             self.session_length = self.parse_session_time(session_time_str)
-            self.session_start_time = time.time()
+            self.session_start_time = self.clock.time()
             self.current_arousal = 0.0
             
             # Create multi-peak arousal progression curve
-            self.target_arousal_curve = self.create_multi_peak_arousal_curve(
-                self.session_length, self.peaks_count
+            self.arousal_curve = build_arousal_curve(
+                self.session_length, self.peaks_count, self.curve_seed, self.curve_resolution
             )
-            
             logger.info(f"Started session: {self.session_length}s ({session_time_str}) with {self.peaks_count} peaks")
-            logger.info(f"Arousal curve: {len(self.target_arousal_curve)} points, peaks at ~{[i for i, v in enumerate(self.target_arousal_curve) if v > 70]}")
+            if self.curve_preview:
+                self.target_arousal_curve = self.arousal_curve.resample(max(20, self.session_length // 15))
+                logger.info(f"Arousal curve: {len(self.target_arousal_curve)} points, peaks at ~{[i for i, v in enumerate(self.target_arousal_curve) if v > 70]}")
+            
+            # Compile the whole session up front
+            self.session_queue = self.plan_session() if self.precompile_queue else []
+            self._queue_cursor = 0
+            self._replan_needed = False
+            if self.session_queue:
+                logger.info(f"Session queue: {len(self.session_queue)} patterns, "
+                            f"ends at {self.session_queue[-1].end_time:.1f}s")
             
             return True
         except Exception as e:
@@ -220,7 +593,7 @@ class SessionManager:
         if self.session_start_time == 0:
             return 0, 0, 0.0
         
-        elapsed = int(time.time() - self.session_start_time)
+        elapsed = int(self.clock.time() - self.session_start_time)
         remaining = max(0, self.session_length - elapsed)
         progress = min(1.0, elapsed / self.session_length) if self.session_length > 0 else 0.0
         
@@ -237,15 +610,219 @@ class SessionManager:
             target_time = position * self.session_length
             
             # Override session start time to make current time = target time
-            self.session_start_time = time.time() - target_time
+            self.session_start_time = self.clock.time() - target_time
             
             # Update arousal to match position
-            if self.target_arousal_curve:
-                curve_index = int(position * (len(self.target_arousal_curve) - 1))
-                target_arousal = self.target_arousal_curve[curve_index]
+            if self.arousal_curve is not None or self.target_arousal_curve:
+                target_arousal = self.get_target_arousal(target_time)
                 self.update_arousal(target_arousal)
                 
                 logger.info(f"Manual override: position {position:.2f} -> time {target_time:.0f}s -> arousal {target_arousal:.1f}%")
+            
+            # Jumping backwards leaves the queue ahead of the session clock
+            self._replan_needed = bool(self.session_queue)
+    
+    def plan_session(self, start_time: float = 0.0, start_pos: int = 0) -> List[PlannedPattern]:
+        """Compile an ordered queue of patterns from start_time to the end of the session.
+        
+        Follows the arousal curve; each pick starts where the previous one ends.
+        The 'exact' planner also makes the queue end on session_length; the
+        greedy one picks with the current selection mode until time runs out.
+        """
+        if self.planner == 'exact':
+            queue = self._plan_session_exact(start_time, start_pos)
+            if queue is not None:
+                return queue
+        
+        queue: List[PlannedPattern] = []
+        elapsed = start_time
+        position = start_pos
+        current_arousal = self.get_target_arousal(elapsed)
+        
+        while elapsed < self.session_length:
+            target_arousal = self.get_target_arousal(elapsed)
+            pattern = self.select_pattern_by_arousal(target_arousal, position)
+            if pattern is None:
+                break
+            
+            # Playback keeps current arousal on the curve, so the previous target stands in for it
+            speed_multiplier = self.calculate_speed_multiplier(current_arousal, target_arousal)
+            duration = pattern.get('duration', DEFAULT_PATTERN_DURATION_MS) / 1000.0 * speed_multiplier + PATTERN_GAP
+            queue.append(PlannedPattern(pattern, speed_multiplier, elapsed, duration))
+            
+            elapsed += duration
+            current_arousal = target_arousal
+            position = pattern.get('end_pos', position)
+        
+        return queue
+    
+    def _plan_session_exact(self, start_time: float, start_pos: int) -> Optional[List[PlannedPattern]]:
+        """Exact-length plan from start_time, via a cost-to-go table over the rest of the session.
+        
+        The table (see _build_plan_table) is kept, so a later replan from any
+        time and endpoint is just a walk along it (_walk_plan). Returns None if
+        no transition graph is available or no sequence fits.
+        """
+        table = self._build_plan_table(start_time)
+        self._plan_table = table
+        if table is None:
+            return None
+        return self._walk_plan(table, start_time, start_pos)
+    
+    def _build_plan_table(self, start_time: float) -> Optional[_PlanTable]:
+        """Backward DP over (time step, endpoint) from start_time to the session end.
+        
+        Edges are the transition graph's (start, end, speed class) groups split
+        into whole-second duration buckets, stretched by the curve's speed
+        multiplier at departure. Cost is the speed class distance from the
+        arousal target, plus a landing penalty per step away from
+        session_length, so the cheapest continuation from every (step,
+        endpoint) lands as close to the end as possible and tracks the curve.
+        """
+        graph = self.transition_graph
+        if graph is None or not graph.edges:
+            return None
+        if graph.is_stale():
+            graph = self.build_transition_graph(graph.pattern_manager)
+        
+        horizon = int((self.session_length - start_time) / PLAN_STEP)
+        if horizon <= 0:
+            return None
+        tolerance = int(PLAN_TOLERANCE / PLAN_STEP)
+        last_step = horizon + tolerance
+        
+        # Options per start endpoint: (end endpoint index, speed class index, base steps, patterns)
+        options: List[List[Tuple[int, int, float, List[Dict]]]] = [[] for _ in ENDPOINTS]
+        for (start, end, speed_class), infos in graph.edges.items():
+            buckets: Dict[int, List[Dict]] = {}
+            for info in infos:
+                seconds = info.get('duration', DEFAULT_PATTERN_DURATION_MS) / 1000.0
+                buckets.setdefault(round(seconds), []).append(info)
+            for seconds, group in buckets.items():
+                options[ENDPOINTS.index(start)].append(
+                    (ENDPOINTS.index(end), SPEED_CLASS_ORDER.index(speed_class), seconds / PLAN_STEP, group)
+                )
+        
+        # Curve target class and speed multiplier for every step
+        target_class = []
+        multipliers = []
+        for step in range(last_step):
+            arousal = self.get_target_arousal(start_time + step * PLAN_STEP)
+            target_class.append(SPEED_CLASS_ORDER.index(BAND_SPEED_CLASS[arousal_band(arousal)]))
+            # Playback keeps current arousal on the curve, so current == target here
+            multipliers.append(self.calculate_speed_multiplier(arousal, arousal))
+        gap_steps = PATTERN_GAP / PLAN_STEP
+        
+        # cost[t][e] = cheapest continuation from endpoint e at step t; stopping is
+        # only allowed inside the tolerance window, at the landing penalty
+        cost = [[math.inf] * len(ENDPOINTS) for _ in range(last_step + 1)]
+        choice: List[List[Optional[Tuple[int, int]]]] = [[None] * len(ENDPOINTS) for _ in range(last_step + 1)]
+        for step in range(max(1, horizon - tolerance), last_step + 1):
+            cost[step] = [abs(step - horizon) * PLAN_LANDING_PENALTY] * len(ENDPOINTS)
+        jitter = random.random
+        
+        for step in range(last_step - 1, -1, -1):
+            row = cost[step]
+            choices = choice[step]
+            target = target_class[step]
+            multiplier = multipliers[step]
+            for endpoint_index in range(len(ENDPOINTS)):
+                for option_index, (end_index, class_index, steps, _) in enumerate(options[endpoint_index]):
+                    arrival = step + max(1, int(steps * multiplier + gap_steps + 0.5))
+                    if arrival > last_step:
+                        continue
+                    rest = cost[arrival][end_index]
+                    if rest == math.inf:
+                        continue
+                    candidate = rest + abs(class_index - target) + jitter() * PLAN_JITTER
+                    if candidate < row[endpoint_index]:
+                        row[endpoint_index] = candidate
+                        choices[endpoint_index] = (option_index, arrival)
+        
+        return _PlanTable(graph, start_time, options, multipliers, cost, choice)
+    
+    def _walk_plan(self, table: _PlanTable, start_time: float, start_pos: int) -> Optional[List[PlannedPattern]]:
+        """Follow the table's cheapest continuation from start_time and start_pos; None if there is none"""
+        step = int(round((start_time - table.start_time) / PLAN_STEP))
+        endpoint_index = ENDPOINTS.index(nearest_endpoint(start_pos))
+        if not 0 <= step < len(table.cost) or table.cost[step][endpoint_index] == math.inf:
+            logger.warning(f"No pattern sequence fills the session from {start_time:.0f}s - using greedy plan")
+            return None
+        
+        # Draw a concrete pattern for every edge on the path
+        picks = []
+        while table.choice[step][endpoint_index] is not None:
+            option_index, arrival = table.choice[step][endpoint_index]
+            end_index, _, _, group = table.options[endpoint_index][option_index]
+            picks.append((random.choice(group), table.multipliers[step]))
+            step, endpoint_index = arrival, end_index
+        
+        # One uniform correction turns the step-rounded plan into an exact fit
+        remaining = self.session_length - start_time
+        scaled = sum(info.get('duration', DEFAULT_PATTERN_DURATION_MS) / 1000.0 * multiplier for info, multiplier in picks)
+        exact = (remaining - PATTERN_GAP * len(picks)) / scaled if scaled > 0 else 1.0
+        correction = max(1.0 - PLAN_MAX_STRETCH, min(1.0 + PLAN_MAX_STRETCH, exact))
+        if correction != exact:
+            logger.info(f"Plan correction clamped to {correction:.3f}x (needed {exact:.3f}x): "
+                        f"session ends {scaled * (correction - exact):+.1f}s off")
+        
+        queue: List[PlannedPattern] = []
+        elapsed = start_time
+        for info, multiplier in picks:
+            multiplier *= correction
+            duration = info.get('duration', DEFAULT_PATTERN_DURATION_MS) / 1000.0 * multiplier + PATTERN_GAP
+            queue.append(PlannedPattern(info, multiplier, elapsed, duration))
+            elapsed += duration
+        return queue
+    
+    def _replan(self, elapsed: float, current_pos: int) -> List[PlannedPattern]:
+        """Queue from elapsed at current_pos: a walk of the session's plan table, else a fresh plan"""
+        table = self._plan_table
+        if table is not None and not table.graph.is_stale():
+            queue = self._walk_plan(table, elapsed, current_pos)
+            if queue is not None:
+                return queue
+        return self.plan_session(elapsed, current_pos)
+    
+    def next_planned_pattern(self, current_pos: int = 0) -> Tuple[Optional[Dict], float]:
+        """Next queued pattern and speed multiplier; re-routes from now if playback left the plan"""
+        elapsed = self.clock.time() - self.session_start_time
+        queue = self.session_queue
+        
+        # Skip entries the session clock has already passed (late start, manual jumps)
+        cursor = self._queue_cursor
+        while cursor < len(queue) and queue[cursor].end_time <= elapsed:
+            cursor += 1
+        
+        # A fully played plan ends the session rather than being extended
+        if cursor >= len(queue) and not self._replan_needed:
+            self._queue_cursor = cursor
+            return None, 1.0
+        
+        if (self._replan_needed or cursor >= len(queue)
+                or ('start_pos' in queue[cursor].pattern
+                    and nearest_endpoint(queue[cursor].pattern['start_pos']) != nearest_endpoint(current_pos))):
+            # Continuations from every (time, endpoint) were precomputed with the plan,
+            # so this is a walk, not a new DP at the pattern boundary
+            queue = self._replan(elapsed, current_pos)
+            self.session_queue = queue
+            self._replan_needed = False
+            cursor = 0
+            logger.debug(f"Replanned session queue at {elapsed:.1f}s: {len(queue)} patterns")
+        
+        if cursor >= len(queue):
+            self._queue_cursor = cursor
+            return None, 1.0
+        
+        self._queue_cursor = cursor + 1
+        entry = queue[cursor]
+        return entry.pattern, entry.speed_multiplier
+    
+    def export_session_plan(self, file_path: str):
+        """Write the compiled session queue as JSON"""
+        with open(file_path, 'w') as f:
+            json.dump([entry.to_dict() for entry in self.session_queue], f, indent=2)
+        logger.info(f"Exported session plan ({len(self.session_queue)} patterns) to {file_path}")
     
     def get_next_pattern_recommendation(self, current_pos: int = 0) -> Tuple[Optional[Dict], float]:
         """Get next pattern recommendation and speed multiplier"""
@@ -254,8 +831,12 @@ class SessionManager:
         if remaining <= 0 and self.session_length > 0:
             return None, 1.0  # Session ended
         
-        # Get target arousal for current time
-        target_arousal = self.get_target_arousal(elapsed)
+        # Compiled session: just read the queue
+        if self.precompile_queue and self.session_queue:
+            return self.next_planned_pattern(current_pos)
+        
+        # Get target arousal for current time (sub-second, interpolated)
+        target_arousal = self.get_target_arousal(self.clock.time() - self.session_start_time)
         
         # Select appropriate pattern
         pattern = self.select_pattern_by_arousal(target_arousal, current_pos)
@@ -270,7 +851,7 @@ class SessionManager:
         if self.session_start_time == 0:
             return False
         
-        elapsed = time.time() - self.session_start_time
+        elapsed = self.clock.time() - self.session_start_time
         return elapsed < self.session_length
     
     def stop_session(self):
@@ -279,12 +860,17 @@ class SessionManager:
         self.session_length = 0
         self.current_arousal = 0.0
         self.target_arousal_curve = []
+        self.arousal_curve = None
+        self.session_queue = []
+        self._queue_cursor = 0
+        self._plan_table = None
         logger.info("Session stopped")
 
 # Test function
 def test_multi_peak_session():
     """Test the multi-peak session manager"""
-    sm = SessionManager()
+    clock = VirtualClock()
+    sm = SessionManager(clock=clock)
     
     print("Testing multi-peak session manager...")
     
@@ -300,13 +886,13 @@ def test_multi_peak_session():
         print(f"Peak positions: {[i for i, v in enumerate(curve) if v > 70]}")
         print(f"Arousal range: {min(curve):.1f} - {max(curve):.1f}")
         
-        # Simulate a few time points
+        # Step through the session on the virtual clock
         for i in range(0, 120, 30):  # Every 30 seconds
-            sm.session_start_time = time.time() - i
             target = sm.get_target_arousal(i)
             pattern, speed = sm.get_next_pattern_recommendation()
             
             print(f"  {i}s: Target {target:.1f}%, Speed {speed:.2f}x, Pattern: {pattern['speed_class'] if pattern else 'None'}")
+            clock.advance(30)
 
 if __name__ == "__main__":
     test_multi_peak_session()
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""
+Session simulator
+Runs the real PlaybackEngine and SessionManager against a fake device on a
+VirtualClock, so hours of session behaviour play out in seconds. Use it to
+benchmark planners and selection modes, or to regression-test session timing.
+"""
+
+import argparse
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from clock import VirtualClock
+from device_handler import PatternManager, PlaybackEngine
+from session_manager import SessionManager
+
+logger = logging.getLogger(__name__)
+
+END_TOLERANCE = 0.001  # seconds - float rounding of summed pattern durations
+
+class FakeDeviceClient:
+    """Stands in for IntifaceClient: always connected, records every command"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.connected = True
+        self.device_connected = True
+        self.commands: List[Tuple[float, float, int]] = []  # (time, position, duration ms)
+
+    def send_position_command(self, position: float, duration: int, droppable: bool = True):
+        position = round(max(0.0, min(1.0, position)), 2)
+        self.commands.append((self.clock.time(), position, duration))
+
+    def send_stop_command(self):
+        self.send_position_command(0.0, 1000)
+
+class SimulationResult:
+    """Summary of one simulated session"""
+
+    def __init__(self, session_length: int, simulated_seconds: float, wall_seconds: float,
+                 patterns: List[Tuple[float, str, float]], commands: List[Tuple[float, float, int]]):
+        self.session_length = session_length
+        self.simulated_seconds = simulated_seconds
+        self.wall_seconds = wall_seconds
+        self.patterns = patterns    # (start offset s, pattern name, speed multiplier)
+        self.commands = commands    # (offset s, position, duration ms)
+
+    @property
+    def speedup(self) -> float:
+        return self.simulated_seconds / self.wall_seconds if self.wall_seconds > 0 else float('inf')
+
+    @property
+    def end_error(self) -> float:
+        """Seconds playback ran past (+) or stopped short of (-) the session length"""
+        return self.simulated_seconds - self.session_length
+
+    def summary(self) -> str:
+        return (f"{self.session_length}s session: {len(self.patterns)} patterns, {len(self.commands)} commands, "
+                f"ended {self.end_error:+.2f}s from target, simulated in {self.wall_seconds:.2f}s "
+                f"({self.speedup:.0f}x real time)")
+
+def simulate_session(pattern_manager: PatternManager, session_manager: SessionManager,
+                     session_time: str = "30:00", peaks: int = 3) -> Optional[SimulationResult]:
+    """Play one whole session on the session manager's clock, which must be a VirtualClock"""
+    clock = session_manager.clock
+    if not isinstance(clock, VirtualClock):
+        raise ValueError("simulate_session needs a SessionManager running on a VirtualClock")
+
+    device = FakeDeviceClient(clock)
+    engine = PlaybackEngine(pattern_manager, device, clock=clock)
+    engine.session_manager = session_manager
+
+    session_manager.peaks_count = peaks
+    if not session_manager.start_session(session_time):
+        return None
+    session_start = session_manager.session_start_time
+    wall_start = time.perf_counter()
+
+    patterns = []
+    if engine.start_playback(background=False):
+        end_time = session_start + session_manager.session_length - END_TOLERANCE
+        while engine.is_playing and engine.current_pattern and clock.time() < end_time:
+            patterns.append((clock.time() - session_start, engine.current_pattern.name,
+                             engine.dynamic_speed_multiplier))
+            if not engine.play_next():
+                break
+        engine.is_playing = False
+
+    wall_seconds = time.perf_counter() - wall_start
+    simulated_seconds = clock.time() - session_start
+    commands = [(at - session_start, position, duration) for at, position, duration in device.commands]
+    session_length = session_manager.session_length
+    session_manager.stop_session()
+    return SimulationResult(session_length, simulated_seconds, wall_seconds, patterns, commands)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate a whole session on a virtual clock")
+    parser.add_argument('library', help="Pattern library folder (bj/, transitions/, twerk/)")
+    parser.add_argument('--session', default="30:00", help="Session length (MM:SS)")
+    parser.add_argument('--peaks', type=int, default=3, help="Arousal peaks (1-10)")
+    parser.add_argument('--runs', type=int, default=1, help="Sessions to simulate")
+    parser.add_argument('--seed', type=int, default=None, help="Arousal curve seed")
+    parser.add_argument('--planner', choices=('exact', 'greedy'), default='exact', help="Session planner")
+    parser.add_argument('--selection', choices=('graph', 'nearest', 'bands'), default='graph',
+                        help="Pattern selection mode")
+    parser.add_argument('--speeds', default="pattern_speeds.json", help="Pattern speed analysis JSON")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    manager = PatternManager(args.library)
+    session = SessionManager(args.speeds, clock=VirtualClock())
+    session.build_transition_graph(manager)
+    session.selection_mode = args.selection
+    session.planner = args.planner
+    session.curve_seed = args.seed
+
+    for run in range(args.runs):
+        result = simulate_session(manager, session, args.session, args.peaks)
+        if result is None:
+            print(f"Run {run + 1}: failed to start session")
+            continue
+        print(f"Run {run + 1}: {result.summary()}")
@@ -0,0 +1,149 @@
+"""
+Pattern library slicer
+Cuts full-length funscripts into ~10 second slices and sorts them by start/end
+position into the library folders: bj/ (0->0, 100->100), twerk/ (50->50) and
+transitions/. Slices are classified with PatternManager's own classifier, so
+every slice lands where the library loader will categorize it.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from funscript_io import iter_funscript_actions
+from pattern_categories import CATEGORY_ENDPOINTS, classify_pattern_endpoints
+
+try:
+    import numpy as np
+except ImportError:  # Optional - falls back to bisect
+    np = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLICE_MS = 10000
+MIN_SLICE_ACTIONS = 4
+
+def slice_boundaries(at, slice_ms: int = DEFAULT_SLICE_MS) -> List[int]:
+    """Index of the last action at or before every slice_ms step from the first action.
+
+    Consecutive boundaries delimit one slice; neighbouring slices share their
+    boundary action so sliced patterns chain without jumps. The trailing
+    partial slice is dropped.
+    """
+    if len(at) < 2:
+        return []
+    first = at[0]
+    steps = int((at[-1] - first) // slice_ms)
+
+    if np is not None:
+        # One vectorized binary search for all boundaries
+        stamps = np.frombuffer(at, dtype=np.int32)
+        targets = first + slice_ms * np.arange(steps + 1, dtype=np.int64)
+        return (np.searchsorted(stamps, targets, side='right') - 1).tolist()
+
+    return [bisect_right(at, first + slice_ms * step) - 1 for step in range(steps + 1)]
+
+def slice_destination(start_pos: int, end_pos: int) -> Tuple[str, str]:
+    """Library folder and PatternManager category for a slice.
+
+    A slice that classifies as a transition goes to transitions/; anything else
+    is a main pattern, in twerk/ for 50->50 and bj/ otherwise. Every slice gets
+    a destination: main patterns that fit no endpoint bucket fall back to the
+    classifier's average-position guess, exactly as the library loader does.
+    """
+    category, _ = classify_pattern_endpoints(start_pos, end_pos, is_transition=True)
+    if category is not None:
+        return 'transitions', category
+
+    category, _ = classify_pattern_endpoints(start_pos, end_pos, is_transition=False)
+    return ('twerk' if category == 'main_patterns_50_to_50' else 'bj'), category
+
+def _write_slice(library_folder: str, folder: str, category: str, actions: List[Dict]) -> str:
+    """Write one slice named <start>-<end>_<content hash>.funscript (identical slices dedupe).
+
+    The name carries the full SHA-256 of the content, so an existing file of the
+    same name is the same slice and is not written again.
+    """
+    content = json.dumps({'version': '1.0', 'inverted': False, 'range': 100, 'actions': actions},
+                         separators=(',', ':')).encode('utf-8')
+    start_endpoint, end_endpoint = CATEGORY_ENDPOINTS[category]
+    name = f"{start_endpoint}-{end_endpoint}_{hashlib.sha256(content).hexdigest()}.funscript"
+
+    folder_path = os.path.join(library_folder, folder)
+    file_path = os.path.join(folder_path, name)
+    if not os.path.exists(file_path):
+        os.makedirs(folder_path, exist_ok=True)
+        tmp_path = file_path + f".{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, file_path)
+    return name
+
+def slice_funscript(file_path: str, library_folder: str, slice_ms: int = DEFAULT_SLICE_MS) -> Dict[str, int]:
+    """Slice one full-length funscript into the library; returns counts per category"""
+    at = array('i')
+    pos = array('B')
+    for action_at, action_pos in iter_funscript_actions(file_path):
+        at.append(action_at)
+        pos.append(action_pos)
+
+    counts: Dict[str, int] = {}
+    boundaries = slice_boundaries(at, slice_ms)
+    for first, last in zip(boundaries, boundaries[1:]):
+        if last - first + 1 < MIN_SLICE_ACTIONS:
+            continue
+
+        folder, category = slice_destination(pos[first], pos[last])
+        base = at[first]
+        actions = [{'at': at[i] - base, 'pos': pos[i]} for i in range(first, last + 1)]
+        _write_slice(library_folder, folder, category, actions)
+        counts[category] = counts.get(category, 0) + 1
+
+    return counts
+
+def _slice_worker(job: Tuple[str, str, int]) -> Tuple[str, Dict[str, int]]:
+    """Process pool entry point"""
+    file_path, library_folder, slice_ms = job
+    try:
+        return file_path, slice_funscript(file_path, library_folder, slice_ms)
+    except Exception as e:
+        logger.error(f"Failed to slice {file_path}: {e}")
+        return file_path, {}
+
+def slice_library(source_folder: str, library_folder: str, slice_ms: int = DEFAULT_SLICE_MS,
+                  workers: Optional[int] = None) -> Dict[str, int]:
+    """Slice every funscript in source_folder into library_folder on all cores"""
+    files = sorted(
+        os.path.join(source_folder, name)
+        for name in os.listdir(source_folder)
+        if name.lower().endswith('.funscript')
+    )
+    jobs = [(file_path, library_folder, slice_ms) for file_path in files]
+
+    totals: Dict[str, int] = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for file_path, counts in executor.map(_slice_worker, jobs):
+            logger.info(f"Sliced {os.path.basename(file_path)}: {sum(counts.values())} slices")
+            for category, count in counts.items():
+                totals[category] = totals.get(category, 0) + count
+
+    logger.info(f"Sliced {len(files)} scripts into {library_folder}:")
+    for category in CATEGORY_ENDPOINTS:
+        logger.info(f"  {category}: {totals.get(category, 0)} slices")
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Slice full-length funscripts into the pattern library")
+    parser.add_argument('source', help="Folder of full-length .funscript files")
+    parser.add_argument('library', help="Pattern library folder (bj/, transitions/, twerk/ are created inside)")
+    parser.add_argument('--slice-seconds', type=float, default=DEFAULT_SLICE_MS / 1000, help="Slice length")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    slice_library(args.source, args.library, int(args.slice_seconds * 1000), args.workers)
@@ -0,0 +1,134 @@
+"""
+Shared fixtures: a small synthetic pattern library covering every category,
+and its speed analysis (JSON and columnar index).
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bridge_stream import FRAME, FRAME_ACK, STATUS_OK
+
+# Half-stroke times giving one pattern per speed class (80 positions per half stroke:
+# 0.08, 0.2 and 0.4 positions/ms against the analyzer's 0.1/0.3 thresholds)
+HALF_STROKE_MS = {'slow': 1000, 'medium': 400, 'fast': 200}
+
+# folder -> (start, end) endpoints of the patterns written there
+LIBRARY_LAYOUT = {
+    'bj': ((0, 0), (100, 100)),
+    'transitions': ((0, 100), (100, 0), (0, 50), (50, 0), (50, 100), (100, 50)),
+    'twerk': ((50, 50),),
+}
+
+def write_funscript(path, actions):
+    """Write [(at, pos), ...] as a funscript"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'version': '1.0', 'inverted': False, 'range': 100,
+                   'actions': [{'at': at, 'pos': pos} for at, pos in actions]}, f)
+
+def stroke_actions(start, end, half_stroke_ms, strokes=6):
+    """Strokes from start to a turning point and back, then a final move to end.
+
+    Half-stroke time scales with the stroke length, so every pattern written
+    with the same half_stroke_ms has about the same mean velocity.
+    """
+    turn = {0: 80, 100: 20, 50: 10}[start]
+    step_ms = half_stroke_ms * abs(turn - start) // 80
+    positions = [start] + [turn if i % 2 == 0 else start for i in range(strokes * 2 - 1)] + [end]
+    return [(i * step_ms, pos) for i, pos in enumerate(positions)]
+
+class FakeBridge:
+    """Stream port stand-in: records frames and acks them, in order, only when told to"""
+
+    def __init__(self):
+        self.frames = []
+        self.acked = 0
+        self._condition = threading.Condition()
+        self._client = None
+        self._server = socket.socket()
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(1)
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        try:
+            client, _ = self._server.accept()
+        except OSError:
+            return
+        with self._condition:
+            self._client = client
+        buffer = b''
+        while True:
+            try:
+                data = client.recv(4096)
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data
+            with self._condition:
+                while len(buffer) >= FRAME.size:
+                    self.frames.append(FRAME.unpack(buffer[:FRAME.size]))
+                    buffer = buffer[FRAME.size:]
+                self._condition.notify_all()
+
+    def wait_frames(self, count, timeout=2.0):
+        """Block until count frames arrived"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while len(self.frames) < count:
+                remaining = deadline - time.monotonic()
+                assert remaining > 0, f"expected {count} frames, got {len(self.frames)}"
+                self._condition.wait(remaining)
+        return self.frames[:count]
+
+    def ack_all(self):
+        """Ack every frame received so far"""
+        with self._condition:
+            pending = self.frames[self.acked:]
+            self.acked = len(self.frames)
+            client = self._client
+        for frame in pending:
+            client.sendall(FRAME.pack(FRAME_ACK, frame[1], frame[2], STATUS_OK))
+
+    def close(self):
+        self._server.close()
+        if self._client is not None:
+            self._client.close()
+
+@pytest.fixture
+def fake_bridge():
+    bridge = FakeBridge()
+    yield bridge
+    bridge.close()
+
+@pytest.fixture
+def library(tmp_path):
+    """Library folder with one slow, medium and fast pattern per endpoint pair"""
+    root = tmp_path / 'library'
+    for folder, endpoints in LIBRARY_LAYOUT.items():
+        for start, end in endpoints:
+            for speed_class, half_stroke_ms in HALF_STROKE_MS.items():
+                name = f"{start}-{end}_{speed_class}.funscript"
+                write_funscript(str(root / folder / name), stroke_actions(start, end, half_stroke_ms))
+    return str(root)
+
+@pytest.fixture
+def speed_files(library, tmp_path):
+    """(JSON, index) speed analysis of the library, written by the real analyzer"""
+    from pattern_analyzer import classify_all_patterns
+
+    json_path = str(tmp_path / 'pattern_speeds.json')
+    index_path = str(tmp_path / 'pattern_speeds.idx')
+    classify_all_patterns([library], output_file=json_path, cache_file=str(tmp_path / 'cache.json'),
+                          index_file=index_path)
+    return json_path, index_path
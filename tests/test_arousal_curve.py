@@ -0,0 +1,46 @@
+import pytest
+
+import arousal_curve
+from arousal_curve import ArousalCurve, build_arousal_curve, generate_arousal_curve
+
+@pytest.mark.skipif(arousal_curve.np is None, reason="NumPy not installed")
+@pytest.mark.parametrize('session_length, peaks, resolution', [
+    (600, 3, 1.0), (3600, 10, 1.0), (90, 1, 0.5), (10, 2, 1.0), (1200, 4, 15.0),
+])
+def test_numpy_and_python_curves_match(monkeypatch, session_length, peaks, resolution):
+    vectorized = generate_arousal_curve(session_length, peaks, seed=7, resolution=resolution)
+    monkeypatch.setattr(arousal_curve, 'np', None)
+    fallback = generate_arousal_curve(session_length, peaks, seed=7, resolution=resolution)
+    assert len(vectorized) == len(fallback)
+    assert list(fallback.points) == pytest.approx(list(vectorized.points), abs=1e-9)
+
+def test_curve_shape(monkeypatch):
+    monkeypatch.setattr(arousal_curve, 'np', None)
+    curve = generate_arousal_curve(1800, 3, seed=1)
+    assert len(curve) == 1801
+    assert 15 <= curve.points[0] <= 25
+    assert all(10 <= point <= 95 for point in curve.points)
+    assert len(generate_arousal_curve(5, 3, seed=1)) == arousal_curve.MIN_CURVE_POINTS
+
+def test_lookup_interpolates_and_clamps():
+    curve = ArousalCurve(10.0, 1, [0.0, 10.0, 30.0])
+    assert curve.at(-1) == 0.0 and curve.at(0) == 0.0
+    assert curve.at(2.5) == pytest.approx(5.0)
+    assert curve.at(7.5) == pytest.approx(20.0)
+    assert curve.at(10) == 30.0 and curve.at(99) == 30.0
+    assert curve.at_progress(0.5) == pytest.approx(10.0)
+    assert curve.resample(5) == pytest.approx([0.0, 5.0, 10.0, 20.0, 30.0])
+
+def test_seeded_curves_are_cached():
+    arousal_curve._cached_arousal_curve.cache_clear()
+    curve = build_arousal_curve(600, 3, seed=42)
+    assert build_arousal_curve(600, 3, seed=42) is curve
+    assert arousal_curve._cached_arousal_curve.cache_info().hits == 1
+
+    # Any differing key builds a new curve; unseeded curves are never cached
+    assert build_arousal_curve(600, 3, seed=43) is not curve
+    assert build_arousal_curve(600, 4, seed=42) is not curve
+    assert build_arousal_curve(600, 3, seed=42, resolution=2.0) is not curve
+    assert build_arousal_curve(600, 3) is not build_arousal_curve(600, 3)
+    assert arousal_curve._cached_arousal_curve.cache_info().currsize == 4
+    assert list(build_arousal_curve(600, 3, seed=42).points) == list(generate_arousal_curve(600, 3, seed=42).points)
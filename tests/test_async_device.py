@@ -0,0 +1,197 @@
+import asyncio
+import threading
+
+import pytest
+
+from async_device import AsyncIntifaceClient, AsyncPlaybackEngine
+from bridge_stream import FRAME_MOVE, FRAME_STOP
+from device_handler import FunscriptPattern, PatternManager
+
+class RecordingClient:
+    """Connected device client that records every move"""
+
+    def __init__(self):
+        self.connected = True
+        self.device_connected = True
+        self.commands = []
+
+    def send_position_command(self, position, duration, droppable=True):
+        self.commands.append((position, duration))
+
+    def send_stop_command(self):
+        self.commands.append((0.0, 0))
+
+async def _until(condition, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline
+        await asyncio.sleep(0.005)
+
+def test_stream_moves_are_bounded_by_unacknowledged_frames(fake_bridge):
+    async def scenario():
+        client = AsyncIntifaceClient('http://127.0.0.1:8080', stream_port=fake_bridge.port, max_in_flight=2)
+        client.connected = True
+        await client._open_stream()
+        try:
+            for i in range(10):
+                client.send_position_command(i / 10, 100)
+            assert client.sent == 2 and client.in_flight == 2
+            assert client.dropped == 7
+
+            await asyncio.to_thread(fake_bridge.wait_frames, 2)
+            fake_bridge.ack_all()
+            await _until(lambda: client.acked == 2)
+            frames = await asyncio.to_thread(fake_bridge.wait_frames, 3)
+            assert frames[2][0] == FRAME_MOVE and frames[2][2] == pytest.approx(0.9)
+
+            # A stop goes out with the window full, outside of it
+            client.send_position_command(0.3, 100)
+            client.send_stop_command()
+            assert client.in_flight == 2 and len(client._pending_acks) == 3
+            frames = await asyncio.to_thread(fake_bridge.wait_frames, 5)
+            assert [frame[0] for frame in frames[3:]] == [FRAME_MOVE, FRAME_STOP]
+        finally:
+            client._cancel_tasks()
+            client._close_stream()
+        assert client.in_flight == 0
+
+    asyncio.run(scenario())
+
+def test_engine_prepares_patterns_off_the_loop(library, monkeypatch):
+    loader_threads = set()
+    buffers = FunscriptPattern.buffers
+
+    def recording_buffers(pattern):
+        loader_threads.add(threading.current_thread())
+        return buffers(pattern)
+
+    monkeypatch.setattr(FunscriptPattern, 'buffers', recording_buffers)
+
+    async def scenario():
+        device = RecordingClient()
+        engine = AsyncPlaybackEngine(PatternManager(library), device)
+        assert engine.start_playback()
+        assert not engine.start_playback()  # Already starting
+        await _until(lambda: len(device.commands) > 3, timeout=10.0)
+        engine.stop_playback()
+        assert not engine.is_playing
+
+        # Stopped while preparing: nothing is scheduled afterwards
+        assert engine.start_playback()
+        engine.stop_playback()
+        await asyncio.sleep(0.2)
+        sent = len(device.commands)
+        await asyncio.sleep(0.2)
+        assert len(device.commands) == sent
+        assert not engine.is_playing and engine._timer is None
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(scenario())
+    assert loader_threads and loop_thread not in loader_threads
+
+class SlowHttp:
+    """aiohttp.ClientSession stand-in whose POSTs take delay seconds"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.posted = []
+
+    def post(self, url, json=None):
+        http = self
+
+        class Response:
+            status = 200
+
+            async def __aenter__(self):
+                await asyncio.sleep(http.delay)
+                http.posted.append((url.rsplit('/', 1)[-1], json))
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return Response()
+
+def test_disconnect_sends_the_queued_home_move_first():
+    async def scenario():
+        http = SlowHttp(0.05)
+        client = AsyncIntifaceClient('http://127.0.0.1:8080', use_stream=False, http=http)
+        client.connected = True
+        client.send_position_command(0.5, 100)
+        await asyncio.sleep(0.01)  # First request in flight
+        client.send_position_command(0.0, 1000, droppable=False)  # Queued behind it
+        await client.disconnect()
+        return http.posted
+
+    posted = asyncio.run(scenario())
+    assert [command for command, _ in posted] == ['command', 'command', 'disconnect']
+    assert posted[1][1] == {'command': 'move', 'position': 0.0, 'duration': 1000}
+
+def test_engine_rejects_batch_upload(library):
+    engine = AsyncPlaybackEngine(PatternManager(library), RecordingClient())
+    assert not engine.batch_upload
+    engine.batch_upload = False
+    with pytest.raises(ValueError):
+        engine.batch_upload = True
+
+class ThreadCheckedEngine(AsyncPlaybackEngine):
+    """Records the threads that assign playback state"""
+    STATE = {'is_playing', 'current_pattern', 'next_pattern', 'dynamic_speed_multiplier',
+             'next_speed_multiplier', 'current_position'}
+
+    def __setattr__(self, name, value):
+        if name in self.STATE:
+            self.__dict__.setdefault('state_threads', set()).add(threading.current_thread())
+        super().__setattr__(name, value)
+
+def test_engine_state_is_only_assigned_on_the_loop(library):
+    async def scenario():
+        engine = ThreadCheckedEngine(PatternManager(library), RecordingClient())
+        engine.dynamic_speed_multiplier = 0.05  # Patterns of well under a second
+        assert engine.start_playback()
+        await _until(lambda: engine._prefetch is not None and engine._prefetch.done(), timeout=5.0)
+        engine.stop_playback()
+        return engine.state_threads
+
+    assert asyncio.run(scenario()) == {threading.main_thread()}
+
+def test_late_pick_is_rebased_to_now(library):
+    async def scenario():
+        manager = PatternManager(library)
+        engine = AsyncPlaybackEngine(manager, RecordingClient())
+        engine.loop = asyncio.get_running_loop()
+        engine.is_playing = True
+        engine._run = object()
+        engine.current_pattern = manager.main_patterns_0_to_0[0]
+        engine.next_pattern = manager.main_patterns_0_to_0[1]
+        engine._next_buffers = engine.next_pattern.buffers()
+
+        # The previous pattern's last action was due long ago (its pick came in late)
+        now = engine.loop.time()
+        engine._chain(now - 5.0)
+        assert engine.current_pattern is manager.main_patterns_0_to_0[1]
+        assert engine._pattern_start >= now
+        assert engine._due(1) > engine.loop.time()
+        engine.stop_playback()
+
+    asyncio.run(scenario())
+
+def test_stream_sends_and_acks_are_timed(fake_bridge):
+    async def scenario():
+        client = AsyncIntifaceClient('http://127.0.0.1:8080', stream_port=fake_bridge.port)
+        client.connected = True
+        await client._open_stream()
+        try:
+            client.send_position_command(0.2, 100)
+            client.send_position_command(0.4, 100)
+            assert client.send_latency.count == 2
+            await asyncio.to_thread(fake_bridge.wait_frames, 2)
+            fake_bridge.ack_all()
+            await _until(lambda: client.ack_latency.count == 2)
+            assert set(client.latency_histograms()) == {'send', 'ack'}
+        finally:
+            client._cancel_tasks()
+            client._close_stream()
+
+    asyncio.run(scenario())
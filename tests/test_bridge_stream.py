@@ -0,0 +1,139 @@
+import socket
+import struct
+import time
+
+import pytest
+
+from bridge_stream import FRAME, FRAME_ACK, FRAME_MOVE, FRAME_PING, FRAME_STOP, STATUS_NO_DEVICE, BridgeStream
+from device_handler import IntifaceClient
+
+def _wait(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+def test_frame_layout():
+    assert FRAME.size == 13
+    frame = FRAME.pack(FRAME_MOVE, 0x01020304, 0.25, 750)
+    assert frame[:5] == b'\x01\x04\x03\x02\x01'  # type, then sequence little-endian
+    assert struct.unpack('<f', frame[5:9])[0] == 0.25
+    assert frame[9:] == (750).to_bytes(4, 'little')
+
+    frame_type, sequence, position, status = FRAME.unpack(FRAME.pack(FRAME_ACK, 7, 0.37, STATUS_NO_DEVICE))
+    assert (frame_type, sequence, status) == (FRAME_ACK, 7, STATUS_NO_DEVICE)
+    assert position == pytest.approx(0.37)
+
+def test_moves_past_the_window_are_coalesced(fake_bridge):
+    stream = BridgeStream('127.0.0.1', fake_bridge.port, max_in_flight=2)
+    assert stream.open()
+    try:
+        for i in range(10):
+            assert stream.send_move(i / 10, 100 + i)
+        assert [frame[2] for frame in fake_bridge.wait_frames(2)] == pytest.approx([0.0, 0.1])
+        assert stream.in_flight == 2
+        assert stream.coalesced == 7
+        assert not stream.wait_window(0.05)
+
+        # Acks open the window and the newest held move goes out
+        fake_bridge.ack_all()
+        frames = fake_bridge.wait_frames(3)
+        assert frames[2][0] == FRAME_MOVE
+        assert frames[2][2] == pytest.approx(0.9) and frames[2][3] == 109
+        _wait(lambda: stream.acked == 2)
+        assert stream.wait_window(1.0)
+        assert [frame[1] for frame in frames] == [1, 2, 3]
+    finally:
+        stream.close()
+
+def test_stop_supersedes_a_held_move(fake_bridge):
+    stream = BridgeStream('127.0.0.1', fake_bridge.port, max_in_flight=1)
+    assert stream.open()
+    try:
+        stream.send_move(0.5, 100)
+        stream.send_move(0.6, 100)  # Held
+        assert stream.send_stop()   # Sent even with the window full
+        frames = fake_bridge.wait_frames(2)
+        assert [frame[0] for frame in frames] == [FRAME_MOVE, FRAME_STOP]
+
+        fake_bridge.ack_all()
+        _wait(lambda: stream.acked == 2)
+        time.sleep(0.05)
+        assert len(fake_bridge.frames) == 2  # The held move was dropped
+    finally:
+        stream.close()
+
+def test_open_fails_without_a_bridge():
+    with socket.socket() as unused:
+        unused.bind(('127.0.0.1', 0))  # Bound but not listening: connections are refused
+        stream = BridgeStream('127.0.0.1', unused.getsockname()[1], timeout=0.5)
+        assert not stream.open()
+        assert not stream.send_move(0.5, 100)
+
+def test_control_frames_do_not_use_the_move_window(fake_bridge):
+    stream = BridgeStream('127.0.0.1', fake_bridge.port, max_in_flight=2)
+    assert stream.open()
+    try:
+        assert stream.ping() and stream.send_stop()
+        assert stream.in_flight == 0
+        stream.send_move(0.1, 100)
+        stream.send_move(0.2, 100)
+        assert stream.in_flight == 2
+        frames = fake_bridge.wait_frames(4)
+        assert [frame[0] for frame in frames] == [FRAME_PING, FRAME_STOP, FRAME_MOVE, FRAME_MOVE]
+
+        # Every frame is acked, but only the moves were holding the window
+        fake_bridge.ack_all()
+        _wait(lambda: stream.acked == 4)
+        assert stream.in_flight == 0
+    finally:
+        stream.close()
+
+def test_pinned_move_goes_out_with_the_window_full(fake_bridge):
+    stream = BridgeStream('127.0.0.1', fake_bridge.port, max_in_flight=1)
+    assert stream.open()
+    try:
+        stream.send_move(0.5, 100)
+        stream.send_move(0.6, 100)  # Held
+        assert stream.send_move(0.0, 1000, droppable=False)
+        frames = fake_bridge.wait_frames(2)
+        assert [(frame[0], round(frame[2], 2)) for frame in frames] == [(FRAME_MOVE, 0.5), (FRAME_MOVE, 0.0)]
+        assert stream.coalesced == 1
+
+        fake_bridge.ack_all()
+        _wait(lambda: stream.acked == 2)
+        time.sleep(0.05)
+        assert len(fake_bridge.frames) == 2  # The superseded move never goes out
+    finally:
+        stream.close()
+
+def test_client_delivery_never_waits_on_the_window(fake_bridge):
+    client = IntifaceClient('http://127.0.0.1:8080', use_sender=False)
+    client.stream = BridgeStream('127.0.0.1', fake_bridge.port, max_in_flight=1)
+    assert client.stream.open()
+    try:
+        started = time.monotonic()
+        for i in range(20):
+            client._deliver_move(i / 20, 100)
+        assert time.monotonic() - started < 0.5
+        assert client.stream.sent == 1 and client.stream.coalesced == 18
+
+        fake_bridge.ack_all()
+        frames = fake_bridge.wait_frames(2)
+        assert frames[1][2] == pytest.approx(0.95)  # The newest move
+    finally:
+        client.stream.close()
+
+def test_acks_and_deliveries_record_latency(fake_bridge):
+    client = IntifaceClient('http://127.0.0.1:8080', use_sender=False)
+    client.stream = BridgeStream('127.0.0.1', fake_bridge.port, ack_latency=client.ack_latency)
+    assert client.stream.open()
+    try:
+        client._deliver_move(0.2, 100)
+        client._deliver_move(0.4, 100)
+        assert client.send_latency.count == 2
+        fake_bridge.wait_frames(2)
+        fake_bridge.ack_all()
+        _wait(lambda: client.ack_latency.count == 2)
+    finally:
+        client.stream.close()
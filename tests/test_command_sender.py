@@ -0,0 +1,160 @@
+import threading
+
+from command_sender import STOP, CommandSender
+from device_handler import IntifaceClient
+
+def _sender(max_depth=8):
+    delivered = []
+    sender = CommandSender(lambda position, duration, droppable: delivered.append((position, duration)),
+                           lambda: delivered.append(STOP), max_depth)
+    return sender, delivered
+
+def _queued(sender):
+    return [command if command is STOP else command[1] for command in sender.queue]
+
+def test_overflow_drops_the_oldest_move():
+    sender, _ = _sender(3)
+    for position in (0.1, 0.2, 0.3, 0.4, 0.5):
+        sender.submit_move(position, 1000)
+    assert _queued(sender) == [0.3, 0.4, 0.5]
+    assert sender.dropped == 2
+    assert sender.max_seen_depth == 3
+
+def test_overflow_keeps_stops_and_pinned_moves_at_depth_one():
+    sender, _ = _sender(1)
+    sender.submit_stop()
+    sender.submit_move(0.5, 1000)
+    sender.submit_move(0.6, 1000)
+    assert _queued(sender) == [STOP, 0.6]
+
+    sender.clear()
+    sender.submit_move(0.0, 1000, droppable=False)
+    sender.submit_move(0.7, 1000)
+    sender.submit_move(0.8, 1000)
+    assert _queued(sender) == [0.0, 0.8]
+
+def test_expired_moves_lose_to_newer_ones():
+    sender, _ = _sender()
+    # Zero duration: already expired when the next one is queued
+    sender.submit_move(0.1, 0)
+    sender.submit_move(0.2, 0, droppable=False)
+    sender.submit_move(0.3, 0)
+    sender.submit_move(0.4, 0)
+    sender.submit_move(0.5, 60_000)  # Still current, so the one after it must wait
+    sender.submit_move(0.6, 0)
+
+    assert sender._next_command()[1] == 0.2  # Pinned moves are never skipped
+    assert sender._next_command()[1] == 0.5
+    assert sender._next_command()[1] == 0.6
+    assert sender.dropped == 3
+
+def test_stops_are_merged_but_never_skipped():
+    sender, _ = _sender()
+    sender.queue.extend([STOP, STOP])
+    sender.submit_move(0.4, 0)
+    assert sender._next_command() is STOP
+    assert sender._next_command()[1] == 0.4
+    assert not sender.queue
+
+def test_latest_move_is_delivered_while_the_transport_is_busy():
+    gate = threading.Event()
+    delivered = []
+
+    def send_move(position, duration, droppable):
+        gate.wait(2.0)
+        delivered.append(position)
+
+    sender = CommandSender(send_move, lambda: delivered.append(STOP), max_depth=4)
+    sender.start()
+    try:
+        sender.submit_move(0.0, 0)
+        for i in range(1, 50):
+            sender.submit_move(i / 100, 0)
+        gate.set()
+        assert sender.wait_idle(2.0)
+    finally:
+        sender.stop()
+
+    assert delivered[-1] == 0.49
+    assert sender.sent == len(delivered)
+    assert sender.sent + sender.dropped == 50
+
+def test_drain_delivers_the_home_move_before_exiting():
+    gate = threading.Event()
+    sender, delivered = _sender()
+    blocked_send = sender.send_move
+    sender.send_move = lambda *move: (gate.wait(2.0), blocked_send(*move))
+    sender.start()
+    sender.submit_move(0.5, 60_000)
+    sender.submit_move(0.0, 60_000, droppable=False)
+    sender.stop(drain=True)
+    gate.set()
+    sender.sender_thread.join(2.0)
+
+    assert not sender.sender_thread.is_alive()
+    assert delivered == [(0.5, 60_000), (0.0, 60_000)]
+    assert not sender.should_send
+
+def test_stop_discards_queued_moves():
+    sender, delivered = _sender()
+    sender.submit_move(0.5, 60_000)
+    sender.submit_move(0.6, 60_000)
+    sender.stop()
+    assert not sender.queue and sender.dropped == 2
+    assert delivered == []
+
+def test_pinned_flag_reaches_the_transport():
+    delivered = []
+    sender = CommandSender(lambda *move: delivered.append(move), lambda: None)
+    sender.start()
+    sender.submit_move(0.5, 100)
+    sender.submit_move(0.0, 1000, droppable=False)
+    assert sender.stop(drain=True, timeout=2.0)
+    assert delivered == [(0.5, 100, True), (0.0, 1000, False)]
+
+def test_bounded_drain_discards_what_is_left():
+    gate = threading.Event()
+    sender, delivered = _sender()
+    blocked_send = sender.send_move
+    sender.send_move = lambda *move: (gate.wait(2.0), blocked_send(*move))
+    sender.start()
+    sender.submit_move(0.5, 60_000)
+    sender.submit_move(0.6, 60_000)
+    assert not sender.stop(drain=True, timeout=0.1)
+    assert not sender.queue and not sender.should_send
+    gate.set()
+    sender.sender_thread.join(2.0)
+    assert delivered == [(0.5, 60_000)]
+
+def test_client_disconnect_delivers_the_queued_home_move():
+    gate = threading.Event()
+    delivered = []
+    client = IntifaceClient('http://127.0.0.1:8080', use_stream=False)
+    client.connected = True
+    client.session = object()
+    client._deliver_move = lambda *move: (gate.wait(2.0), delivered.append(move))
+    client.sender.send_move = client._deliver_move
+    client.sender.start()
+    client.send_position_command(0.5, 100)
+    client.send_position_command(0.0, 1000, droppable=False)  # Queued behind the blocked move
+    client.session = None  # No /disconnect request
+    threading.Timer(0.1, gate.set).start()
+    client.disconnect()
+    assert delivered == [(0.5, 100, True), (0.0, 1000, False)]
+    client.sender.sender_thread.join(1.0)
+    assert not client.sender.sender_thread.is_alive()
+
+def test_queue_wait_is_recorded_per_delivered_move():
+    sender, delivered = _sender()
+    sender.start()
+    try:
+        sender.submit_move(0.2, 100)
+        assert sender.wait_idle(2.0)
+        sender.submit_stop()
+        assert sender.wait_idle(2.0)
+        sender.submit_move(0.4, 100)
+        assert sender.wait_idle(2.0)
+    finally:
+        sender.stop()
+    assert delivered == [(0.2, 100), STOP, (0.4, 100)]
+    assert sender.queue_latency.count == 2  # Stops are not timed
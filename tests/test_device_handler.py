@@ -0,0 +1,328 @@
+import os
+from array import array
+
+import pytest
+
+from clock import VirtualClock
+from conftest import stroke_actions, write_funscript
+from device_handler import (BATCH_GAP, BATCH_LEAD, BATCH_MIN_LEAD, FunscriptPattern, IntifaceClient, PatternManager,
+                            PlaybackEngine)
+from pattern_categories import PATTERN_CATEGORIES
+from simulator import FakeDeviceClient
+
+def _bump_mtime(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 1_000_000_000))
+
+def _category_names(manager):
+    return {category: [pattern.name for pattern in getattr(manager, category)] for category in PATTERN_CATEGORIES}
+
+def test_pattern_actions_are_typed_arrays(tmp_path):
+    path = str(tmp_path / 'a.funscript')
+    write_funscript(path, [(0, 10.6), (100, 120), (250, -4), (400, 50)])
+    pattern = FunscriptPattern(path)
+    assert isinstance(pattern.at, array) and pattern.at.typecode == 'i'
+    assert isinstance(pattern.pos, array) and pattern.pos.typecode == 'B'
+    assert list(pattern.at) == [0, 100, 250, 400]
+    assert list(pattern.pos) == [11, 100, 0, 50]  # Rounded and clamped to 0-100
+    assert (pattern.duration, pattern.start_pos, pattern.end_pos) == (400, 11, 50)
+
+    # The list-of-dicts view older callers use
+    actions = pattern.actions
+    assert len(actions) == 4
+    assert actions[1] == {'at': 100, 'pos': 100} and actions[-1] == {'at': 400, 'pos': 50}
+    assert actions[1:3] == [{'at': 100, 'pos': 100}, {'at': 250, 'pos': 0}]
+    assert [action['at'] for action in actions] == [0, 100, 250, 400]
+
+def test_unreadable_pattern_is_empty(tmp_path):
+    path = tmp_path / 'bad.funscript'
+    path.write_text('{"actions": [', encoding='utf-8')
+    pattern = FunscriptPattern(str(path))
+    assert len(pattern.at) == 0 and len(pattern.actions) == 0 and pattern.duration == 0
+
+@pytest.mark.parametrize('load_processes', [False, True])
+def test_parallel_load_matches_serial_load(library, load_processes):
+    serial = PatternManager(library)
+    parallel = PatternManager(library, load_workers=4, load_processes=load_processes)
+    assert _category_names(parallel) == _category_names(serial)
+    assert parallel.get_total_count() == serial.get_total_count() == 27
+    for pattern, expected in zip(parallel.get_all_patterns(), serial.get_all_patterns()):
+        assert pattern.file_path == expected.file_path
+        assert list(pattern.at) == list(expected.at) and list(pattern.pos) == list(expected.pos)
+
+def test_rescan_applies_added_changed_and_removed_files(library):
+    manager = PatternManager(library)
+    total = manager.get_total_count()
+    assert manager.rescan() == {'added': 0, 'changed': 0, 'removed': 0}
+
+    # Added
+    added_path = os.path.join(library, 'bj', '0-0_extra.funscript')
+    write_funscript(added_path, stroke_actions(0, 0, 300))
+    assert manager.rescan() == {'added': 1, 'changed': 0, 'removed': 0}
+    assert manager.get_total_count() == total + 1
+    assert manager.find_pattern_by_name('0-0_extra.funscript') in manager.main_patterns_0_to_0
+
+    # Changed: now a 100->100 pattern, so it moves to that list
+    write_funscript(added_path, stroke_actions(100, 100, 300))
+    _bump_mtime(added_path)
+    assert manager.rescan() == {'added': 0, 'changed': 1, 'removed': 0}
+    assert manager.get_total_count() == total + 1
+    assert all(pattern.name != '0-0_extra.funscript' for pattern in manager.main_patterns_0_to_0)
+    assert manager.find_pattern_by_name('0-0_extra.funscript') in manager.main_patterns_100_to_100
+
+    # Touched without a content change
+    _bump_mtime(added_path, 20)
+    assert manager.rescan() == {'added': 0, 'changed': 0, 'removed': 0}
+
+    # Removed
+    os.remove(os.path.join(library, 'bj', '100-100_fast.funscript'))
+    assert manager.rescan() == {'added': 0, 'changed': 0, 'removed': 1}
+    assert manager.get_total_count() == total
+    assert manager.find_pattern_by_name('100-100_fast.funscript') is None
+
+def test_rescan_swaps_category_lists_copy_on_write(library):
+    manager = PatternManager(library)
+    held = manager.main_patterns_0_to_0
+    held_names = [pattern.name for pattern in held]
+
+    write_funscript(os.path.join(library, 'bj', '0-0_extra.funscript'), stroke_actions(0, 0, 300))
+    os.remove(os.path.join(library, 'bj', '0-0_slow.funscript'))
+    manager.rescan()
+
+    # Lists handed out before the rescan are never mutated
+    assert [pattern.name for pattern in held] == held_names
+    current = manager.main_patterns_0_to_0
+    assert current is not held
+    assert sorted(pattern.name for pattern in current) == ['0-0_extra.funscript', '0-0_fast.funscript',
+                                                           '0-0_medium.funscript']
+
+def test_rescan_keeps_category_and_endpoint_maps_in_sync(library):
+    manager = PatternManager(library)
+    write_funscript(os.path.join(library, 'bj', '0-0_extra.funscript'), stroke_actions(0, 0, 300))
+    manager.rescan()
+
+    current = manager.main_patterns_0_to_0
+    assert manager.patterns_by_category['main_patterns_0_to_0'] is current
+    assert manager.get_patterns_by_endpoints(0, 0) is current
+    assert manager.find_pattern_by_name('0-0_extra.funscript') in current
+
+def test_library_changes_bump_generation(library):
+    manager = PatternManager(library)
+    generation = manager.generation
+    write_funscript(os.path.join(library, 'bj', '0-0_extra.funscript'), stroke_actions(0, 0, 300))
+    manager.rescan()
+    assert manager.generation > generation
+    generation = manager.generation
+    manager.rescan()
+    assert manager.generation == generation
+
+def test_registry_lookups_by_name_and_stem(library):
+    manager = PatternManager(library)
+    pattern = manager.find_pattern_by_name('0-100_fast.funscript')
+    assert pattern is not None and pattern in manager.transitions_0_to_100
+    assert manager.find_pattern_by_name('0-100_fast') is pattern
+    assert manager.find_pattern_by_name('missing.funscript') is None
+
+    assert manager.get_patterns_by_endpoints(50, 100) is manager.transitions_50_to_100
+    assert manager.get_patterns_by_endpoints(50, 75) == []
+
+def test_registry_lookups_by_folder_key(library):
+    write_funscript(os.path.join(library, 'twerk', '0-0_slow.funscript'), stroke_actions(50, 50, 1000))
+    manager = PatternManager(library)
+    pattern = manager.find_pattern_by_name('0-100_fast.funscript')
+    assert manager.find_pattern_by_name('transitions/0-100_fast.funscript') is pattern
+
+    # The same file name in two folders resolves per folder, also after a rescan
+    bj_path = os.path.join(library, 'bj', '0-0_slow.funscript')
+    assert manager.find_pattern_by_name('bj/0-0_slow.funscript') in manager.main_patterns_0_to_0
+    twerk_copy = manager.find_pattern_by_name('twerk/0-0_slow.funscript')
+    assert twerk_copy in manager.main_patterns_50_to_50
+    write_funscript(bj_path, stroke_actions(0, 0, 900))
+    _bump_mtime(bj_path)
+    manager.rescan()
+    assert manager.find_pattern_by_name('bj/0-0_slow.funscript') is manager.find_pattern_by_name('0-0_slow.funscript')
+    assert manager.find_pattern_by_name('twerk/0-0_slow.funscript') is twerk_copy
+
+def test_twerk_view_lookups(library):
+    manager = PatternManager(library)
+    twerk = manager.mode_view('twerk')
+    assert twerk.get_total_count() == 3
+    assert twerk.find_pattern_by_name('50-50_slow.funscript') in manager.main_patterns_50_to_50
+    assert twerk.find_pattern_by_name('0-100_fast.funscript') is None
+
+def test_duplicate_names_resolve_in_category_order_after_rescan(library):
+    # The same file name in bj/ (0->0) and twerk/ (50->50)
+    write_funscript(os.path.join(library, 'twerk', '0-0_slow.funscript'), stroke_actions(50, 50, 1000))
+    manager = PatternManager(library)
+    first = manager.find_pattern_by_name('0-0_slow.funscript')
+    assert first in manager.main_patterns_0_to_0
+    twerk_copy = next(pattern for pattern in manager.main_patterns_50_to_50
+                      if pattern.name == '0-0_slow.funscript')
+
+    # Re-adding the bj/ copy puts it last in load order, but the name still
+    # resolves by category order
+    bj_path = os.path.join(library, 'bj', '0-0_slow.funscript')
+    write_funscript(bj_path, stroke_actions(0, 0, 900))
+    _bump_mtime(bj_path)
+    assert manager.rescan()['changed'] == 1
+    resolved = manager.find_pattern_by_name('0-0_slow.funscript')
+    assert resolved in manager.main_patterns_0_to_0
+    assert resolved is not first
+    assert twerk_copy in manager.main_patterns_50_to_50
+
+def test_lazy_catalog_evicts_least_recently_used_actions(library):
+    manager = PatternManager(library, lazy=True, cache_size=2)
+    first, second, third = manager.main_patterns_0_to_0[:3]
+    assert first.is_lazy and first.action_count and len(manager.action_cache) == 0
+
+    assert list(first.at) == list(first.read_buffers()[0])
+    second.buffers()
+    first.buffers()   # Hit: first becomes the most recently used
+    third.buffers()   # Evicts second
+    cache = manager.action_cache
+    assert (cache.hits, cache.misses, len(cache)) == (1, 3, 2)
+
+    first.buffers()
+    assert cache.hits == 2
+    second.buffers()  # Reloaded from disk, evicting third
+    assert cache.misses == 4
+    third.buffers()
+    assert (cache.misses, len(cache)) == (5, 2)
+
+def test_lazy_catalog_metadata_matches_loaded_patterns(library):
+    lazy = PatternManager(library, lazy=True)
+    loaded = PatternManager(library)
+    for category in ('main_patterns_0_to_0', 'transitions_0_to_100', 'main_patterns_50_to_50'):
+        for lazy_pattern, pattern in zip(getattr(lazy, category), getattr(loaded, category)):
+            assert lazy_pattern.name == pattern.name
+            assert (lazy_pattern.duration, lazy_pattern.start_pos, lazy_pattern.end_pos, lazy_pattern.action_count) == \
+                   (pattern.duration, pattern.start_pos, pattern.end_pos, pattern.action_count)
+
+def test_twerk_view_shares_patterns_and_follows_rescans(library):
+    manager = PatternManager(library)
+    assert manager.mode_view('normal') is manager
+    twerk = manager.mode_view('twerk')
+    assert manager.mode_view('twerk') is twerk
+    with pytest.raises(ValueError):
+        manager.mode_view('missing')
+
+    # Same pattern objects as the manager, limited to twerk/
+    assert twerk.main_patterns_50_to_50 == manager.main_patterns_50_to_50
+    assert all(a is b for a, b in zip(twerk.main_patterns_50_to_50, manager.main_patterns_50_to_50))
+    assert twerk.main_patterns_0_to_0 == [] and twerk.transitions_0_to_50 == []
+    assert twerk.get_patterns_by_endpoints(50, 50) is twerk.main_patterns_50_to_50
+    held = twerk.get_all_patterns()
+    assert twerk.get_all_patterns() is held  # Not rebuilt while the library is unchanged
+
+    write_funscript(os.path.join(library, 'twerk', '50-50_extra.funscript'), stroke_actions(50, 50, 300))
+    manager.rescan()
+    assert twerk.get_total_count() == 4
+    assert twerk.find_pattern_by_name('50-50_extra.funscript') in manager.main_patterns_50_to_50
+    assert len(held) == 3
+
+class _Response:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self._body = body or {}
+
+    def json(self):
+        return self._body
+
+class _RecordingSession:
+    """requests.Session stand-in that records posts"""
+
+    def __init__(self, response=None):
+        self.posts = []
+        self.response = response or _Response(body={'status': 'ok'})
+
+    def post(self, url, json=None):
+        self.posts.append((url, json))
+        return self.response
+
+def _http_client(response=None):
+    client = IntifaceClient('http://bridge', use_stream=False)
+    client.connected = True
+    client.session = _RecordingSession(response)
+    return client
+
+def test_send_batch_posts_the_timed_action_list():
+    client = _http_client()
+    assert client.send_batch([(0, 0.204, 250), (250, 1.7, 300.9), (550, -0.3, 500)], start_at=1234.5678, replace=True)
+    url, batch = client.session.posts[0]
+    assert url == 'http://bridge/batch'
+    assert batch == {'start_at': 1234567, 'replace': True,
+                     'actions': [[0, 0.2, 250], [250, 1.0, 300], [550, 0.0, 500]]}
+
+    client.cancel_batch()
+    assert client.session.posts[1] == ('http://bridge/command', {'command': 'cancel'})
+
+def test_rejected_batch_reports_failure():
+    assert not _http_client(_Response(500)).send_batch([(0, 0.5, 100)])
+    assert not _http_client(_Response(body={'error': 'no device'})).send_batch([(0, 0.5, 100)])
+    client = _http_client()
+    client.connected = False
+    assert not client.send_batch([(0, 0.5, 100)])
+    assert client.session.posts == []
+
+class _BatchClient(FakeDeviceClient):
+    """Fake device client with batch upload; records (upload time, actions, start_at)"""
+
+    def __init__(self, clock, accept=True):
+        super().__init__(clock)
+        self.accept = accept
+        self.batches = []
+        self.cancelled = 0
+
+    def send_batch(self, actions, start_at=None, replace=False):
+        self.batches.append((self.clock.time(), actions, start_at))
+        return self.accept
+
+    def cancel_batch(self):
+        self.cancelled += 1
+
+def _batch_engine(library, client):
+    engine = PlaybackEngine(PatternManager(library), client, clock=client.clock)
+    engine.batch_upload = True
+    engine.set_range(20, 80)
+    return engine
+
+def test_batches_chain_on_the_server_timeline(library):
+    client = _BatchClient(VirtualClock())
+    engine = _batch_engine(library, client)
+    engine.dynamic_speed_multiplier = 2.0
+    assert engine.start_playback(background=False)
+    first = engine.current_pattern
+    started = client.clock.time()
+    assert engine.play_next() and engine.play_next()
+
+    (upload, actions, start_at), (next_upload, _, next_start_at) = client.batches[:2]
+    assert upload == started and start_at == pytest.approx(started + BATCH_MIN_LEAD)
+    assert client.commands == []  # Nothing went out per action
+
+    # Offsets and durations on the stretched timeline, positions inside the range
+    assert [offset for offset, _, _ in actions] == [at * 2 for at in first.at]
+    assert [duration for _, _, duration in actions[:-1]] == [(b - a) * 2 for a, b in zip(first.at, first.at[1:])]
+    assert all(0.2 <= position <= 0.8 for _, position, _ in actions)
+
+    # The next batch was uploaded BATCH_LEAD before the first ended and starts right after it
+    end_at = start_at + first.duration / 1000.0 * 2.0
+    assert next_upload == pytest.approx(end_at - BATCH_LEAD + 0.1)  # plus play_next's breathing room
+    assert next_start_at == pytest.approx(end_at + BATCH_GAP)
+
+def test_failed_upload_falls_back_to_per_action_commands(library):
+    client = _BatchClient(VirtualClock(), accept=False)
+    engine = _batch_engine(library, client)
+    assert engine.start_playback(background=False)
+    pattern = engine.current_pattern
+    assert engine.play_next()
+    assert len(client.batches) == 1 and not engine.batch_upload
+    assert len(client.commands) == pattern.action_count
+
+def test_stop_cancels_uploaded_batches(library):
+    client = _BatchClient(VirtualClock())
+    engine = _batch_engine(library, client)
+    assert engine.start_playback(background=False)
+    engine.play_next()
+    engine.stop_playback()
+    assert client.cancelled == 1
+    assert client.commands[-1][1:] == (0.0, 1000)  # Home move after the cancel
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from conftest import write_funscript
+from funscript_io import iter_funscript_actions, read_funscript_buffers, read_funscript_metadata
+
+def _write_text(path, text):
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+def test_metadata_matches_a_full_parse(tmp_path):
+    path = str(tmp_path / 'a.funscript')
+    write_funscript(path, [(0, 10), (250, 90), (500, 40), (900, 70)])
+    timestamps, positions = read_funscript_buffers(path)
+    assert read_funscript_metadata(path) == (timestamps[-1], positions[0], positions[-1], len(timestamps))
+
+def test_metadata_ignores_nested_values(tmp_path):
+    # Braces and brackets inside metadata and inside actions must not be counted
+    script = {
+        'metadata': {'chapters': [{'name': 'intro', 'actions': [{'at': 1, 'pos': 1}]}]},
+        'actions': [
+            {'at': 0, 'pos': 20, 'tags': [{'a': 1}, {'b': [2, 3]}]},
+            {'at': 300, 'pos': 80, 'note': '{not an action}'},
+            {'at': 600, 'pos': 50.6},
+        ],
+        'trailer': [{'x': 1}],
+    }
+    path = _write_text(tmp_path / 'nested.funscript', json.dumps(script))
+    assert read_funscript_metadata(path) == (600, 20, 51, 3)
+
+def test_metadata_of_an_empty_or_missing_actions_array(tmp_path):
+    assert read_funscript_metadata(_write_text(tmp_path / 'empty.funscript', '{"actions": []}')) == (0, 0, 0, 0)
+    assert read_funscript_metadata(_write_text(tmp_path / 'none.funscript', '{"version": "1.0"}')) == (0, 0, 0, 0)
+
+def test_metadata_of_a_truncated_file(tmp_path):
+    path = _write_text(tmp_path / 'cut.funscript', '{"actions": [{"at": 0, "pos": 0}, {"at": 10')
+    with pytest.raises(ValueError):
+        read_funscript_metadata(path)
+
+def test_stream_across_every_chunk_boundary(tmp_path):
+    actions = [(i * 37, (i * 13) % 101) for i in range(40)]
+    path = str(tmp_path / 'long.funscript')
+    write_funscript(path, actions)
+    # Small chunks put boundaries inside keys, numbers and action objects
+    for chunk_size in (1, 2, 3, 7, 16, 64):
+        assert list(iter_funscript_actions(path, chunk_size=chunk_size)) == actions
+
+def test_stream_skips_nested_actions_keys(tmp_path):
+    script = ('{"metadata": {"actions": [{"at": 1, "pos": 1}], "title": "] , {"},\n'
+              ' "actions": [ {"at": 0, "pos": 10.4} ,\n{"at": 100, "pos": 120}, {"at": 200, "pos": -5} ]}')
+    path = _write_text(tmp_path / 'nested.funscript', script)
+    for chunk_size in (1, 5, 1024):
+        assert list(iter_funscript_actions(path, chunk_size=chunk_size)) == [(0, 10), (100, 100), (200, 0)]
+
+def test_stream_without_actions_yields_nothing(tmp_path):
+    assert list(iter_funscript_actions(_write_text(tmp_path / 'a.funscript', '{"version": "1.0"}'))) == []
+    assert list(iter_funscript_actions(_write_text(tmp_path / 'b.funscript', '{"actions": {}}'))) == []
+    assert list(iter_funscript_actions(_write_text(tmp_path / 'c.funscript', '[1, 2]'))) == []
+
+def test_stream_rejects_truncated_files(tmp_path):
+    # Cut inside an action: the complete actions come first, then the error
+    path = _write_text(tmp_path / 'cut.funscript', '{"actions": [{"at": 0, "pos": 0}, {"at": 10, "po')
+    stream = iter_funscript_actions(path, chunk_size=4)
+    assert next(stream) == (0, 0)
+    with pytest.raises(ValueError, match='Truncated'):
+        next(stream)
+
+    # Cut before the actions array is reached
+    path = _write_text(tmp_path / 'header.funscript', '{"version": "1.0", "actions"')
+    with pytest.raises(ValueError, match='Malformed funscript header'):
+        list(iter_funscript_actions(path, chunk_size=4))
+
+def test_stream_buffer_is_capped(tmp_path):
+    # A header, or a single action, larger than max_buffer is rejected instead of buffered
+    path = _write_text(tmp_path / 'header.funscript', '{"title": "' + 'x' * 500 + '", "actions": []}')
+    with pytest.raises(ValueError, match='header larger'):
+        list(iter_funscript_actions(path, chunk_size=16, max_buffer=128))
+
+    path = _write_text(tmp_path / 'action.funscript',
+                       '{"actions": [{"at": 0, "pos": 0}, {"at": 10, "pos": 5, "note": "' + 'y' * 500 + '"}]}')
+    stream = iter_funscript_actions(path, chunk_size=16, max_buffer=128)
+    assert next(stream) == (0, 0)
+    with pytest.raises(ValueError, match='Malformed action'):
+        next(stream)
+
+    # Many small actions never accumulate: the buffer only holds the unparsed tail
+    actions = [(i, i % 100) for i in range(2000)]
+    path = str(tmp_path / 'many.funscript')
+    write_funscript(path, actions)
+    assert list(iter_funscript_actions(path, chunk_size=16, max_buffer=128)) == actions
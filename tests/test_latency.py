@@ -0,0 +1,78 @@
+import json
+import threading
+
+import pytest
+
+from latency import BUCKETS_PER_DECADE, DECADES, MIN_LATENCY, LatencyHistogram, LatencyReporter
+
+BUCKET_WIDTH = 10 ** (1 / BUCKETS_PER_DECADE)
+
+def test_percentiles_are_bucket_upper_bounds():
+    histogram = LatencyHistogram('test')
+    assert histogram.percentile(50) == 0.0
+
+    # 1..1000 ms
+    for ms in range(1, 1001):
+        histogram.record(ms / 1000)
+    for q in (50, 95, 99):
+        exact = q / 100
+        assert exact <= histogram.percentile(q) <= exact * BUCKET_WIDTH
+    assert histogram.percentile(100) == pytest.approx(1.0)  # Capped at the largest value seen
+    assert histogram.percentile(0) <= 0.001 * BUCKET_WIDTH
+
+def test_out_of_range_values():
+    histogram = LatencyHistogram('test')
+    histogram.record(0.0)
+    histogram.record(1e-9)
+    assert histogram.percentile(100) == 1e-9
+    histogram.record(1e6)  # Past the last bucket: percentiles stop at its bound, max does not
+    assert histogram.percentile(100) == pytest.approx(MIN_LATENCY * 10 ** DECADES)
+    assert histogram.snapshot()['max_ms'] == 1e9
+    assert histogram.count == 3
+
+def test_snapshot_and_reset():
+    histogram = LatencyHistogram('send')
+    for seconds in (0.001, 0.002, 0.003, 0.010):
+        histogram.record(seconds)
+    stats = histogram.snapshot()
+    assert stats['count'] == 4
+    assert stats['mean_ms'] == pytest.approx(4.0)
+    assert stats['max_ms'] == pytest.approx(10.0)
+    assert stats['p50_ms'] <= stats['p95_ms'] <= stats['p99_ms'] <= stats['max_ms']
+    assert histogram.summary().startswith('send: n=4 ')
+
+    histogram.reset()
+    assert histogram.snapshot() == {'count': 0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0,
+                                    'p99_ms': 0.0, 'max_ms': 0.0}
+
+def test_snapshot_is_consistent_under_concurrent_records():
+    histogram = LatencyHistogram('test')
+    stop = threading.Event()
+
+    def record():
+        while not stop.is_set():
+            histogram.record(0.005)
+
+    threads = [threading.Thread(target=record) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    try:
+        for _ in range(500):
+            stats = histogram.snapshot()
+            if stats['count']:
+                assert stats['mean_ms'] == pytest.approx(5.0)
+                assert stats['p50_ms'] == pytest.approx(5.0)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+def test_reporter_writes_json(tmp_path):
+    histogram = LatencyHistogram('ack')
+    histogram.record(0.02)
+    path = tmp_path / 'latency.json'
+    LatencyReporter(lambda: {'ack': histogram}, path=str(path)).report()
+    with open(path) as f:
+        report = json.load(f)
+    assert report['ack']['count'] == 1
+    assert report['ack']['max_ms'] == pytest.approx(20.0)
@@ -0,0 +1,129 @@
+import json
+import os
+import random
+
+import pytest
+
+import pattern_analyzer
+from conftest import stroke_actions, write_funscript
+from funscript_io import read_funscript_buffers
+from pattern_index import PatternIndex
+from pattern_analyzer import (INTENSITY_METRICS, analyze_pattern_speed, analyze_patterns_batch,
+                              classify_all_patterns, compute_intensity_metrics)
+
+def _random_pattern(rng, count):
+    at = sorted(rng.randrange(0, 20000) for _ in range(count))
+    pos = [rng.choice((0, 0, 50, 100, rng.randrange(101))) for _ in range(count)]
+    return at, pos
+
+def test_batch_matches_pure_python_metrics():
+    pytest.importorskip('numpy')
+    rng = random.Random(7)
+    buffers = [_random_pattern(rng, rng.randrange(2, 60)) for _ in range(200)]
+    buffers += [
+        ([], []),                              # empty
+        ([0], [50]),                           # single action
+        ([0, 100, 200], [30, 30, 30]),         # never moves
+        ([0, 0, 0, 500], [0, 100, 0, 100]),    # zero time steps
+        ([1000, 1500, 2000], [0, 100, 0]),     # does not start at 0
+    ]
+
+    batch = analyze_patterns_batch(buffers)
+    assert len(batch) == len(buffers)
+    for (at, pos), metrics in zip(buffers, batch):
+        expected = compute_intensity_metrics(at, pos)
+        assert set(metrics) == set(INTENSITY_METRICS)
+        for name in INTENSITY_METRICS:
+            assert metrics[name] == pytest.approx(expected[name], rel=1e-9, abs=1e-12), name
+
+def test_pure_python_fallback(monkeypatch):
+    monkeypatch.setattr(pattern_analyzer, 'np', None)
+    buffers = [([0, 500, 1000], [0, 100, 0]), ([], [])]
+    assert analyze_patterns_batch(buffers) == [compute_intensity_metrics(at, pos) for at, pos in buffers]
+
+def test_mean_velocity_matches_legacy_intensity(library):
+    path = os.path.join(library, 'bj', '0-0_medium.funscript')
+    metrics = compute_intensity_metrics(*read_funscript_buffers(path))
+    assert metrics['mean_velocity'] == pytest.approx(analyze_pattern_speed(path))
+    assert metrics['amplitude'] == pytest.approx(80)
+    assert metrics['duty_cycle'] == pytest.approx(1.0)
+
+def test_unreadable_files_are_not_cached(library, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Outputs left at their defaults land here
+    broken = os.path.join(library, 'bj', '0-0_broken.funscript')
+    with open(broken, 'w') as f:
+        f.write('{"actions": [')
+    options = dict(output_file=str(tmp_path / 'speeds.json'), cache_file=str(tmp_path / 'cache.json'))
+
+    results = classify_all_patterns([library], **options)
+    assert '0-0_broken.funscript' not in results
+    assert len(results) == 27
+    with open(tmp_path / 'cache.json') as f:
+        assert len(json.load(f)['metrics']) == 27
+
+    # Fixed in place: the next run analyzes it instead of reusing a cached failure
+    write_funscript(broken, stroke_actions(0, 0, 350))
+    results = classify_all_patterns([library], **options)
+    assert results['0-0_broken.funscript']['speed_class'] == 'medium'
+
+def test_duplicate_keys_across_roots_keep_the_first_root(library, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    other = tmp_path / 'other'
+    write_funscript(str(other / 'bj' / '0-0_slow.funscript'), stroke_actions(0, 0, 200))  # Fast copy
+    write_funscript(str(other / 'bj' / '0-0_new.funscript'), stroke_actions(0, 0, 200))
+    results = classify_all_patterns([library, str(other)], output_file=str(tmp_path / 'speeds.json'),
+                                    cache_file=str(tmp_path / 'cache.json'))
+
+    assert len(results) == 28
+    assert results['0-0_slow.funscript']['speed_class'] == 'slow'
+    assert results['0-0_slow.funscript']['key'] == 'bj/0-0_slow.funscript'
+    assert results['0-0_new.funscript']['speed_class'] == 'fast'
+
+def test_index_keeps_the_first_root_for_duplicate_keys(library, tmp_path):
+    other = tmp_path / 'other'
+    write_funscript(str(other / 'bj' / '0-0_slow.funscript'), stroke_actions(0, 0, 200))  # Fast copy
+    write_funscript(str(other / 'bj' / '0-0_new.funscript'), stroke_actions(0, 0, 200))
+    index_path = str(tmp_path / 'speeds.idx')
+    classify_all_patterns([library, str(other)], output_file=str(tmp_path / 'speeds.json'),
+                          cache_file=str(tmp_path / 'cache.json'), index_file=index_path)
+
+    index = PatternIndex(index_path)
+    try:
+        assert len(index) == 28
+        assert index.get('bj/0-0_slow.funscript')['speed_class'] == 'slow'
+    finally:
+        index.close()
+
+def test_same_name_in_two_folders_keeps_the_first_folder(library, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_funscript(os.path.join(library, 'twerk', '0-0_slow.funscript'), stroke_actions(50, 50, 200))
+    results = classify_all_patterns([library], output_file=str(tmp_path / 'speeds.json'),
+                                    cache_file=str(tmp_path / 'cache.json'))
+    # Name lookups resolve in folder order, so the JSON keeps the bj/ copy
+    assert results['0-0_slow.funscript']['key'] == 'bj/0-0_slow.funscript'
+
+def test_same_name_in_two_folders_keeps_both_index_rows(library, tmp_path):
+    write_funscript(os.path.join(library, 'twerk', '0-0_slow.funscript'), stroke_actions(50, 50, 200))
+    index_path = str(tmp_path / 'speeds.idx')
+    classify_all_patterns([library], output_file=str(tmp_path / 'speeds.json'),
+                          cache_file=str(tmp_path / 'cache.json'), index_file=index_path)
+    index = PatternIndex(index_path)
+    try:
+        assert len(index) == 28
+    finally:
+        index.close()
+
+def test_files_vanishing_mid_scan_are_skipped(library, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    content_hash = pattern_analyzer.file_content_hash
+
+    def vanishing_hash(file_path):
+        if file_path.endswith(os.path.join('bj', '0-0_fast.funscript')):
+            raise FileNotFoundError(file_path)
+        return content_hash(file_path)
+
+    monkeypatch.setattr(pattern_analyzer, 'file_content_hash', vanishing_hash)
+    results = classify_all_patterns([library], output_file=str(tmp_path / 'speeds.json'),
+                                    cache_file=str(tmp_path / 'cache.json'))
+    assert len(results) == 26
+    assert '0-0_fast.funscript' not in results
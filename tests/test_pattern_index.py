@@ -0,0 +1,81 @@
+import pytest
+
+import pattern_index
+from pattern_index import INDEX_SCHEMA_VERSION, PatternIndex, PatternRows, open_pattern_index, write_pattern_index
+
+ROWS = [
+    {'name': 'a.funscript', 'key': 'bj/a.funscript', 'category': 'bj', 'start_pos': 0, 'end_pos': 0,
+     'speed_class': 'slow', 'duration': 10000, 'intensity': 0.05, 'amplitude': 40.0},
+    {'name': 'b.funscript', 'key': 'bj/b.funscript', 'category': 'bj', 'start_pos': 100, 'end_pos': 100,
+     'speed_class': 'fast', 'duration': 8000, 'intensity': 0.5, 'amplitude': 80.0},
+    {'name': 'a.funscript', 'key': 'twerk/a.funscript', 'category': 'twerk', 'start_pos': 50, 'end_pos': 50,
+     'speed_class': 'medium', 'duration': 6000, 'intensity': 0.2, 'amplitude': 20.0},
+    {'name': 'c.funscript', 'key': 'transitions/c.funscript', 'category': 'transitions', 'start_pos': 0,
+     'end_pos': 100, 'speed_class': 'slow', 'duration': 9000, 'intensity': 0.08, 'amplitude': 60.0},
+    # Duplicate key: dropped by the writer
+    {'name': 'b.funscript', 'key': 'bj/b.funscript', 'category': 'bj', 'speed_class': 'slow'},
+]
+
+@pytest.fixture
+def index(tmp_path):
+    path = str(tmp_path / 'speeds.idx')
+    write_pattern_index(path, ROWS, ('amplitude',))
+    index = PatternIndex(path)
+    yield index
+    index.close()
+
+@pytest.fixture(params=['numpy', 'array'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(pattern_index, 'np', None)
+    return request.param
+
+def test_rows_round_trip(index):
+    assert len(index) == 4
+    assert index.schema_version == INDEX_SCHEMA_VERSION
+    assert index.metric_columns == ['amplitude']
+    for row, expected in enumerate(ROWS[:4]):
+        info = index.row(row)
+        for name, value in expected.items():
+            assert info[name] == pytest.approx(value) if isinstance(value, float) else info[name] == value
+    assert index.string('category', 3) == 'transitions'
+
+def test_get_by_key_then_name(index):
+    assert index.get('twerk/a.funscript')['start_pos'] == 50
+    assert index.get('a.funscript')['key'] == 'bj/a.funscript'  # First row with that name
+    assert index.get('c.funscript')['end_pos'] == 100
+    assert index.get('missing.funscript') is None
+    assert index.get('missing.funscript', {}) == {}
+
+def test_row_views(index, backend):
+    slow = index.rows_where('speed_class', 0)
+    fast = index.rows_where('speed_class', 2)
+    assert isinstance(slow, PatternRows)
+    assert [info['key'] for info in slow] == ['bj/a.funscript', 'transitions/c.funscript']
+    assert len(fast) == 1 and fast[0]['name'] == 'b.funscript'
+
+    assert list(slow.column('duration')) == [10000, 9000]
+    joined = PatternRows.concat([slow, fast])
+    assert [info['key'] for info in joined] == ['bj/a.funscript', 'transitions/c.funscript', 'bj/b.funscript']
+    assert [info['key'] for info in joined.take([2, 0])] == ['bj/b.funscript', 'bj/a.funscript']
+    assert [info['key'] for info in joined[1:]] == ['transitions/c.funscript', 'bj/b.funscript']
+
+@pytest.mark.parametrize('corrupt', ['magic', 'version', 'truncated'])
+def test_unreadable_index_is_rejected(tmp_path, corrupt):
+    path = str(tmp_path / 'speeds.idx')
+    write_pattern_index(path, ROWS[:4])
+    with open(path, 'r+b') as f:
+        if corrupt == 'magic':
+            f.write(b'XXXX')
+        elif corrupt == 'version':
+            f.seek(4)
+            f.write((INDEX_SCHEMA_VERSION + 1).to_bytes(2, 'little'))
+        else:
+            f.truncate(f.seek(0, 2) - 8)
+
+    with pytest.raises(ValueError):
+        PatternIndex(path)
+    assert open_pattern_index(path) is None
+    assert open_pattern_index(str(tmp_path / 'missing.idx')) is None
@@ -0,0 +1,121 @@
+import os
+import struct
+from array import array
+
+import pytest
+
+from device_handler import LIBRARY_FOLDERS, PatternManager
+from pattern_pack import PatternPack, library_signature, open_pack, write_pack
+
+SIGNATURE = b'\x01' * 32
+
+def test_write_and_read_round_trip(tmp_path):
+    pack_path = str(tmp_path / 'test.pack')
+    categories = [
+        ('main_patterns_0_to_0', [('bj/a.funscript', [0, 500, 1000], [0, 80, 0]),
+                                  ('bj/b.funscript', [0, 250], [5, 10])]),
+        ('transitions_0_to_100', []),
+        ('main_patterns_100_to_100', [('bj/c.funscript', array('i', [0, 100, 200, 300]), array('B', [100, 20, 100, 100]))]),
+    ]
+    write_pack(pack_path, SIGNATURE, categories)
+
+    pack = PatternPack(pack_path)
+    try:
+        assert pack.signature == SIGNATURE
+        assert pack.pattern_count == 3
+        assert [(name, count) for name, _, count in pack.categories] == [
+            ('main_patterns_0_to_0', 2), ('transitions_0_to_100', 0), ('main_patterns_100_to_100', 1)]
+
+        records = list(pack.records())
+        assert [(r.category, r.path) for r in records] == [
+            ('main_patterns_0_to_0', 'bj/a.funscript'),
+            ('main_patterns_0_to_0', 'bj/b.funscript'),
+            ('main_patterns_100_to_100', 'bj/c.funscript'),
+        ]
+        assert [(r.duration, r.start_pos, r.end_pos, r.action_count) for r in records] == [
+            (1000, 0, 0, 3), (250, 5, 10, 2), (300, 100, 100, 4)]
+
+        expected = [([0, 500, 1000], [0, 80, 0]), ([0, 250], [5, 10]), ([0, 100, 200, 300], [100, 20, 100, 100])]
+        for record, (at, pos) in zip(records, expected):
+            timestamps, positions = pack.action_buffers(record)
+            assert list(timestamps) == at
+            assert list(positions) == pos
+            del timestamps, positions
+    finally:
+        pack.close()
+
+def test_open_pack_rejects_stale_and_corrupt_packs(tmp_path):
+    pack_path = str(tmp_path / 'test.pack')
+    assert open_pack(pack_path) is None
+
+    write_pack(pack_path, SIGNATURE, [('main_patterns_0_to_0', [('bj/a.funscript', [0, 10], [0, 50])])])
+    assert open_pack(pack_path, b'\x02' * 32) is None
+    pack = open_pack(pack_path, SIGNATURE)
+    assert pack is not None
+    pack.close()
+
+    with open(pack_path, 'r+b') as f:
+        f.write(b'XXXX')
+    assert open_pack(pack_path) is None
+
+def test_manager_pack_matches_json_load(library, tmp_path):
+    pack_path = str(tmp_path / 'library.pack')
+    from_json = PatternManager(library)
+    built = PatternManager(library, pack_path=pack_path)  # Missing pack: parses the folders and writes it
+    assert os.path.exists(pack_path)
+    loaded = PatternManager(library, pack_path=pack_path)  # Served from the pack
+
+    for manager in (built, loaded):
+        assert manager.get_total_count() == from_json.get_total_count()
+        for expected, pattern in zip(from_json.get_all_patterns(), manager.get_all_patterns()):
+            assert os.path.normpath(pattern.file_path) == os.path.normpath(expected.file_path)
+            assert (pattern.start_pos, pattern.end_pos, pattern.duration) == \
+                (expected.start_pos, expected.end_pos, expected.duration)
+            assert list(pattern.at) == list(expected.at)
+            assert list(pattern.pos) == list(expected.pos)
+
+def test_library_signature_tracks_folder_changes(library):
+    folders = [folder for folder, _ in LIBRARY_FOLDERS]
+    before = library_signature(library, folders)
+    assert library_signature(library, folders) == before
+
+    os.remove(os.path.join(library, 'bj', '0-0_slow.funscript'))
+    assert library_signature(library, folders) != before
+
+def test_truncated_and_corrupted_packs_are_rejected(tmp_path):
+    pack_path = str(tmp_path / 'test.pack')
+    write_pack(pack_path, SIGNATURE, [('main_patterns_0_to_0', [('bj/a.funscript', [0, 500, 1000], [0, 80, 0])])])
+    with open(pack_path, 'rb') as f:
+        data = f.read()
+
+    # Cut inside the header, and inside the positions section
+    for size in (10, len(data) - 1):
+        with open(pack_path, 'wb') as f:
+            f.write(data[:size])
+        with pytest.raises(ValueError, match='Truncated'):
+            PatternPack(pack_path)
+        assert open_pack(pack_path) is None
+
+    # A record pointing past the action sections
+    categories_offset = struct.unpack_from('<I', data, 16)[0]
+    records_offset = struct.unpack_from('<I', data, 20)[0]
+    assert records_offset == categories_offset + 40
+    corrupted = bytearray(data)
+    struct.pack_into('<I', corrupted, records_offset + 4, 4)  # Action count 3 -> 4
+    with open(pack_path, 'wb') as f:
+        f.write(corrupted)
+    with pytest.raises(ValueError, match='Corrupted'):
+        PatternPack(pack_path)
+
+def test_manager_rebuilds_a_truncated_pack(library, tmp_path):
+    pack_path = str(tmp_path / 'library.pack')
+    expected = PatternManager(library, pack_path=pack_path).get_total_count()
+    with open(pack_path, 'r+b') as f:
+        f.truncate(os.path.getsize(pack_path) - 16)
+
+    manager = PatternManager(library, pack_path=pack_path)
+    assert manager.get_total_count() == expected
+    assert all(len(pattern.at) == len(pattern.pos) > 0 for pattern in manager.get_all_patterns())
+    pack = PatternPack(pack_path)
+    assert pack.pattern_count == expected
+    pack.close()
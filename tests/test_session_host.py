@@ -0,0 +1,54 @@
+import os
+
+from clock import VirtualClock
+from session_host import SessionHost, SessionLibrary
+from simulator import FakeDeviceClient
+
+def test_virtual_clock_host_runs_sessions_to_completion(library, speed_files):
+    shared = SessionLibrary(library, *speed_files)
+    assert not os.path.exists(os.path.join(library, 'patterns.pack'))  # No pack unless asked for
+
+    clock = VirtualClock()
+    start = clock.time()
+    host = SessionHost(shared, clock=clock, shards=2)
+    devices = [FakeDeviceClient(clock) for _ in range(4)]
+    lengths = ('1:00', '2:00', '1:30', '2:00')
+    ids = [host.add_session(device, length, peaks=2, seed=i) for i, (device, length) in enumerate(zip(devices, lengths))]
+    assert ids == [1, 2, 3, 4]
+    sessions = [host.sessions[session_id].session for session_id in ids]
+    assert len({id(session.arousal_curve) for session in sessions}) == 4
+    assert all(session.transition_graph is shared.template.transition_graph for session in sessions)
+
+    host.run_until_idle()
+    assert host.sessions == {}
+    assert clock.time() - start >= 120
+
+    for device, length in zip(devices, (60, 120, 90, 120)):
+        times = [at - start for at, _, _ in device.commands]
+        assert len(times) > 20
+        assert times == sorted(times)
+        # The last pattern may run past the end, but not by more than a pattern
+        assert length <= times[-1] < length + 30
+        assert device.commands[-1][1:] == (0.0, 1000)  # Sent home when the session ends
+
+def test_removed_session_stops_at_once(library, speed_files):
+    clock = VirtualClock()
+    host = SessionHost(SessionLibrary(library, *speed_files), clock=clock)
+    kept, removed = FakeDeviceClient(clock), FakeDeviceClient(clock)
+    host.add_session(kept, '1:00', seed=1)
+    removed_id = host.add_session(removed, '1:00', seed=2)
+    host.remove_session(removed_id)
+    sent = len(removed.commands)
+    assert removed.commands[-1][1:] == (0.0, 1000)
+
+    host.run_until_idle()
+    assert len(removed.commands) == sent
+    assert len(kept.commands) > 20
+
+def test_pack_is_opt_in(library, speed_files, tmp_path):
+    pack_path = str(tmp_path / 'cache' / 'patterns.pack')
+    os.makedirs(os.path.dirname(pack_path))
+    shared = SessionLibrary(library, *speed_files, pack_path=pack_path)
+    assert os.path.exists(pack_path)
+    assert not os.path.exists(os.path.join(library, 'patterns.pack'))
+    assert shared.pattern_manager.get_total_count() == 27
@@ -0,0 +1,223 @@
+import json
+import math
+import os
+import random
+import time
+from collections import Counter
+
+import pytest
+
+from conftest import stroke_actions, write_funscript
+from device_handler import PatternManager
+from pattern_categories import endpoint_zone
+from session_manager import PATTERN_GAP, PLAN_MAX_STRETCH, AliasSampler, SessionManager, TransitionGraph
+
+@pytest.fixture
+def session(speed_files):
+    return SessionManager(*speed_files)
+
+def test_alias_sampler_distribution():
+    random.seed(1)
+    weights = [1.0, 2.0, 0.0, 3.0, 4.0]
+    sampler = AliasSampler(list('abcde'), weights)
+    draws = 200_000
+    counts = Counter(sampler.draw() for _ in range(draws))
+
+    assert 'c' not in counts  # Zero weight is never drawn
+    for item, weight in zip('abcde', weights):
+        assert counts[item] / draws == pytest.approx(weight / sum(weights), abs=0.005)
+
+def test_alias_sampler_single_and_uniform_items():
+    random.seed(2)
+    assert AliasSampler(['only'], [0.5]).draw() == 'only'
+    counts = Counter(AliasSampler(list(range(4)), [1.0] * 4).draw() for _ in range(40_000))
+    assert all(count / 40_000 == pytest.approx(0.25, abs=0.01) for count in counts.values())
+
+def test_band_samplers_respect_start_zone_and_band(session):
+    random.seed(3)
+    for zone in (0, 50, 100):
+        sampler = session.band_samplers[('low', zone)]
+        for _ in range(200):
+            info = sampler.draw()
+            assert endpoint_zone(info['start_pos']) == zone
+            assert info['speed_class'] in ('slow', 'medium')
+    picks = Counter(session.band_samplers[('high', None)].draw()['speed_class'] for _ in range(6000))
+    assert set(picks) == {'medium', 'fast'}
+    assert picks['fast'] / 6000 == pytest.approx(2 / 3, abs=0.03)
+
+def test_transition_graph_shortest_paths(library):
+    # Without 0->100 transitions, fast (only 100->100) is three hops from 0: 0->50->100->fast
+    for name in os.listdir(os.path.join(library, 'transitions')):
+        if name.startswith('0-100_'):
+            os.remove(os.path.join(library, 'transitions', name))
+    manager = PatternManager(library)
+    speed_info = {pattern.name: {'speed_class': 'fast' if pattern.name == '100-100_fast.funscript' else 'slow'}
+                  for pattern in manager.get_all_patterns()}
+    graph = TransitionGraph(manager, speed_info)
+
+    assert graph.edge_count == manager.get_total_count()
+    assert graph.distance['fast'] == {0: 3, 50: 2, 100: 1}
+    assert graph.distance['slow'] == {0: 1, 50: 1, 100: 1}
+    assert graph.distance['medium'] == {0: math.inf, 50: math.inf, 100: math.inf}
+
+    # First hops lie on a cheapest path
+    random.seed(4)
+    for _ in range(50):
+        assert graph.next_pattern(0, 'fast')['category'] == 'transitions_0_to_50'
+        assert graph.next_pattern(60, 'fast')['category'] == 'transitions_50_to_100'
+        assert graph.next_pattern(100, 'fast')['name'] == '100-100_fast.funscript'
+    # Unreachable classes fall back to the nearest reachable one
+    assert graph.next_pattern(0, 'medium')['speed_class'] == 'slow'
+
+def test_transition_graph_is_reused_until_the_library_changes(library, session):
+    manager = PatternManager(library)
+    graph = session.build_transition_graph(manager)
+    assert graph.distance['fast'] == {0: 1, 50: 1, 100: 1}
+    assert session.build_transition_graph(manager) is graph
+    twerk = manager.mode_view('twerk')
+    twerk_graph = session.build_transition_graph(twerk)
+    assert twerk_graph is not graph and twerk_graph.edge_count == 3
+    assert session.build_transition_graph(manager) is graph
+
+    write_funscript(os.path.join(library, 'bj', '0-0_extra.funscript'), stroke_actions(0, 0, 300))
+    manager.rescan()
+    assert graph.is_stale()
+    rebuilt = session.build_transition_graph(manager)
+    assert rebuilt is not graph and rebuilt.edge_count == graph.edge_count + 1
+
+@pytest.fixture
+def compiled_session(speed_files):
+    random.seed(3)
+    session = SessionManager(*speed_files)
+    session.curve_seed = 3
+    assert session.start_session('5:00')
+    return session
+
+def test_start_session_compiles_a_chained_queue(compiled_session):
+    queue = compiled_session.session_queue
+    assert queue[0].start_time == 0.0 and queue[0].pattern['start_pos'] == 0
+    for previous, entry in zip(queue, queue[1:]):
+        assert entry.start_time == pytest.approx(previous.end_time)
+        assert entry.pattern['start_pos'] == previous.pattern['end_pos']
+    assert queue[-1].start_time < 300 <= queue[-1].end_time + 1e-6
+
+def test_playback_reads_the_queue_in_order(compiled_session):
+    session = compiled_session
+    queue = session.session_queue
+    position = 0
+    for entry in queue[:4]:
+        pattern, speed_multiplier = session.get_next_pattern_recommendation(position)
+        assert (pattern, speed_multiplier) == (entry.pattern, entry.speed_multiplier)
+        position = pattern['end_pos']
+    assert session.session_queue is queue  # Nothing was replanned
+
+def test_late_playback_skips_passed_entries(compiled_session):
+    session = compiled_session
+    entry = session.session_queue[3]
+    session.session_start_time = time.time() - (entry.start_time + 0.01)
+    pattern, _ = session.next_planned_pattern(entry.pattern['start_pos'])
+    assert pattern is entry.pattern
+
+def test_manual_override_replans_from_the_new_time(compiled_session):
+    session = compiled_session
+    session.get_next_pattern_recommendation(0)
+    session.manual_arousal_override(0.5)
+    pattern, _ = session.next_planned_pattern(100)
+    queue = session.session_queue
+    assert pattern is queue[0].pattern and pattern['start_pos'] == 100
+    assert queue[0].start_time == pytest.approx(150, abs=0.5)
+
+def test_export_session_plan(compiled_session, tmp_path):
+    path = str(tmp_path / 'plan.json')
+    compiled_session.export_session_plan(path)
+    with open(path) as f:
+        plan = json.load(f)
+    assert len(plan) == len(compiled_session.session_queue)
+    assert plan[0]['start_time'] == 0.0
+    assert plan[1]['start_time'] == pytest.approx(plan[0]['duration'], abs=0.002)
+    assert set(plan[0]) == {'start_time', 'duration', 'name', 'key', 'speed_class', 'speed_multiplier'}
+
+def test_live_selection_without_a_compiled_queue(speed_files):
+    session = SessionManager(*speed_files)
+    session.precompile_queue = False
+    assert session.start_session('5:00')
+    assert session.session_queue == []
+    pattern, _ = session.get_next_pattern_recommendation(0)
+    assert pattern is not None
+
+@pytest.fixture
+def planned_session(library, speed_files):
+    random.seed(5)
+    session = SessionManager(*speed_files)
+    session.build_transition_graph(PatternManager(library))
+    session.curve_seed = 5
+    session.curve_preview = False
+    assert session.start_session('10:00')
+    return session
+
+def _assert_exact_chain(queue, start_time, start_pos, session_length):
+    assert queue
+    assert queue[0].start_time == pytest.approx(start_time)
+    assert queue[0].pattern['start_pos'] == start_pos
+    for previous, entry in zip(queue, queue[1:]):
+        assert entry.start_time == pytest.approx(previous.end_time)
+        assert entry.pattern['start_pos'] == previous.pattern['end_pos']
+    for entry in queue:
+        assert entry.duration == pytest.approx(entry.pattern['duration'] / 1000.0 * entry.speed_multiplier + PATTERN_GAP)
+    assert queue[-1].end_time == pytest.approx(session_length, abs=1e-6)
+
+def test_exact_plan_ends_on_session_length(planned_session):
+    session = planned_session
+    _assert_exact_chain(session.session_queue, 0.0, 0, 600)
+
+    # Multipliers stay within the curve's range, up to the uniform correction
+    for entry in session.session_queue:
+        assert 0.4 * (1 - PLAN_MAX_STRETCH) <= entry.speed_multiplier <= 3.0 * (1 + PLAN_MAX_STRETCH)
+
+def test_endpoint_mismatch_reroutes_to_an_exact_plan(planned_session):
+    session = planned_session
+    table = session._plan_table
+    planned = session.session_queue[2]
+    session.session_start_time -= planned.start_time + 0.01
+
+    # Playback is at another endpoint than the plan expects
+    position = 0 if planned.pattern['start_pos'] == 100 else 100
+    pattern, _ = session.next_planned_pattern(current_pos=position)
+    assert pattern['start_pos'] == position
+    assert session._plan_table is table  # Re-routed along the existing table, no new DP
+    start_time = session.session_queue[0].start_time
+    assert start_time == pytest.approx(planned.start_time + 0.01, abs=0.5)
+    _assert_exact_chain(session.session_queue, start_time, position, 600)
+
+def test_greedy_plan_chains_endpoints(planned_session):
+    session = planned_session
+    session.planner = 'greedy'
+    queue = session.plan_session(0.0, 50)
+    assert queue[0].pattern['start_pos'] == 50
+    for previous, entry in zip(queue, queue[1:]):
+        assert entry.start_time == pytest.approx(previous.end_time)
+    assert queue[-1].start_time < 600 <= queue[-1].end_time
+
+def test_json_fallback_keeps_endpoints_for_position_aware_selection(speed_files, tmp_path):
+    json_path, _ = speed_files
+    session = SessionManager(json_path, str(tmp_path / 'missing.idx'))
+    assert session.pattern_index is None
+    infos = session.slow_patterns + session.medium_patterns + session.fast_patterns
+    assert len(infos) == 27
+    for info in infos:
+        assert info['key'].endswith('/' + info['name'])
+        assert info['start_pos'] in (0, 50, 100) and info['duration'] > 0
+
+    random.seed(7)
+    for position in (0, 50, 100):
+        for arousal in (10, 50, 90):
+            assert session.select_pattern_by_arousal(arousal, position)['start_pos'] == position
+
+def test_band_selection_follows_the_current_position(speed_files, tmp_path):
+    json_path, _ = speed_files
+    session = SessionManager(json_path, str(tmp_path / 'missing.idx'))
+    session.selection_mode = 'bands'
+    random.seed(7)
+    for position in (0, 50, 100):
+        for arousal in (10, 50, 90):
+            assert session.select_pattern_by_arousal(arousal, position)['start_pos'] == position
@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from clock import VirtualClock
+from device_handler import PatternManager
+from session_manager import SessionManager
+from simulator import simulate_session
+
+def test_virtual_clock_advances_without_blocking():
+    clock = VirtualClock(100.0)
+    assert clock.time() == 100.0
+    clock.sleep(3600)
+    clock.sleep(-5)
+    clock.advance(0.5)
+    assert clock.time() == 3700.5
+
+@pytest.fixture
+def simulation(library, speed_files):
+    def simulate(planner, session_time='10:00'):
+        random.seed(6)
+        manager = PatternManager(library)
+        session = SessionManager(*speed_files, clock=VirtualClock())
+        session.build_transition_graph(manager)
+        session.selection_mode = 'graph'
+        session.planner = planner
+        session.curve_seed = 6
+        return simulate_session(manager, session, session_time, peaks=2)
+    return simulate
+
+def test_exact_plan_simulation_ends_on_time(simulation):
+    result = simulation('exact')
+    assert result.session_length == 600
+    assert abs(result.end_error) < 0.01
+    assert result.simulated_seconds > 100 * result.wall_seconds
+
+    # Commands are in time order, inside the session, and every pattern was played
+    times = [at for at, _, _ in result.commands]
+    assert times == sorted(times)
+    assert 0 <= times[0] and times[-1] < result.session_length
+    assert len(result.patterns) > 10
+    assert all(0.0 <= position <= 1.0 and duration > 0 for _, position, duration in result.commands)
+
+def test_greedy_simulation_covers_the_session(simulation):
+    result = simulation('greedy', '5:00')
+    assert result.session_length == 300
+    assert result.simulated_seconds >= 300 - 0.01
+    starts = [start for start, _, _ in result.patterns]
+    assert starts == sorted(starts)
+
+def test_simulation_requires_a_virtual_clock(library, speed_files):
+    with pytest.raises(ValueError):
+        simulate_session(PatternManager(library), SessionManager(*speed_files))
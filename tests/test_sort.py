@@ -0,0 +1,76 @@
+import os
+from array import array
+
+import pytest
+
+import sort
+from conftest import write_funscript
+from device_handler import PatternManager
+from pattern_categories import classify_pattern_endpoints
+from sort import slice_boundaries, slice_destination, slice_funscript
+
+@pytest.fixture(params=['numpy', 'bisect'])
+def boundaries_backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(sort, 'np', None)
+    return request.param
+
+def test_slice_boundaries(boundaries_backend):
+    assert slice_boundaries(array('i')) == []
+    assert slice_boundaries(array('i', [0])) == []
+
+    # Exact hits land on the action itself
+    assert slice_boundaries(array('i', [0, 5000, 10000, 15000, 20000, 25000])) == [0, 2, 4]
+    # Otherwise the last action before the step; the trailing partial slice is dropped
+    assert slice_boundaries(array('i', [0, 3000, 9999, 10001, 19000, 20500, 29000])) == [0, 2, 4]
+    # Timelines that do not start at zero are measured from the first action
+    assert slice_boundaries(array('i', [500, 10400, 10500, 10600]), 5000) == [0, 0, 2]
+
+def test_slice_destination_matches_loader_categories():
+    for start in range(101):
+        for end in range(101):
+            folder, category = slice_destination(start, end)
+            # The loader classifies transitions/ files as transitions, the rest as main patterns
+            assert classify_pattern_endpoints(start, end, folder == 'transitions')[0] == category
+            assert (folder == 'twerk') == (category == 'main_patterns_50_to_50')
+
+def test_slice_funscript_writes_loadable_chained_slices(tmp_path):
+    # 0 -> 100 -> 50 -> 0 every 10 s, with strokes in between
+    targets = [0, 100, 50, 0, 0]
+    actions = []
+    for index, (start, end) in enumerate(zip(targets, targets[1:])):
+        base = index * 10000
+        actions += [(base, start), (base + 2500, 40), (base + 5000, 60), (base + 7500, 40)]
+    actions.append((40000, 0))
+    source = str(tmp_path / 'source.funscript')
+    write_funscript(source, actions)
+    library = str(tmp_path / 'library')
+
+    counts = slice_funscript(source, library, 10000)
+    assert counts == {'transitions_0_to_100': 1, 'transitions_100_to_50': 1,
+                      'transitions_50_to_0': 1, 'main_patterns_0_to_0': 1}
+
+    manager = PatternManager(library)
+    assert manager.get_total_count() == 4
+    for category, count in counts.items():
+        patterns = getattr(manager, category)
+        assert len(patterns) == count
+        for pattern in patterns:
+            assert pattern.at[0] == 0 and pattern.duration == 10000
+    assert sorted(name.split('_')[0] for name in os.listdir(os.path.join(library, 'transitions'))) == \
+        ['0-100', '100-50', '50-0']
+
+def test_slice_names_carry_the_full_content_hash(tmp_path):
+    source = str(tmp_path / 'source.funscript')
+    write_funscript(source, [(0, 0), (2500, 80), (5000, 0), (7500, 80), (10000, 0)])
+    library = str(tmp_path / 'library')
+    assert slice_funscript(source, library, 10000) == {'main_patterns_0_to_0': 1}
+    name, = os.listdir(os.path.join(library, 'bj'))
+    prefix, digest = name[:-len('.funscript')].split('_')
+    assert prefix == '0-0' and len(digest) == 64
+
+    # Slicing again finds the identical slice already written
+    assert slice_funscript(source, library, 10000) == {'main_patterns_0_to_0': 1}
+    assert os.listdir(os.path.join(library, 'bj')) == [name]